@@ -0,0 +1,89 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Compares the FLOP engine with the previous per node if/elif implementation on a
+synthetic transformer-like graph of MatMul, Add and Mul nodes.
+
+    python benchmarks/flops_benchmark.py --nodes 150000
+"""
+
+import argparse
+import time
+import numpy as np
+from digest.model_class.digest_model import NodeInfo, NodeTable, TensorData, TensorInfo
+from digest.model_class.flops_engine import count_flops, summarize_flops
+
+
+def build_node_table(num_nodes: int) -> NodeTable:
+    node_table = NodeTable()
+    hidden = TensorInfo("float32", 4, 1024.0, [1, 128, 2048])
+    weight = TensorInfo("float32", 4, 16384.0, [2048, 2048])
+    bias = TensorInfo("float32", 4, 8.0, [2048])
+    op_types = ["MatMul", "Add", "Mul"]
+    for i in range(num_nodes):
+        node_info = NodeInfo()
+        node_info.node_type = op_types[i % 3]
+        second = weight if node_info.node_type == "MatMul" else bias
+        node_info.inputs = TensorData([(f"t{i}", hidden), (f"p{i}", second)])
+        node_info.outputs = TensorData([(f"t{i + 1}", hidden)])
+        node_table[f"node_{i}"] = node_info
+    return node_table
+
+
+def reference_flops(node_table: NodeTable):
+    """The per node implementation that the engine replaced, limited to the op
+    types of the benchmark graph"""
+    model_flops = 0
+    node_type_flops = {}
+    for _, node_info in node_table.items():
+        node_type = node_info.node_type
+        if node_type == "MatMul":
+            input_a = list(node_info.inputs.values())[0].shape
+            input_b = list(node_info.inputs.values())[1].shape
+            if not all(isinstance(dim, int) for dim in input_a) or not isinstance(
+                input_b[-1], int
+            ):
+                return None, node_type_flops
+            node_flops = int(
+                2 * np.prod(np.array(input_a), dtype=np.int64) * input_b[-1]
+            )
+        else:
+            input_a = list(node_info.inputs.values())[0].shape
+            input_b = list(node_info.inputs.values())[1].shape
+            if not all(isinstance(dim, int) for dim in input_a) or not all(
+                isinstance(dim, int) for dim in input_b
+            ):
+                return None, node_type_flops
+            node_flops = int(np.prod(np.array(input_a), dtype=np.int64)) + int(
+                np.prod(np.array(input_b), dtype=np.int64)
+            )
+        node_info.flops = node_flops
+        model_flops += node_flops
+        node_type_flops[node_type] = node_type_flops.get(node_type, 0) + node_flops
+    return model_flops, node_type_flops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=150000)
+    args = parser.parse_args()
+
+    node_table = build_node_table(args.nodes)
+
+    start = time.perf_counter()
+    reference = reference_flops(node_table)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = summarize_flops(node_table, count_flops(node_table))
+    engine_time = time.perf_counter() - start
+
+    assert result == reference, "The engine does not match the reference FLOPs"
+    print(f"Nodes:      {args.nodes}")
+    print(f"Per node:   {reference_time:.3f} s")
+    print(f"Engine:     {engine_time:.3f} s")
+    print(f"Speedup:    {reference_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Measures the time to import the headless analysis core in a fresh interpreter,
+and compares it with the same import plus PySide6.QtCore and onnxruntime, which
+the model classes used to import at module level.
+
+    python benchmarks/import_benchmark.py --repeats 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+CORE_IMPORT = "import digest.model_class.digest_onnx_model"
+
+CASES = {
+    "Interpreter": "pass",
+    "Headless core": CORE_IMPORT,
+    "digest-analyze": "import digest.analyze",
+    "Core with Qt and ORT": f"import PySide6.QtCore, onnxruntime; {CORE_IMPORT}",
+}
+
+
+def time_import(statement: str, repeats: int) -> List[float]:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    # The first run warms up the file system caches
+    time_import(f"import PySide6.QtCore, onnxruntime; {CORE_IMPORT}", 1)
+
+    medians = {}
+    for name, statement in CASES.items():
+        medians[name] = statistics.median(time_import(statement, args.repeats))
+        print(f"{name + ':':<24}{medians[name] * 1000:8.1f} ms")
+
+    qt_cost = medians["Core with Qt and ORT"] - medians["Headless core"]
+    print(f"{'Saved by headless core:':<24}{qt_cost * 1000:8.1f} ms")
+    check = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, digest.analyze; "
+            "print(any(m.startswith(('PySide6', 'onnxruntime')) for m in sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    print(f"{'Qt or ORT imported:':<24}{check.stdout.strip():>8}")
+
+
+if __name__ == "__main__":
+    main()
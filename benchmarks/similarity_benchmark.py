@@ -0,0 +1,99 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Compares the approximate similarity search of the LSH table with the exact scan
+of the similarity index on a synthetic database of model families. Every query
+is a perturbed copy of a database model, and the recall is the fraction of the
+exact top k models that the approximate search returns in its own top k.
+
+    python benchmarks/similarity_benchmark.py --models 100000 --queries 100
+"""
+
+import argparse
+import time
+import numpy as np
+from digest.subgraph_analysis.similarity_index import MinHashLSH, SimilarityIndex
+
+OPS = ["Conv", "Relu", "Add", "MatMul", "Mul", "Softmax", "LayerNormalization"]
+
+
+def make_family(rng: np.random.Generator, num_features: int):
+    features = rng.choice(100000, size=num_features, replace=False)
+    counts = rng.integers(1, 64, size=num_features)
+    return {f"{feature:032x}": int(count) for feature, count in zip(features, counts)}
+
+
+def perturb(rng: np.random.Generator, op_list, change: float):
+    """Drops and rescales a fraction of the features"""
+    perturbed = {}
+    for feature, count in op_list.items():
+        draw = rng.random()
+        if draw < change / 2:
+            continue
+        if draw < change:
+            count = max(1, int(count * rng.uniform(0.5, 2.0)))
+        perturbed[feature] = count
+    return perturbed
+
+
+def make_database(rng: np.random.Generator, num_models: int, num_families: int):
+    families = [make_family(rng, 200) for _ in range(num_families)]
+    models = {}
+    for i in range(num_models):
+        op_list = perturb(rng, families[i % num_families], 0.3)
+        op_list.update({op: int(rng.integers(1, 100)) for op in OPS})
+        models[f"model_{i}"] = {"op_list": op_list}
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", type=int, default=20000)
+    parser.add_argument("--families", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    models = make_database(rng, args.models, args.families)
+    index = SimilarityIndex.from_models(models)
+    names = list(models)
+
+    start = time.perf_counter()
+    lsh = MinHashLSH.build(index)
+    build_time = time.perf_counter() - start
+    print(f"LSH table of {args.models} models built in {build_time:.2f} s")
+
+    exact_time = 0.0
+    approximate_time = 0.0
+    recalls = []
+    num_candidates = []
+    for query in rng.choice(len(names), size=args.queries, replace=False):
+        target = perturb(rng, models[names[query]]["op_list"], 0.2)
+
+        start = time.perf_counter()
+        _, scores = index.score(target)
+        exact = set(np.argsort(-scores, kind="stable")[: args.top_k].tolist())
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidates = lsh.query(target)
+        _, candidate_scores = index.score(target, candidates)
+        order = np.argsort(-candidate_scores, kind="stable")[: args.top_k]
+        approximate = set(candidates[order].tolist())
+        approximate_time += time.perf_counter() - start
+
+        recalls.append(len(exact & approximate) / len(exact))
+        num_candidates.append(len(candidates))
+
+    print(f"{'Exact scan:':<24}{exact_time / args.queries * 1000:8.2f} ms/query")
+    print(
+        f"{'LSH and re-ranking:':<24}"
+        f"{approximate_time / args.queries * 1000:8.2f} ms/query"
+    )
+    print(f"{'Mean candidates:':<24}{np.mean(num_candidates):8.1f}")
+    print(f"{f'Recall@{args.top_k}:':<24}{np.mean(recalls):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ a = Analysis(
     binaries=[],
     datas=copy_metadata("digestai") + copy_metadata("onnxruntime") + copy_metadata("onnx") + [
             (
-                os.path.normpath(os.path.join(proj_dir, 'src/digest/subgraph_analysis/database.zip')), 
+                os.path.normpath(os.path.join(proj_dir, 'src/digest/subgraph_analysis/database.simdb')), 
                 os.path.normpath("digest/subgraph_analysis")
             ),
             (
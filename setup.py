@@ -10,7 +10,7 @@ setup(
     packages=find_packages(where="src"),
     package_dir={"": "src"},
     include_package_data=True,
-    package_data={"digest": ["subgraph_analysis/database.zip"]},
+    package_data={"digest": ["subgraph_analysis/database.simdb"]},
     install_requires=[
         "pyside6==6.8.3",
         "onnx < 1.16.2",
@@ -25,9 +25,18 @@ setup(
         "platformdirs>=4.2.2",
         "pyyaml>=6.0.1",
         "psutil>=6.0.0",
+        "tqdm",
     ],
     classifiers=[],
-    entry_points={"console_scripts": ["digest = digest.main:main"]},
+    entry_points={
+        "console_scripts": [
+            "digest = digest.main:main",
+            "digest-analyze = digest.analyze:main",
+            "digest-merge = digest.analyze:merge_main",
+            "digest-sweep = digest.model_class.shape_sweep:main",
+            "digest-encode = digest.subgraph_analysis.bulk_encode:main",
+        ]
+    },
     python_requires=">=3.9, <3.11",
     long_description=open("README.md", "r", encoding="utf-8").read(),
     long_description_content_type="text/markdown",
@@ -0,0 +1,215 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+The global reports of a batch analysis and their partial-aggregate files. Each
+shard of a batch run saves the counters of its models to a partial file, and any
+number of partial files can be merged into the global reports of all models.
+"""
+
+import os
+import re
+import csv
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+from collections import Counter
+from digest.model_class.digest_model import (
+    NodeShapeCounts,
+    NodeTypeCounts,
+    save_node_shape_counts_csv_report,
+    save_node_type_counts_csv_report,
+)
+
+GLOBAL_MODEL_HEADERS = [
+    "Model",
+    "Opset",
+    "Parameters",
+    "FLOPs",
+]
+
+PARTIAL_FORMAT = "digest-partial-aggregate"
+PARTIAL_FORMAT_VERSION = 1
+# Names of the partial files of an unsharded run and of shard i of N
+_PARTIAL_NAME = re.compile(r"global_partial(?:_(\d+)_of_(\d+))?\.json")
+
+
+def _decode_shapes(shapes: List) -> Tuple:
+    return tuple(tuple(shape) for shape in shapes)
+
+
+class GlobalAggregate:
+    """The node type counts, node shape counts and model summaries of many
+    models, which are the state behind the global reports"""
+
+    def __init__(self) -> None:
+        # Holds the data for node type counts across all models
+        self.node_type_counter: Counter[str] = Counter()
+
+        # Holds the data for node shape counts across all models
+        self.node_shape_counter: NodeShapeCounts = NodeShapeCounts()
+
+        # Holds the data for all models statistics
+        self.model_data: Dict[str, Dict[str, Any]] = {}
+
+    def add_model(
+        self,
+        model_name: str,
+        model_data: Dict[str, Any],
+        node_type_counts: Dict[str, int],
+        node_shape_counts: Iterable[Tuple[str, Tuple, int]],
+    ) -> None:
+        if model_name in self.model_data:
+            print(
+                f"Warning! {model_name} has already been processed, skipping the duplicate model."
+            )
+            return
+        self.model_data[model_name] = model_data
+        self.node_type_counter.update(node_type_counts)
+        for node_type, shapes, count in node_shape_counts:
+            self.node_shape_counter[node_type][shapes] += count
+
+    def add_record(self, record: Dict[str, Any]) -> None:
+        """Adds a model from its batch analysis journal record"""
+        self.add_model(
+            record["model_name"],
+            {
+                "opset": record["opset"],
+                "parameters": record["parameters"],
+                "flops": record["flops"],
+            },
+            record["node_type_counts"],
+            (
+                (node_type, _decode_shapes(shapes), count)
+                for node_type, shapes, count in record["node_shape_counts"]
+            ),
+        )
+
+    def update(self, other: "GlobalAggregate") -> None:
+        # The counts of other are not kept per model, so an aggregate that repeats
+        # models is skipped as a whole
+        duplicates = sorted(set(self.model_data) & set(other.model_data))
+        if duplicates:
+            print(
+                f"Warning! {', '.join(duplicates)} have already been processed, "
+                "skipping the aggregate that repeats them."
+            )
+            return
+        self.model_data.update(other.model_data)
+        self.node_type_counter.update(other.node_type_counter)
+        for node_type, shape_counts in other.node_shape_counter.items():
+            self.node_shape_counter[node_type].update(shape_counts)
+
+    def save_partial(self, filepath: str) -> None:
+        """Saves the aggregate to a partial file that merge_partials reads"""
+        partial = {
+            "format": PARTIAL_FORMAT,
+            "version": PARTIAL_FORMAT_VERSION,
+            "models": self.model_data,
+            "node_type_counts": dict(self.node_type_counter),
+            # The shapes are tuples of input shapes, JSON turns them into lists
+            "node_shape_counts": [
+                [node_type, shapes, count]
+                for node_type, shape_counts in self.node_shape_counter.items()
+                for shapes, count in shape_counts.items()
+            ],
+        }
+        # Written next to the target and renamed so a partial is never half written
+        temp_filepath = filepath + ".tmp"
+        with open(temp_filepath, "w", encoding="utf-8") as f:
+            json.dump(partial, f)
+        os.replace(temp_filepath, filepath)
+
+    @classmethod
+    def load_partial(cls, filepath: str) -> "GlobalAggregate":
+        with open(filepath, "r", encoding="utf-8") as f:
+            partial = json.load(f)
+        if (
+            partial.get("format") != PARTIAL_FORMAT
+            or partial.get("version") != PARTIAL_FORMAT_VERSION
+        ):
+            raise ValueError(
+                f"{filepath} is not a version {PARTIAL_FORMAT_VERSION} "
+                "partial-aggregate file."
+            )
+        aggregate = cls()
+        aggregate.model_data = partial["models"]
+        aggregate.node_type_counter.update(partial["node_type_counts"])
+        for node_type, shapes, count in partial["node_shape_counts"]:
+            aggregate.node_shape_counter[node_type][_decode_shapes(shapes)] += count
+        return aggregate
+
+    def save_reports(self, output_dir: str) -> None:
+        """Saves the global node type, node shape and model summary reports"""
+        global_filepath = os.path.join(output_dir, "global_node_type_counts.csv")
+        global_node_type_counts = NodeTypeCounts(self.node_type_counter.most_common())
+        save_node_type_counts_csv_report(global_node_type_counts, global_filepath)
+
+        global_filepath = os.path.join(output_dir, "global_node_shape_counts.csv")
+        save_node_shape_counts_csv_report(self.node_shape_counter, global_filepath)
+
+        global_filepath = os.path.join(output_dir, "global_model_summary.csv")
+        with open(global_filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            rows = [
+                [model, data["opset"], data["parameters"], data["flops"]]
+                for model, data in self.model_data.items()
+            ]
+            writer.writerow(GLOBAL_MODEL_HEADERS)
+            writer.writerows(rows)
+
+
+def _directory_partials(directory: str) -> List[str]:
+    """Returns the partial files of a directory. They must be either the partial of
+    one unsharded run or the partials of all the shards of a single run, otherwise
+    models would be merged more than once."""
+    unsharded = []
+    shards: Dict[int, Dict[int, str]] = {}
+    for name in sorted(os.listdir(directory)):
+        match = _PARTIAL_NAME.fullmatch(name)
+        if not match:
+            continue
+        filepath = os.path.join(directory, name)
+        if match.group(1) is None:
+            unsharded.append(filepath)
+        else:
+            shards.setdefault(int(match.group(2)), {})[int(match.group(1))] = filepath
+
+    if unsharded and shards:
+        raise ValueError(
+            f"{directory} holds both an unsharded partial and shard partials, "
+            "merge the files of a single run instead."
+        )
+    if len(shards) > 1:
+        raise ValueError(
+            f"{directory} holds the partials of runs split into "
+            f"{' and '.join(str(count) for count in sorted(shards))} shards, "
+            "merge the files of a single run instead."
+        )
+    if not shards:
+        return unsharded
+    num_shards, shard_files = next(iter(shards.items()))
+    missing = sorted(set(range(1, num_shards + 1)) - set(shard_files))
+    if missing:
+        raise ValueError(
+            f"{directory} is missing the partials of shards "
+            f"{', '.join(str(shard) for shard in missing)} of {num_shards}."
+        )
+    return [shard_files[shard] for shard in sorted(shard_files)]
+
+
+def find_partials(paths: Iterable[str]) -> List[str]:
+    """Expands directories to the partial-aggregate files they contain. Files
+    are taken as they are."""
+    partial_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            partial_files.extend(_directory_partials(path))
+        else:
+            partial_files.append(path)
+    return partial_files
+
+
+def merge_partials(partial_files: Iterable[str]) -> GlobalAggregate:
+    aggregate = GlobalAggregate()
+    for partial_file in partial_files:
+        aggregate.update(GlobalAggregate.load_partial(partial_file))
+    return aggregate
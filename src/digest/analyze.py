@@ -0,0 +1,442 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Headless batch analysis of one or more ONNX models, installed as the
+digest-analyze command. Neither this module nor the analysis core it uses
+imports Qt.
+
+    digest-analyze /path/to/model/directory /path/to/output/directory
+
+The models are analyzed in worker processes, largest files first, and the
+results of every model are appended to a journal in the output directory as
+soon as the model is done. Running the same command again skips the models of
+the journal that have not changed, and the global reports are always built from
+the whole journal, so an interrupted run loses at most the models in progress.
+
+A model directory too large for one machine can be split with --shard i/N. Each
+shard saves a partial-aggregate file, and digest-merge combines the partials of
+all shards into the global reports.
+
+    digest-analyze /models /reports --shard 2/8
+    digest-merge /reports /reports
+"""
+
+import os
+import argparse
+import glob
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from tqdm import tqdm
+from digest.aggregate import GlobalAggregate, find_partials, merge_partials
+from digest.model_class.digest_model import save_node_shape_counts_csv_report
+from digest.model_class.digest_onnx_model import load_digest_onnx_model
+from utils.onnx_utils import parse_dim_values
+from utils.process_utils import run_tasks
+
+JOURNAL_FILENAME = "analysis_journal.jsonl"
+PARTIAL_FILENAME = "global_partial.json"
+
+
+def find_onnx_files(onnx_files: str) -> List[str]:
+    # Check if the provided input is a filepath or directory
+    if os.path.isfile(onnx_files) and os.path.splitext(onnx_files)[1] == ".onnx":
+        return [onnx_files]
+    if os.path.isdir(onnx_files):
+        return list(glob.glob(os.path.join(onnx_files, "**/*.onnx"), recursive=True))
+    raise FileExistsError(
+        "The input must either be an ONNX file or a directory containing "
+        f"one or more ONNX files. Got {onnx_files}"
+    )
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parses a shard given as i/N, where i goes from 1 to N"""
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError as e:
+        raise ValueError(
+            f"Expected a shard as i/N, for example 2/8. Got {shard}"
+        ) from e
+    if not 1 <= index <= count:
+        raise ValueError(f"The shard index must be between 1 and {count}. Got {shard}")
+    return index, count
+
+
+def shard_files(
+    onnx_file_list: List[str], root_dir: str, shard: Tuple[int, int]
+) -> List[str]:
+    """Keeps the files of the shard. Files are assigned by a hash of their path
+    relative to root_dir, so every machine agrees on the shards without
+    coordination and adding models does not move the existing ones."""
+    index, count = shard
+    return [
+        onnx_file
+        for onnx_file in onnx_file_list
+        if zlib.crc32(
+            os.path.relpath(onnx_file, root_dir).replace(os.sep, "/").encode("utf-8")
+        )
+        % count
+        == index - 1
+    ]
+
+
+def _shard_filename(filename: str, shard: Optional[Tuple[int, int]]) -> str:
+    if shard is None:
+        return filename
+    base, ext = os.path.splitext(filename)
+    return f"{base}_{shard[0]}_of_{shard[1]}{ext}"
+
+
+def _file_signature(onnx_file: str) -> Dict[str, Any]:
+    stat = os.stat(onnx_file)
+    return {
+        "model_file": os.path.abspath(onnx_file),
+        "file_size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def report_name(onnx_file: str, root_dir: str) -> str:
+    """The name of the reports of a model, which is its path relative to the
+    directory being analyzed without the extension. Models with the same file name
+    in different subdirectories get different reports."""
+    return os.path.splitext(os.path.relpath(onnx_file, root_dir))[0].replace(
+        os.sep, "/"
+    )
+
+
+def analyze_model(
+    onnx_file: str,
+    output_dir: str,
+    use_cache: bool = True,
+    dim_values: Optional[Dict[str, int]] = None,
+    name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Saves the reports of a single model and returns its journal record. The
+    reports are named after name, which defaults to the model file name, and the
+    subdirectories of name are created in output_dir."""
+    model_name = os.path.splitext(os.path.basename(onnx_file))[0]
+    name = name or model_name
+    report_prefix = os.path.join(output_dir, *name.split("/"))
+    os.makedirs(os.path.dirname(report_prefix), exist_ok=True)
+
+    digest_model = load_digest_onnx_model(
+        onnx_file, model_name=model_name, save_proto=False, use_cache=use_cache
+    )
+
+    if digest_model.dynamic_input_dims:
+        print(
+            f"Found the following non-static input dims in {name}. "
+            "It is recommended to make all dims static before generating reports."
+        )
+        for dynamic_shape in digest_model.dynamic_input_dims:
+            print(f"dim: {dynamic_shape}")
+        if digest_model.flops_expression is not None:
+            print(f"FLOPs: {digest_model.flops_expression}")
+
+    flops = digest_model.flops
+    if digest_model.dynamic_input_dims and dim_values:
+        try:
+            flops = digest_model.evaluate_dynamic_dims(dim_values).flops
+        except ValueError as e:
+            print(f"{name}: {e}")
+
+    # Model summary text report
+    summary_filepath = f"{report_prefix}_summary.txt"
+    digest_model.save_text_report(summary_filepath)
+
+    # Model summary yaml report
+    summary_filepath = f"{report_prefix}_summary.yaml"
+    digest_model.save_yaml_report(summary_filepath)
+
+    # Save csv containing node-level information
+    nodes_filepath = f"{report_prefix}_nodes.csv"
+    digest_model.save_nodes_csv_report(nodes_filepath)
+
+    # Save csv containing node type counter
+    node_type_filepath = f"{report_prefix}_node_type_counts.csv"
+    digest_model.save_node_type_counts_csv_report(node_type_filepath)
+
+    # Save csv containing node shape counts per op_type
+    node_shape_counts = digest_model.get_node_shape_counts()
+    node_shape_filepath = f"{report_prefix}_node_shape_counts.csv"
+    save_node_shape_counts_csv_report(node_shape_counts, node_shape_filepath)
+
+    return {
+        "model_name": name,
+        "opset": digest_model.opset,
+        "parameters": digest_model.parameters,
+        "flops": flops,
+        "node_type_counts": dict(digest_model.node_type_counts),
+        # The shapes are tuples of input shapes, JSON turns them into lists
+        "node_shape_counts": [
+            [node_type, shapes, count]
+            for node_type, shape_counts in node_shape_counts.items()
+            for shapes, count in shape_counts.items()
+        ],
+    }
+
+
+def read_journal(journal_path: str) -> Dict[str, Dict[str, Any]]:
+    """Returns the last record of every model file in the journal. A line cut
+    short by an interrupted run is ignored."""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, "r", encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["model_file"]] = record
+    return records
+
+
+def _is_done(record: Optional[Dict[str, Any]], signature: Dict[str, Any]) -> bool:
+    return (
+        record is not None
+        and record.get("status") == "ok"
+        and record.get("file_size") == signature["file_size"]
+        and record.get("mtime_ns") == signature["mtime_ns"]
+    )
+
+
+def _analyze_task(
+    onnx_file: str,
+    output_dir: str,
+    use_cache: bool,
+    dim_values: Optional[Dict[str, int]],
+    name: str,
+) -> Dict[str, Any]:
+    return analyze_model(onnx_file, output_dir, use_cache, dim_values, name)
+
+
+def analyze_models(
+    onnx_files: str,
+    output_dir: str,
+    use_cache: bool = True,
+    dim_values: Optional[Dict[str, int]] = None,
+    workers: int = 1,
+    timeout: Optional[float] = None,
+    resume: bool = True,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Analyzes the models and saves their reports, the partial-aggregate file
+    and the global reports to output_dir. Returns the journal record of every
+    model by file path. With resume, the models already in the journal of
+    output_dir are not analyzed again unless their file changed. With a shard,
+    only the models of the shard are analyzed and the global reports are left to
+    merge_main."""
+
+    onnx_file_list = find_onnx_files(onnx_files)
+    root_dir = (
+        onnx_files
+        if os.path.isdir(onnx_files)
+        else os.path.dirname(os.path.abspath(onnx_files))
+    )
+    if shard is not None:
+        onnx_file_list = shard_files(onnx_file_list, root_dir, shard)
+
+    # Check if the provided output path exists since we won't create it
+    if not os.path.exists(output_dir):
+        raise FileExistsError(
+            f"The directory {os.path.abspath(output_dir)} does not exist; please create it."
+        )
+
+    # Every shard has its own journal so shards can share the output directory
+    journal_path = os.path.join(output_dir, _shard_filename(JOURNAL_FILENAME, shard))
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal_records = read_journal(journal_path)
+
+    signatures = {onnx_file: _file_signature(onnx_file) for onnx_file in onnx_file_list}
+    todo = [
+        onnx_file
+        for onnx_file in onnx_file_list
+        if not _is_done(
+            journal_records.get(signatures[onnx_file]["model_file"]),
+            signatures[onnx_file],
+        )
+    ]
+    # The largest models take the longest, starting them first keeps the workers
+    # from waiting on a single large model at the end of the run
+    todo.sort(key=lambda onnx_file: signatures[onnx_file]["file_size"], reverse=True)
+
+    print(
+        f"Processing {len(todo)} onnx models, "
+        f"{len(onnx_file_list) - len(todo)} already analyzed."
+    )
+
+    tasks = [
+        (
+            onnx_file,
+            (
+                onnx_file,
+                output_dir,
+                use_cache,
+                dim_values,
+                report_name(onnx_file, root_dir),
+            ),
+        )
+        for onnx_file in todo
+    ]
+    with open(journal_path, "a+", encoding="utf-8") as journal:
+        # End a line cut short by an interrupted run so it stays on its own
+        if journal.tell() > 0:
+            journal.seek(journal.tell() - 1)
+            if journal.read(1) != "\n":
+                journal.write("\n")
+        for result in tqdm(
+            run_tasks(_analyze_task, tasks, workers, timeout), total=len(tasks)
+        ):
+            record = dict(signatures[result.key])
+            record["elapsed"] = round(result.elapsed, 3)
+            if result.error is None:
+                record["status"] = "ok"
+                record.update(result.value)
+            else:
+                record["status"] = "timeout" if result.timed_out else "error"
+                record["error"] = result.error
+                print(f"Failed to analyze {result.key}: {result.error}")
+            journal.write(json.dumps(record) + "\n")
+            # Every record is on disk before the next one, a crash keeps them
+            journal.flush()
+            os.fsync(journal.fileno())
+            journal_records[record["model_file"]] = record
+
+    # The global reports follow the order of the files, not the completion order
+    ok_records = [
+        journal_records[signatures[onnx_file]["model_file"]]
+        for onnx_file in onnx_file_list
+        if journal_records[signatures[onnx_file]["model_file"]]["status"] == "ok"
+    ]
+    aggregate = GlobalAggregate()
+    for record in ok_records:
+        aggregate.add_record(record)
+    partial_path = os.path.join(output_dir, _shard_filename(PARTIAL_FILENAME, shard))
+    aggregate.save_partial(partial_path)
+    if shard is not None:
+        print(
+            f"Saved the partial aggregate of shard {shard[0]}/{shard[1]} to {partial_path}"
+        )
+    elif len(onnx_file_list) > 1:
+        aggregate.save_reports(output_dir)
+
+    failed = len(onnx_file_list) - len(ok_records)
+    if failed:
+        print(f"{failed} models could not be analyzed, see {journal_path}")
+    print(f"Saved all reports to {os.path.abspath(output_dir)}")
+    return {
+        signatures[onnx_file]["model_file"]: journal_records[
+            signatures[onnx_file]["model_file"]
+        ]
+        for onnx_file in onnx_file_list
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate model analysis reports for one or more ONNX models."
+    )
+    parser.add_argument(
+        "onnx_files", type=str, help="Filepath or directory to onnx file(s)."
+    )
+    parser.add_argument(
+        "output_dir",
+        type=str,
+        help="Directory to save text report and csv files.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always analyze the models instead of reusing the cached analysis.",
+    )
+    parser.add_argument(
+        "--dim-values",
+        type=parse_dim_values,
+        default=None,
+        help="Values of the dynamic input dims used for the model FLOPs of the "
+        "global summary, for example batch=8,seq=512.",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of models analyzed in parallel, defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds after which the analysis of a model is stopped.",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Analyze every model again instead of skipping the models found in "
+        f"the {JOURNAL_FILENAME} of the output directory.",
+    )
+
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Analyze only shard i of N, for example 2/8, and save its partial "
+        "aggregate instead of the global reports. Merge the partials with digest-merge.",
+    )
+
+    args = parser.parse_args()
+
+    analyze_models(
+        args.onnx_files,
+        args.output_dir,
+        use_cache=not args.no_cache,
+        dim_values=args.dim_values,
+        workers=args.workers,
+        timeout=args.timeout,
+        resume=not args.no_resume,
+        shard=args.shard,
+    )
+
+
+def merge_main():
+    parser = argparse.ArgumentParser(
+        description="Merge the partial-aggregate files of sharded digest-analyze "
+        "runs into the global reports."
+    )
+    parser.add_argument(
+        "partials",
+        type=str,
+        nargs="+",
+        help=f"Partial-aggregate files, or directories containing {PARTIAL_FILENAME} files.",
+    )
+    parser.add_argument(
+        "output_dir",
+        type=str,
+        help="Directory to save the global csv files.",
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.output_dir):
+        raise FileExistsError(
+            f"The directory {os.path.abspath(args.output_dir)} does not exist; please create it."
+        )
+
+    partial_files = find_partials(args.partials)
+    if not partial_files:
+        raise FileNotFoundError(f"No partial-aggregate files found in {args.partials}")
+
+    aggregate = merge_partials(partial_files)
+    aggregate.save_reports(args.output_dir)
+    print(
+        f"Merged {len(aggregate.model_data)} models from {len(partial_files)} partials "
+        f"into {os.path.abspath(args.output_dir)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,11 @@ class ProgressDialog(QProgressDialog):
         """
         super().__init__(label, "Cancel", 1, num_steps, parent)
 
+        # Unlike the canceled signal, which is also emitted when the dialog is
+        # closed, the button is only clicked by the user
+        self.cancel_button = QPushButton("Cancel", self)
+        self.setCancelButton(self.cancel_button)
+
         self.setWindowModality(Qt.WindowModality.WindowModal)
         self.setMinimumDuration(0)
         self.setWindowTitle("Digest")
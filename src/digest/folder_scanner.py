@@ -0,0 +1,216 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Iterator, List, Optional, Dict, Set, Tuple
+from google.protobuf.message import DecodeError
+
+# pylint: disable=no-name-in-module
+from PySide6.QtCore import Signal, QThread
+
+from digest.model_class.digest_report_model import load_yaml_report, report_fingerprint
+from utils import onnx_utils
+
+# Number of files probed in parallel by the folder scan
+SCAN_WORKERS = min(8, os.cpu_count() or 1)
+
+# Seconds between the checks for a canceled scan while the probes are running
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def iter_model_files(directory: str) -> Iterator[str]:
+    """Yields the onnx and yaml files under directory with a single os.scandir
+    walk. Hidden files and directories are skipped, like the recursive glob did,
+    and symbolic links to directories are not followed."""
+    directories = [directory]
+    while directories:
+        current = directories.pop()
+        try:
+            with os.scandir(current) as scandir_it:
+                entries = sorted(scandir_it, key=lambda entry: entry.name)
+        except OSError as error:
+            print(f"Unable to scan {current}: {error}")
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.endswith((".onnx", ".yaml")) and entry.is_file():
+                yield os.path.normpath(entry.path)
+        # The subdirectories are popped in alphabetical order
+        directories.extend(reversed(subdirectories))
+
+
+def probe_model_file(
+    filepath: str, ignore_metadata: bool = False
+) -> Tuple[Optional[str], str, Optional[str]]:
+    """Returns the kind of model file, its path and its fingerprint, which is
+    the fingerprint of the graph for onnx models. The kind is None for the files
+    that are not models."""
+    extension = os.path.splitext(filepath)[-1]
+    try:
+        if extension == ".onnx":
+            probe = onnx_utils.probe_onnx(filepath)
+            if ignore_metadata:
+                return "onnx", filepath, probe.canonical_fingerprint
+            return "onnx", filepath, probe.graph_fingerprint
+        if extension == ".yaml":
+            report = load_yaml_report(filepath)
+            if report is not None:
+                return "report", filepath, report_fingerprint(report)
+    except (DecodeError, ValueError, IndexError, OSError) as error:
+        print(f"Error decoding model {filepath}: {error}")
+    return None, filepath, None
+
+
+def hash_model_file(
+    filepath: str, ignore_metadata: bool = False
+) -> Tuple[Optional[str], str, Optional[str]]:
+    try:
+        if ignore_metadata:
+            return "hash", filepath, onnx_utils.hash_onnx_canonical(filepath)
+        return "hash", filepath, onnx_utils.hash_file(filepath)
+    except (ValueError, IndexError, OSError) as error:
+        print(f"Error reading model {filepath}: {error}")
+        # A file that cannot be read is not reported as a duplicate
+        return "hash", filepath, f"unreadable:{filepath}"
+
+
+class FolderScanThread(QThread):
+    """Scans a directory for models in the background. The files are probed on a
+    thread pool while the directory is walked, and every model is reported as
+    soon as it is known whether it duplicates a model found before it. With
+    ignore_metadata, onnx models that differ only in their metadata or node names
+    are duplicates as well."""
+
+    model_found = Signal(str)  # Path of a model that is not a duplicate
+    duplicate_found = Signal(str, str)  # Paths of the model and of its duplicate
+    progress = Signal(int, int)  # Number of files probed and found so far
+    completed = Signal(bool)  # False if the scan was canceled
+
+    def __init__(
+        self,
+        directory: str,
+        num_workers: int = SCAN_WORKERS,
+        ignore_metadata: bool = False,
+    ):
+        super().__init__()
+        self.directory = directory
+        self.num_workers = num_workers
+        self.ignore_metadata = ignore_metadata
+        self.user_canceled = False
+
+        self.num_files = 0
+        self.num_scanned = 0
+        # The probes are processed in the order the files were found, so the
+        # first copy of a model is the one that is kept
+        self.probes: Deque[Future] = deque()
+        self.hashes: Set[Future] = set()
+        # The models that are not duplicates, by graph fingerprint. The
+        # fingerprint skips the weights, so models sharing one are only
+        # duplicates if the contents of the files are the same as well. It covers
+        # the size of every field, so files of different sizes are never hashed.
+        self.fingerprint_models: defaultdict[str, List[str]] = defaultdict(list)
+        # The models waiting for content hashes before they can be reported
+        self.fingerprint_pending: defaultdict[str, List[str]] = defaultdict(list)
+        self.model_fingerprints: Dict[str, str] = {}
+        self.content_hashes: Dict[str, Optional[str]] = {}
+        # The reports that are not duplicates, by report fingerprint
+        self.reports: Dict[str, str] = {}
+
+    def run(self):
+        executor = ThreadPoolExecutor(self.num_workers)
+        try:
+            for filepath in iter_model_files(self.directory):
+                if self.user_canceled:
+                    break
+                self.num_files += 1
+                self.probes.append(
+                    executor.submit(probe_model_file, filepath, self.ignore_metadata)
+                )
+                # A bounded number of probes are queued so that the models show up
+                # while the directory is still being walked
+                while (
+                    len(self.probes) >= 2 * self.num_workers
+                    and not self.user_canceled
+                ):
+                    self.process_results(executor)
+            while (self.probes or self.hashes) and not self.user_canceled:
+                self.process_results(executor)
+        finally:
+            # The probes that are still running finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.completed.emit(not self.user_canceled)
+
+    def process_results(self, executor: ThreadPoolExecutor) -> None:
+        waiting = set(self.hashes)
+        if self.probes:
+            waiting.add(self.probes[0])
+        # The wait times out so that a scan stuck on a slow file can be canceled
+        done, _ = wait(
+            waiting, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED
+        )
+
+        for future in done & self.hashes:
+            self.hashes.remove(future)
+            _, filepath, content_hash = future.result()
+            self.content_hashes[filepath] = content_hash
+            self.resolve_pending(self.model_fingerprints[filepath])
+
+        while self.probes and self.probes[0].done():
+            kind, filepath, value = self.probes.popleft().result()
+            self.num_scanned += 1
+            if kind == "onnx" and value is not None:
+                self.add_onnx_model(executor, filepath, value)
+            elif kind == "report" and value is not None:
+                self.add_report(filepath, value)
+            self.progress.emit(self.num_scanned, self.num_files)
+
+    def add_onnx_model(
+        self, executor: ThreadPoolExecutor, filepath: str, fingerprint: str
+    ) -> None:
+        self.model_fingerprints[filepath] = fingerprint
+        if not self.fingerprint_models[fingerprint]:
+            self.fingerprint_models[fingerprint].append(filepath)
+            self.model_found.emit(filepath)
+            return
+        # The files are only hashed when their fingerprints collide
+        self.fingerprint_pending[fingerprint].append(filepath)
+        for path in self.fingerprint_models[fingerprint] + [filepath]:
+            if path not in self.content_hashes:
+                self.content_hashes[path] = None
+                self.hashes.add(
+                    executor.submit(hash_model_file, path, self.ignore_metadata)
+                )
+
+    def resolve_pending(self, fingerprint: str) -> None:
+        models = self.fingerprint_models[fingerprint]
+        pending = self.fingerprint_pending[fingerprint]
+        # The pending models are resolved in the order they were found
+        while pending and all(
+            self.content_hashes[path] for path in models + [pending[0]]
+        ):
+            filepath = pending.pop(0)
+            content_hash = self.content_hashes[filepath]
+            duplicate_of = next(
+                (path for path in models if self.content_hashes[path] == content_hash),
+                None,
+            )
+            if duplicate_of:
+                self.duplicate_found.emit(duplicate_of, filepath)
+            else:
+                models.append(filepath)
+                self.model_found.emit(filepath)
+
+    def add_report(self, filepath: str, fingerprint: str) -> None:
+        if fingerprint in self.reports:
+            self.duplicate_found.emit(self.reports[fingerprint], filepath)
+            return
+        self.reports[fingerprint] = filepath
+        self.model_found.emit(filepath)
+
+    def stop_scanning(self) -> None:
+        self.user_canceled = True
@@ -19,10 +19,12 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Signal
 from onnx import ModelProto, save, shape_inference, checker
+from onnx.checker import MAXIMUM_PROTOBUF
 import onnxruntime.tools.make_dynamic_shape_fixed as ort_fixed
 from digest.ui.freezeinputs_ui import Ui_freezeInputs
 from digest.dialog import ProgressDialog
 from digest.qt_utils import apply_dark_style_sheet
+from digest.model_class.digest_onnx_model import DigestOnnxModel
 from utils import onnx_utils
 
 ROOT_FOLDER = os.path.dirname(os.path.abspath(__file__))
@@ -47,6 +49,8 @@ class FreezeInputs(QWidget):
         model_proto: ModelProto,
         model_name: str,
         parent=None,
+        model_filepath: Optional[str] = None,
+        digest_model: Optional[DigestOnnxModel] = None,
     ):
         super().__init__(parent)
         self.ui = Ui_freezeInputs()
@@ -61,7 +65,11 @@ class FreezeInputs(QWidget):
 
         self.model_name = model_name
         self.model_proto = model_proto
+        # The large initializers of the proto may still be in this file
+        self.model_filepath = model_filepath
         self.proto_copy = copy.deepcopy(model_proto)
+        # The analysis of the dynamic model, used to preview the entered dims
+        self.digest_model = digest_model
 
         self.ui.selectDirBtn.setEnabled(True)
         self.ui.applyShapesBtn.setEnabled(False)
@@ -83,11 +91,22 @@ class FreezeInputs(QWidget):
             line_edit = ModernLineEdit(self.check_form_complete)
             self.ui.formLayout.addRow(label, line_edit)
 
-        model_inputs = onnx_utils.get_model_input_shapes_types(model_proto)
-        self.update_inputs_table(model_inputs)
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        self.preview_label.hide()
+        self.ui.verticalLayout_20.insertWidget(
+            self.ui.verticalLayout_20.indexOf(self.ui.applyShapesBtn),
+            self.preview_label,
+        )
+
+        self.model_inputs = onnx_utils.get_model_input_shapes_types(model_proto)
+        self.update_inputs_table(self.model_inputs)
 
         try:
-            checker.check_model(model_proto, full_check=True)
+            # The checker resolves external data relative to the model file
+            checker.check_model(
+                model_filepath if model_filepath else model_proto, full_check=True
+            )
         except checker.ValidationError as exp:
             print(f"Model did not pass checker: {exp}")
             self.show_warning_and_disable_page()
@@ -138,9 +157,48 @@ class FreezeInputs(QWidget):
                 widget = item.widget()
                 if isinstance(widget, QLineEdit) and not widget.text().strip():
                     self.ui.applyShapesBtn.setEnabled(False)
+                    self.update_preview()
                     return
 
         self.ui.applyShapesBtn.setEnabled(True)
+        self.update_preview()
+
+    def get_form_dims(self) -> Dict[str, int]:
+        """The dims of the form that have an integer value"""
+        dims: Dict[str, int] = {}
+        for i in range(self.ui.formLayout.rowCount()):
+            label_item = self.ui.formLayout.itemAt(i, QFormLayout.ItemRole.LabelRole)
+            field_item = self.ui.formLayout.itemAt(i, QFormLayout.ItemRole.FieldRole)
+            if label_item and field_item:
+                label = label_item.widget()
+                line_edit = field_item.widget()
+                if isinstance(label, QLabel) and isinstance(line_edit, QLineEdit):
+                    try:
+                        dims[label.text()] = int(line_edit.text())
+                    except ValueError:
+                        continue
+        return dims
+
+    def update_preview(self) -> None:
+        """Shows the FLOPs and tensor sizes of the model for the entered dims. They
+        are evaluated from the analysis of the dynamic model, so the shapes do not
+        have to be applied first."""
+        if self.digest_model is None:
+            return
+        try:
+            evaluation = self.digest_model.evaluate_dynamic_dims(self.get_form_dims())
+        except ValueError:
+            self.preview_label.hide()
+            self.update_inputs_table(self.model_inputs)
+            return
+
+        flops = "N/A" if evaluation.flops is None else format(evaluation.flops, ",")
+        preview = f"FLOPs: {flops}"
+        if evaluation.activation_kbytes is not None:
+            preview += f"    Activations: {evaluation.activation_kbytes:,.2f} KB"
+        self.preview_label.setText(preview)
+        self.preview_label.show()
+        self.update_inputs_table(evaluation.model_inputs)
 
     def apply_static_shapes(self) -> None:
 
@@ -192,7 +250,17 @@ class FreezeInputs(QWidget):
             static_model_filepath = os.path.join(
                 self.save_directory, static_model_filename
             )
-            save(inferred_model, static_model_filepath)
+            if self.model_filepath:
+                onnx_utils.load_external_data(inferred_model, self.model_filepath)
+            if inferred_model.ByteSize() < MAXIMUM_PROTOBUF:
+                save(inferred_model, static_model_filepath)
+            else:
+                save(
+                    inferred_model,
+                    static_model_filepath,
+                    save_as_external_data=True,
+                    location=f"{static_model_filename}.data",
+                )
             # We re-copy over the static model so that the user can create another variant
             self.proto_copy = copy.deepcopy(self.model_proto)
             status.setLabelText("Opening static model")
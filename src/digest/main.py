@@ -5,6 +5,9 @@ import os
 import sys
 import shutil
 import argparse
+import multiprocessing
+import threading
+import weakref
 from typing import Dict, Tuple, Optional
 import tempfile
 from enum import IntEnum
@@ -36,7 +39,7 @@ from PySide6.QtGui import QDragEnterEvent, QDropEvent, QPixmap, QIcon, QFont
 from PySide6.QtCore import Qt, QSize, QThreadPool, Signal
 
 from digest.dialog import StatusDialog, InfoDialog, WarnDialog, ProgressDialog
-from digest.similarity_analysis import SimilarityWorker, post_process
+from digest.similarity_analysis import SimilarityWorker
 from digest.popup_window import PopupWindow
 from digest.huggingface_page import HuggingfacePage
 from digest.multi_model_selection_page import MultiModelSelectionPage
@@ -45,12 +48,10 @@ from digest.modelsummary import modelSummary
 from digest.node_summary import NodeSummary
 from digest.qt_utils import apply_dark_style_sheet
 from digest.model_class.digest_model import SupportedModelTypes, DigestModel
-from digest.model_class.digest_onnx_model import (
-    DigestOnnxModel,
+from digest.model_class.digest_onnx_model import DigestOnnxModel
+from digest.model_class.digest_report_model import DigestReportModel
+from digest.model_workers import (
     LoadDigestOnnxModelWorker,
-)
-from digest.model_class.digest_report_model import (
-    DigestReportModel,
     LoadDigestReportModelWorker,
 )
 from utils import onnx_utils
@@ -207,12 +208,14 @@ class DigestApp(QMainWindow):
         self.ui.infoBtn.clicked.connect(self.show_info_dialog)
         self.infoDialog = None
 
-        self.load_progress: Optional[ProgressDialog] = None
-
         enable_huggingface_model = True
         with open(DigestConfig.GUI_CONFIG_PATH, "r", encoding="utf-8") as f:
             config = yaml.safe_load(f)
             enable_huggingface_model = config["modules"]["huggingface"]
+            self.model_loading_config = config.get("model_loading") or {}
+
+        # Set to cancel the models being loaded, see LoadDigestOnnxModelWorker
+        self.load_cancel_events: weakref.WeakSet = weakref.WeakSet()
 
         if not enable_huggingface_model:
             self.ui.huggingfaceBtn.hide()
@@ -315,16 +318,9 @@ class DigestApp(QMainWindow):
         # convert back to a List[str]
         most_similar_list = most_similar.split(",")
 
+        # The heatmap was rendered by the SimilarityWorker
         if completed_successfully and isinstance(widget, modelSummary) and png_filepath:
 
-            if df_sorted is not None:
-                post_process(
-                    self.digest_models[model_id].model_name,
-                    most_similar_list,
-                    df_sorted,
-                    png_filepath,
-                )
-
             widget.load_gif.stop()
             widget.ui.similarityImg.clear()
             # We give the image a 10% haircut to fit it more aesthetically
@@ -415,12 +411,13 @@ class DigestApp(QMainWindow):
                     self.ui.tabWidget.setCurrentIndex(index)
                     return
 
-            # Create progress dialog with indeterminate progress bar
-            self.load_progress = ProgressDialog(label="Loading Model...", parent=self)
+            # Every load has its own progress dialog with an indeterminate progress
+            # bar, which is closed when that load is done
+            load_progress = ProgressDialog(label="Loading Model...", parent=self)
             # Setting min=max=0 creates an indeterminate progress bar
-            self.load_progress.setMinimum(0)
-            self.load_progress.setMaximum(0)
-            self.load_progress.setLabelText(
+            load_progress.setMinimum(0)
+            load_progress.setMaximum(0)
+            load_progress.setLabelText(
                 "Creating a Digest model.\n"
                 "Please be patient as this could take a minute."
             )
@@ -429,15 +426,39 @@ class DigestApp(QMainWindow):
             digest_model_worker = None
 
             if file_ext == ".onnx":
+                memory_limit_gb = self.model_loading_config.get("memory_limit_gb")
+                isolated = self.model_loading_config.get("isolated", False)
+                cancel_event = threading.Event()
+                if isolated:
+                    # Only the loads in a child process can be canceled
+                    self.load_cancel_events.add(cancel_event)
+                    load_progress.cancel_button.clicked.connect(cancel_event.set)
+                    load_progress.rejected.connect(cancel_event.set)
+                else:
+                    load_progress.setCancelButton(None)
                 digest_model_worker = LoadDigestOnnxModelWorker(
-                    model_name=basename, model_file_path=file_path
+                    model_name=basename,
+                    model_file_path=file_path,
+                    isolated=isolated,
+                    timeout=self.model_loading_config.get("timeout_seconds"),
+                    memory_limit=(
+                        int(memory_limit_gb * 1024**3) if memory_limit_gb else None
+                    ),
+                    cancel_event=cancel_event,
+                )
+                digest_model_worker.signals.failed.connect(
+                    lambda _: load_progress.close()
                 )
+                digest_model_worker.signals.failed.connect(self.load_model_failed)
             elif file_ext == ".yaml":
                 digest_model_worker = LoadDigestReportModelWorker(
                     model_name=basename, model_file_path=file_path
                 )
 
             if digest_model_worker is not None:
+                digest_model_worker.signals.completed.connect(
+                    lambda _: load_progress.close()
+                )
                 digest_model_worker.signals.completed.connect(self.post_load_model)
                 self.thread_pool.start(digest_model_worker)
         except ModelLoadError as e:
@@ -449,12 +470,14 @@ class DigestApp(QMainWindow):
             )
             self.status_dialog.show()
 
+    def load_model_failed(self, message: str):
+        self.status_dialog = StatusDialog(message, parent=self)
+        self.status_dialog.show()
+        print(message)
+
     def post_load_model(self, digest_model: DigestModel):
         """This function is automatically run after the model load workers are finished"""
 
-        if self.load_progress:
-            self.load_progress.close()
-
         if digest_model.unique_id:
             model_id = digest_model.unique_id
         else:
@@ -510,7 +533,11 @@ class DigestApp(QMainWindow):
             model_summary.png_file_path = png_file_path
 
             similarity_worker = SimilarityWorker(
-                digest_model.filepath, png_file_path, model_id
+                digest_model.filepath,
+                png_file_path,
+                model_id,
+                content_hash=digest_model.content_hash,
+                model_name=digest_model.model_name,
             )
             similarity_worker.signals.completed.connect(self.update_similarity_widget)
             self.thread_pool.start(similarity_worker)
@@ -731,6 +758,15 @@ class DigestApp(QMainWindow):
             if hasattr(self, "temp_dir"):
                 self.temp_dir.cleanup()
 
+            # Stop scanning the folder of the multi-model page
+            if hasattr(self, "multimodelselection_page"):
+                self.multimodelselection_page.stop_scan(wait=True)
+
+            # Kill the processes of the isolated model loads
+            if hasattr(self, "load_cancel_events"):
+                for cancel_event in list(self.load_cancel_events):
+                    cancel_event.set()
+
             # Wait for thread pool to finish
             if hasattr(self, "thread_pool"):
                 self.thread_pool.waitForDone()
@@ -741,6 +777,10 @@ class DigestApp(QMainWindow):
 
 def main():
 
+    # The multi-model analysis runs in spawned processes, which start the
+    # executable again when it is frozen
+    multiprocessing.freeze_support()
+
     parser = argparse.ArgumentParser(
         description="",
     )
@@ -7,7 +7,23 @@ from dataclasses import dataclass, field
 from uuid import uuid4
 from abc import ABC, abstractmethod
 from collections import Counter, OrderedDict, defaultdict
-from typing import List, Dict, Optional, Any, Union
+from itertools import islice
+from typing import (
+    List,
+    Dict,
+    Optional,
+    Any,
+    Union,
+    Iterator,
+    MutableMapping,
+    Tuple,
+    TYPE_CHECKING,
+)
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
 
 
 class SupportedModelTypes(Enum):
@@ -30,20 +46,49 @@ class NodeTypeCounts(Dict[str, int]):
         super().__init__(*args, **kwargs)
 
 
-@dataclass
+@dataclass(frozen=True)
 class TensorInfo:
-    "Used to store node input and output tensor information"
+    """Used to store node input and output tensor information. The same instance is
+    shared by every node that produces or consumes the tensor, so it is frozen and
+    the shape list must not be modified either."""
+
     dtype: Optional[str] = None
     dtype_bytes: Optional[int] = None
     size_kbytes: Optional[float] = None
     shape: List[Union[int, str]] = field(default_factory=list)
 
+    def __hash__(self) -> int:
+        return hash((self.dtype, self.dtype_bytes, self.size_kbytes, tuple(self.shape)))
+
+    def with_dim_values(self, dim_values: Dict[str, int]) -> "TensorInfo":
+        """Returns a copy with the named dims of the shape replaced by the values
+        in dim_values. The size is filled in if the new shape is fully static."""
+        if not any(isinstance(dim, str) and dim in dim_values for dim in self.shape):
+            return self
+        shape = [
+            dim_values.get(dim, dim) if isinstance(dim, str) else dim
+            for dim in self.shape
+        ]
+        size_kbytes = None
+        if all(isinstance(dim, int) for dim in shape) and self.dtype_bytes:
+            size_kbytes = float(np.prod(shape)) * float(self.dtype_bytes) / 1024.0
+        return TensorInfo(self.dtype, self.dtype_bytes, size_kbytes, shape)
+
 
 class TensorData(OrderedDict[str, TensorInfo]):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
 
+def _nth_tensor(tensors: TensorData, index: int) -> TensorInfo:
+    # Avoids building a list of all the tensors to pick a single one
+    if index < 0:
+        index += len(tensors)
+    if not 0 <= index < len(tensors):
+        raise IndexError("list index out of range")
+    return next(islice(tensors.values(), index, None))
+
+
 class NodeInfo:
     def __init__(self) -> None:
         self.flops: Optional[int] = None
@@ -56,10 +101,28 @@ class NodeInfo:
         self.outputs = TensorData()
 
     def get_input(self, index: int) -> TensorInfo:
-        return list(self.inputs.values())[index]
+        return _nth_tensor(self.inputs, index)
 
     def get_output(self, index: int) -> TensorInfo:
-        return list(self.outputs.values())[index]
+        return _nth_tensor(self.outputs, index)
+
+    def with_dim_values(self, dim_values: Dict[str, int]) -> "NodeInfo":
+        """Returns a copy whose tensors have the named dims replaced, see
+        TensorInfo.with_dim_values"""
+        node_info = NodeInfo()
+        node_info.flops = self.flops
+        node_info.parameters = self.parameters
+        node_info.node_type = self.node_type
+        node_info.attributes = self.attributes
+        node_info.inputs = TensorData(
+            (name, info.with_dim_values(dim_values))
+            for name, info in self.inputs.items()
+        )
+        node_info.outputs = TensorData(
+            (name, info.with_dim_values(dim_values))
+            for name, info in self.outputs.items()
+        )
+        return node_info
 
     def __str__(self):
         """Provides a human-readable string representation of NodeInfo."""
@@ -87,16 +150,517 @@ class NodeInfo:
         return "\n".join(output)
 
 
+class _GrowableArray:
+    """One dimensional NumPy array with amortized O(1) appends."""
+
+    def __init__(self, dtype: Any, capacity: int = 64) -> None:
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._data):
+            data = np.empty(max(size, 2 * len(self._data)), dtype=self._data.dtype)
+            data[: self._size] = self._data[: self._size]
+            self._data = data
+
+    def append(self, value: Any) -> int:
+        self._reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, values: List[Any]) -> int:
+        start = self._size
+        self._reserve(self._size + len(values))
+        self._data[start : start + len(values)] = values
+        self._size += len(values)
+        return start
+
+    @property
+    def values(self) -> np.ndarray:
+        """A view of the filled part of the array, no data is copied."""
+        return self._data[: self._size]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only pickle the filled part of the buffer
+        return {"_data": self.values.copy(), "_size": self._size}
+
+
+class _RowTensorData(TensorData):
+    """TensorData of one row of a NodeTable. Changes made in place, such as
+    assigning or popping a tensor, are written back to the row of the table."""
+
+    def __init__(self, table: "NodeTable", id_lists: "_TensorIdLists", row: int):
+        # Filling the dict must not write the row back to the table
+        self._table: Optional["NodeTable"] = None
+        super().__init__(table._tensor_items(id_lists, row))
+        self._table = table
+        self._id_lists = id_lists
+        self._row = row
+
+    def __reduce__(self):
+        # Copies and pickles are detached from the table
+        return (TensorData, (list(self.items()),))
+
+    def _write_back(self) -> None:
+        if self._table is not None:
+            self._id_lists.set_row(self._row, self._table._intern_tensors(self))
+
+    def __setitem__(self, name: str, info: TensorInfo) -> None:
+        super().__setitem__(name, info)
+        self._write_back()
+
+    def __delitem__(self, name: str) -> None:
+        super().__delitem__(name)
+        self._write_back()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, *args):
+        info = super().pop(*args)
+        self._write_back()
+        return info
+
+    def popitem(self, last: bool = True):
+        item = super().popitem(last)
+        self._write_back()
+        return item
+
+    def setdefault(self, name: str, default: Optional[TensorInfo] = None):
+        info = super().setdefault(name, default)
+        self._write_back()
+        return info
+
+    def move_to_end(self, name: str, last: bool = True) -> None:
+        super().move_to_end(name, last)
+        self._write_back()
+
+    def update(self, *args, **kwargs) -> None:
+        table, self._table = self._table, None
+        try:
+            super().update(*args, **kwargs)
+        finally:
+            self._table = table
+        self._write_back()
+
+    def clear(self) -> None:
+        super().clear()
+        self._write_back()
+
+
+class NodeView(NodeInfo):
+    """NodeInfo compatible view of a single row of a NodeTable. Reads and writes go
+    straight to the columns of the table so no per node objects are kept around.
+    The inputs and outputs are rebuilt on every read, in place changes to them are
+    written back to the table."""
+
+    __slots__ = ("_table", "_row")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, table: "NodeTable", row: int) -> None:
+        self._table = table
+        self._row = row
+
+    @property
+    def flops(self) -> Optional[int]:  # type: ignore[override]
+        if self._table._flops_missing.values[self._row]:
+            return None
+        return int(self._table._flops.values[self._row])
+
+    @flops.setter
+    def flops(self, value: Optional[int]) -> None:
+        self._table._set_flops(self._row, value)
+
+    @property
+    def parameters(self) -> int:  # type: ignore[override]
+        return int(self._table._parameters.values[self._row])
+
+    @parameters.setter
+    def parameters(self, value: int) -> None:
+        self._table._parameters.values[self._row] = value
+
+    @property
+    def node_type(self) -> Optional[str]:  # type: ignore[override]
+        return self._table._op_type_from_code(self._table._op_codes.values[self._row])
+
+    @node_type.setter
+    def node_type(self, value: Optional[str]) -> None:
+        self._table._op_codes.values[self._row] = self._table._op_type_code(value)
+
+    @property
+    def attributes(self) -> OrderedDict[str, Any]:  # type: ignore[override]
+        attributes = self._table._attributes[self._row]
+        if attributes is None:
+            attributes = OrderedDict()
+            self._table._attributes[self._row] = attributes
+        return attributes
+
+    @attributes.setter
+    def attributes(self, value: OrderedDict[str, Any]) -> None:
+        self._table._attributes[self._row] = value if value else None
+
+    @property
+    def inputs(self) -> TensorData:  # type: ignore[override]
+        return _RowTensorData(self._table, self._table._inputs, self._row)
+
+    @inputs.setter
+    def inputs(self, value: TensorData) -> None:
+        self._table._inputs.set_row(self._row, self._table._intern_tensors(value))
+
+    @property
+    def outputs(self) -> TensorData:  # type: ignore[override]
+        return _RowTensorData(self._table, self._table._outputs, self._row)
+
+    @outputs.setter
+    def outputs(self, value: TensorData) -> None:
+        self._table._outputs.set_row(self._row, self._table._intern_tensors(value))
+
+    def get_input(self, index: int) -> TensorInfo:
+        return self._table.tensor_info(self._table._inputs.get(self._row, index))
+
+    def get_output(self, index: int) -> TensorInfo:
+        return self._table.tensor_info(self._table._outputs.get(self._row, index))
+
+
+class _TensorIdLists:
+    """Variable length lists of tensor ids per node stored in CSR form. A row that is
+    reassigned gets a new segment at the end of the id buffer."""
+
+    def __init__(self) -> None:
+        self.ids = _GrowableArray(np.int32)
+        self.starts = _GrowableArray(np.int64)
+        self.counts = _GrowableArray(np.int32)
+
+    def append_row(self, tensor_ids: List[int]) -> None:
+        self.starts.append(self.ids.extend(tensor_ids))
+        self.counts.append(len(tensor_ids))
+
+    def set_row(self, row: int, tensor_ids: List[int]) -> None:
+        self.starts.values[row] = self.ids.extend(tensor_ids)
+        self.counts.values[row] = len(tensor_ids)
+
+    def row(self, row: int) -> np.ndarray:
+        start = self.starts.values[row]
+        return self.ids.values[start : start + self.counts.values[row]]
+
+    def get_at(self, rows: np.ndarray, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        counts = self.counts.values[rows]
+        indices = counts + index if index < 0 else np.full_like(counts, index)
+        present = (indices >= 0) & (indices < counts)
+        tensor_ids = np.full(len(rows), -1, dtype=np.int32)
+        positions = self.starts.values[rows][present] + indices[present]
+        tensor_ids[present] = self.ids.values[positions]
+        return tensor_ids, present
+
+    def get(self, row: int, index: int) -> int:
+        count = int(self.counts.values[row])
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("list index out of range")
+        return int(self.ids.values[self.starts.values[row] + index])
+
+
+class NodeTable(MutableMapping[str, NodeInfo]):
+    """Column oriented store of the node level data of a model.
+
+    Each node is a row of NumPy columns (op type code, FLOPs, parameters) and its
+    input and output tensors are ids into a table of interned TensorInfo objects.
+    The table behaves like the ordered mapping of node name to NodeInfo it replaces:
+    indexing returns a NodeView and assigning a NodeInfo copies it into the columns,
+    so later changes to that NodeInfo object are not seen by the table. Since tensor
+    infos are shared between the nodes that use them they must not be mutated after
+    they are added.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._index: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._op_types: List[str] = []
+        self._op_type_codes: Dict[str, int] = {}
+        self._op_codes = _GrowableArray(np.int32)
+        self._flops = _GrowableArray(np.int64)
+        # True where the FLOPs are unknown, the same convention as pandas masked arrays
+        self._flops_missing = _GrowableArray(np.bool_)
+        self._parameters = _GrowableArray(np.int64)
+        self._attributes: List[Optional[OrderedDict[str, Any]]] = []
+        self._inputs = _TensorIdLists()
+        self._outputs = _TensorIdLists()
+        self._tensor_names: List[str] = []
+        self._tensor_infos: List[TensorInfo] = []
+        self._tensor_ids: Dict[Any, int] = {}
+        # Tensors with different names often share the same info, each distinct
+        # info gets a code so that per shape work is only done once.
+        self._unique_tensor_infos: List[TensorInfo] = []
+        self._unique_tensor_info_codes: Dict[TensorInfo, int] = {}
+        self._tensor_info_codes = _GrowableArray(np.int32)
+        self.update(*args, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._index
+
+    def __getitem__(self, name: str) -> NodeView:
+        return NodeView(self, self._index[name])
+
+    def __setitem__(self, name: str, node_info: NodeInfo) -> None:
+        row = self._index.get(name)
+        if row is None:
+            # Same as an OrderedDict, a new name goes to the end and
+            # assigning an existing name keeps its position.
+            row = len(self._names)
+            self._index[name] = row
+            self._names.append(name)
+            self._op_codes.append(-1)
+            self._flops.append(0)
+            self._flops_missing.append(True)
+            self._parameters.append(0)
+            self._attributes.append(None)
+            self._inputs.append_row(self._intern_tensors(node_info.inputs))
+            self._outputs.append_row(self._intern_tensors(node_info.outputs))
+        else:
+            self._inputs.set_row(row, self._intern_tensors(node_info.inputs))
+            self._outputs.set_row(row, self._intern_tensors(node_info.outputs))
+        self._op_codes.values[row] = self._op_type_code(node_info.node_type)
+        self._set_flops(row, node_info.flops)
+        self._parameters.values[row] = node_info.parameters
+        self._attributes[row] = node_info.attributes if node_info.attributes else None
+
+    def __delitem__(self, name: str) -> None:
+        # Deleting is rare so the columns are simply rebuilt without the row
+        rows = [self[node_name] for node_name in self._names if node_name != name]
+        names = [node_name for node_name in self._names if node_name != name]
+        if len(names) == len(self._names):
+            raise KeyError(name)
+        table = NodeTable(zip(names, rows))
+        self.__dict__.update(table.__dict__)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} nodes, {len(self._tensor_infos)} tensors)"
+
+    def _op_type_code(self, op_type: Optional[str]) -> int:
+        if op_type is None:
+            return -1
+        code = self._op_type_codes.get(op_type)
+        if code is None:
+            code = len(self._op_types)
+            self._op_type_codes[op_type] = code
+            self._op_types.append(op_type)
+        return code
+
+    def _op_type_from_code(self, code: int) -> Optional[str]:
+        return None if code < 0 else self._op_types[code]
+
+    def _set_flops(self, row: int, flops: Optional[int]) -> None:
+        self._flops_missing.values[row] = flops is None
+        self._flops.values[row] = 0 if flops is None else flops
+
+    def _intern_tensors(self, tensors: TensorData) -> List[int]:
+        tensor_ids = []
+        for name, info in tensors.items():
+            key = (name, info)
+            tensor_id = self._tensor_ids.get(key)
+            if tensor_id is None:
+                tensor_id = len(self._tensor_infos)
+                self._tensor_ids[key] = tensor_id
+                self._tensor_names.append(name)
+                self._tensor_infos.append(info)
+                info_code = self._unique_tensor_info_codes.setdefault(
+                    info, len(self._unique_tensor_infos)
+                )
+                if info_code == len(self._unique_tensor_infos):
+                    self._unique_tensor_infos.append(info)
+                self._tensor_info_codes.append(info_code)
+            tensor_ids.append(tensor_id)
+        return tensor_ids
+
+    def _tensor_items(
+        self, id_lists: _TensorIdLists, row: int
+    ) -> Iterator[Tuple[str, TensorInfo]]:
+        return (
+            (self._tensor_names[tensor_id], self._tensor_infos[tensor_id])
+            for tensor_id in id_lists.row(row).tolist()
+        )
+
+    def node_name(self, row: int) -> str:
+        return self._names[row]
+
+    def attributes_at(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        return [self._attributes[row] or {} for row in rows.tolist()]
+
+    @property
+    def tensor_infos(self) -> List[TensorInfo]:
+        """The interned tensor infos indexed by tensor id"""
+        return self._tensor_infos
+
+    @property
+    def tensor_names(self) -> List[str]:
+        """The tensor names indexed by tensor id"""
+        return self._tensor_names
+
+    @property
+    def unique_tensor_infos(self) -> List[TensorInfo]:
+        """The distinct tensor infos indexed by the codes in tensor_info_codes"""
+        return self._unique_tensor_infos
+
+    @property
+    def tensor_info_codes(self) -> np.ndarray:
+        """Code of the distinct tensor info of each tensor id"""
+        return self._tensor_info_codes.values
+
+    def tensor_info(self, tensor_id: int) -> TensorInfo:
+        return self._tensor_infos[tensor_id]
+
+    def tensor_name(self, tensor_id: int) -> str:
+        return self._tensor_names[tensor_id]
+
+    @property
+    def op_types(self) -> List[str]:
+        """The op type names indexed by the codes in op_type_codes"""
+        return self._op_types
+
+    @property
+    def op_type_codes(self) -> np.ndarray:
+        """Op type code per node, -1 for nodes without an op type"""
+        return self._op_codes.values
+
+    @property
+    def flops(self) -> np.ndarray:
+        """FLOPs per node, only meaningful where flops_missing is False"""
+        return self._flops.values
+
+    @property
+    def flops_missing(self) -> np.ndarray:
+        return self._flops_missing.values
+
+    @property
+    def parameters(self) -> np.ndarray:
+        return self._parameters.values
+
+    @property
+    def num_inputs(self) -> np.ndarray:
+        return self._inputs.counts.values
+
+    @property
+    def num_outputs(self) -> np.ndarray:
+        return self._outputs.counts.values
+
+    def input_tensor_ids_at(
+        self, rows: np.ndarray, index: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the tensor id of the index-th input of each row and a mask that is
+        False for the rows that do not have that many inputs"""
+        return self._inputs.get_at(rows, index)
+
+    def output_tensor_ids_at(
+        self, rows: np.ndarray, index: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._outputs.get_at(rows, index)
+
+    def input_tensor_ids(self, name: str) -> np.ndarray:
+        return self._inputs.row(self._index[name])
+
+    def output_tensor_ids(self, name: str) -> np.ndarray:
+        return self._outputs.row(self._index[name])
+
+    def node_shape_counts(self) -> NodeShapeCounts:
+        """Counts the input shapes per op type without building the node views"""
+        tensor_shapes = [tuple(info.shape) for info in self._tensor_infos]
+        starts = self._inputs.starts.values.tolist()
+        counts = self._inputs.counts.values.tolist()
+        tensor_ids = self._inputs.ids.values.tolist()
+        tensor_shape_counter = NodeShapeCounts()
+        for code, start, count in zip(self._op_codes.values.tolist(), starts, counts):
+            if code < 0 or not self._op_types[code]:
+                continue
+            shape_hash = tuple(
+                tensor_shapes[tensor_id]
+                for tensor_id in tensor_ids[start : start + count]
+            )
+            tensor_shape_counter[self._op_types[code]][shape_hash] += 1
+        return tensor_shape_counter
+
+    def to_pandas(self) -> "pd.DataFrame":
+        """Returns the node columns as a DataFrame. The numeric columns share their
+        memory with the table so the frame should be treated as read only."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        return pd.DataFrame(
+            {
+                "node_name": self._names,
+                "node_type": pd.Categorical.from_codes(
+                    self._op_codes.values, categories=self._op_types
+                ),
+                "parameters": self._parameters.values,
+                "flops": pd.arrays.IntegerArray(
+                    self._flops.values, self._flops_missing.values, copy=False
+                ),
+                "num_inputs": self._inputs.counts.values,
+                "num_outputs": self._outputs.counts.values,
+            },
+            copy=False,
+        )
+
+    def tensors_to_pandas(self) -> "pd.DataFrame":
+        """Returns the interned tensor table, the row index is the tensor id"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        return pd.DataFrame(
+            {
+                "tensor_name": self._tensor_names,
+                "dtype": [info.dtype for info in self._tensor_infos],
+                "dtype_bytes": [info.dtype_bytes for info in self._tensor_infos],
+                "size_kbytes": [info.size_kbytes for info in self._tensor_infos],
+                "shape": [list(info.shape) for info in self._tensor_infos],
+            }
+        )
+
+    def to_arrow(self) -> "pa.Table":
+        """Returns the node columns as an Arrow table, this requires pyarrow"""
+        try:
+            import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise ImportError(
+                "Exporting node data to Arrow requires pyarrow, "
+                "please install it with 'pip install pyarrow'."
+            ) from error
+
+        op_codes = self._op_codes.values
+        return pa.table(
+            {
+                "node_name": pa.array(self._names, type=pa.string()),
+                "node_type": pa.DictionaryArray.from_arrays(
+                    pa.array(op_codes, mask=op_codes < 0),
+                    pa.array(self._op_types, type=pa.string()),
+                ),
+                "parameters": pa.array(self._parameters.values),
+                "flops": pa.array(self._flops.values, mask=self._flops_missing.values),
+                "num_inputs": pa.array(self._inputs.counts.values),
+                "num_outputs": pa.array(self._outputs.counts.values),
+            }
+        )
+
+
 # The classes are for type aliasing. Once python 3.10 is the minimum we can switch to TypeAlias
-class NodeData(OrderedDict[str, NodeInfo]):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+NodeData = NodeTable
 
 
 class DigestModel(ABC):
     def __init__(self, filepath: str, model_name: str, model_type: SupportedModelTypes):
         # Public members exposed to the API
         self.unique_id: str = str(uuid4())
+        # Hash of the model file contents, set when the model is loaded through the cache
+        self.content_hash: Optional[str] = None
         self.filepath: Optional[str] = filepath
         self.model_name: str = model_name
         self.model_type: SupportedModelTypes = model_type
@@ -110,12 +674,7 @@ class DigestModel(ABC):
         self.model_outputs = TensorData()
 
     def get_node_shape_counts(self) -> NodeShapeCounts:
-        tensor_shape_counter = NodeShapeCounts()
-        for _, info in self.node_data.items():
-            shape_hash = tuple([tuple(v.shape) for _, v in info.inputs.items()])
-            if info.node_type:
-                tensor_shape_counter[info.node_type][shape_hash] += 1
-        return tensor_shape_counter
+        return self.node_data.node_shape_counts()
 
     @abstractmethod
     def parse_model_nodes(self, *args, **kwargs) -> None:
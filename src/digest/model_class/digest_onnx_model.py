@@ -1,12 +1,12 @@
 # Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
 
-# pylint: disable=no-name-in-module
 import os
-from typing import List, Dict, Optional, Tuple, cast
-from PySide6.QtCore import QRunnable, Signal, Slot, QObject
+import math
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple, Union, cast
 from datetime import datetime
-import importlib.metadata
-from collections import OrderedDict
+from uuid import uuid4
+from collections import Counter, OrderedDict
 import yaml
 import numpy as np
 import onnx
@@ -16,15 +16,36 @@ from digest.model_class.digest_model import (
     SupportedModelTypes,
     NodeInfo,
     TensorData,
-    TensorInfo,
+)
+from digest.model_class.flops_engine import (
+    count_flops,
+    flops_polynomials,
+    summarize_flops,
 )
 import utils.onnx_utils as onnx_utils
+from utils.graph_ir import GraphIR
+from utils.polynomial import Polynomial
+from utils.analysis_cache import get_analysis_cache, get_digest_version
+
+
+@dataclass
+class DimsEvaluation:
+    """The figures of a model with dynamic input dims for given values of the dims.
+    The FLOPs are None if they cannot be counted for the model."""
+
+    dim_values: Dict[str, int]
+    flops: Optional[int]
+    node_type_flops: Dict[str, int]
+    parameters: int
+    model_inputs: TensorData
+    model_outputs: TensorData
+    activation_kbytes: Optional[float]
 
 
 class DigestOnnxModel(DigestModel):
     def __init__(
         self,
-        onnx_model: onnx.ModelProto,
+        onnx_model: Union[onnx.ModelProto, onnx_utils.StagedModel],
         onnx_filepath: str = "",
         model_name: str = "",
         save_proto: bool = True,
@@ -33,8 +54,14 @@ class DigestOnnxModel(DigestModel):
 
         self.model_type = SupportedModelTypes.ONNX
 
+        # A bare ModelProto has not been through any of the pipeline stages yet
+        if not isinstance(onnx_model, onnx_utils.StagedModel):
+            onnx_model = onnx_utils.StagedModel(onnx_model, filepath=onnx_filepath)
+
         # Public members exposed to the API
-        self.model_proto: Optional[onnx.ModelProto] = onnx_model if save_proto else None
+        self.model_proto: Optional[onnx.ModelProto] = (
+            onnx_model.model_proto if save_proto else None
+        )
         self.model_version: Optional[int] = None
         self.graph_name: Optional[str] = None
         self.producer_name: Optional[str] = None
@@ -42,16 +69,27 @@ class DigestOnnxModel(DigestModel):
         self.ir_version: Optional[int] = None
         self.opset: Optional[int] = None
         self.imports: OrderedDict[str, int] = OrderedDict()
+        self.dynamic_input_dims: List[str] = []
+
+        # FLOPs and sizes as polynomials over the dynamic input dims, they are
+        # constants for static models. See evaluate_dynamic_dims.
+        self.flops_expression: Optional[Polynomial] = None
+        self.node_type_flops_expressions: Dict[str, Polynomial] = {}
+        self.activation_bytes_expression: Optional[Polynomial] = None
 
         # Private members not intended to be exposed
-        self.input_tensors_: Dict[str, onnx.ValueInfoProto] = {}
-        self.output_tensors_: Dict[str, onnx.ValueInfoProto] = {}
-        self.value_tensors_: Dict[str, onnx.ValueInfoProto] = {}
-        self.init_tensors_: Dict[str, onnx.TensorProto] = {}
+        self.tensor_index_: Optional[onnx_utils.TensorInfoIndex] = None
 
         self.update_state(onnx_model)
 
-    def update_state(self, model_proto: onnx.ModelProto) -> None:
+    def update_state(
+        self, onnx_model: Union[onnx.ModelProto, onnx_utils.StagedModel]
+    ) -> None:
+        model_proto = (
+            onnx_model.model_proto
+            if isinstance(onnx_model, onnx_utils.StagedModel)
+            else onnx_model
+        )
         self.model_version = model_proto.model_version
         self.graph_name = model_proto.graph.name
         self.producer_name = model_proto.producer_name
@@ -65,174 +103,77 @@ class DigestOnnxModel(DigestModel):
             )
         )
 
+        self.dynamic_input_dims = onnx_utils.get_dynamic_input_dims(model_proto)
         self.model_inputs = onnx_utils.get_model_input_shapes_types(model_proto)
         self.model_outputs = onnx_utils.get_model_output_shapes_types(model_proto)
 
         self.node_type_counts = onnx_utils.get_node_type_counts(model_proto)
-        self.parse_model_nodes(model_proto)
+        self.parse_model_nodes(onnx_model)
+
+    def __getstate__(self) -> Dict:
+        """The protos are dropped when pickling, only the analysis results are kept.
+        This keeps the cached and transferred models close to the size of the node data.
+        """
+        state = self.__dict__.copy()
+        state["model_proto"] = None
+        state["tensor_index_"] = None
+        return state
 
     def get_node_tensor_info_(
-        self, onnx_node: onnx.NodeProto
+        self, graph_ir: GraphIR, node: int
     ) -> Tuple[TensorData, TensorData]:
         """
         This function is set to private because it is not intended to be used
         outside of the DigestOnnxModel class.
         """
+        assert self.tensor_index_ is not None
+        return (
+            self.tensor_index_.tensor_data(graph_ir.input_names(node)),
+            self.tensor_index_.tensor_data(graph_ir.output_names(node)),
+        )
 
-        input_tensor_info = TensorData()
-        for node_input in onnx_node.input:
-            input_tensor_info[node_input] = TensorInfo()
-            if (
-                node_input in self.input_tensors_
-                or node_input in self.value_tensors_
-                or node_input in self.output_tensors_
-            ):
-                tensor = (
-                    self.input_tensors_.get(node_input)
-                    or self.value_tensors_.get(node_input)
-                    or self.output_tensors_.get(node_input)
-                )
-                if tensor:
-                    for dim in tensor.type.tensor_type.shape.dim:
-                        if dim.HasField("dim_value"):
-                            input_tensor_info[node_input].shape.append(dim.dim_value)
-                        elif dim.HasField("dim_param"):
-                            input_tensor_info[node_input].shape.append(dim.dim_param)
-
-                    dtype_str, dtype_bytes = onnx_utils.tensor_type_to_str_and_size(
-                        tensor.type.tensor_type.elem_type
-                    )
-            elif node_input in self.init_tensors_:
-                input_tensor_info[node_input].shape.extend(
-                    [dim for dim in self.init_tensors_[node_input].dims]
-                )
-                dtype_str, dtype_bytes = onnx_utils.tensor_type_to_str_and_size(
-                    self.init_tensors_[node_input].data_type
-                )
-            else:
-                dtype_str = None
-                dtype_bytes = None
-
-            input_tensor_info[node_input].dtype = dtype_str
-            input_tensor_info[node_input].dtype_bytes = dtype_bytes
-
-            if (
-                all(isinstance(s, int) for s in input_tensor_info[node_input].shape)
-                and dtype_bytes
-            ):
-                tensor_size = float(
-                    np.prod(np.array(input_tensor_info[node_input].shape))
-                )
-                input_tensor_info[node_input].size_kbytes = (
-                    tensor_size * float(dtype_bytes) / 1024.0
-                )
-
-        output_tensor_info = TensorData()
-        for node_output in onnx_node.output:
-            output_tensor_info[node_output] = TensorInfo()
-            if (
-                node_output in self.input_tensors_
-                or node_output in self.value_tensors_
-                or node_output in self.output_tensors_
-            ):
-                tensor = (
-                    self.input_tensors_.get(node_output)
-                    or self.value_tensors_.get(node_output)
-                    or self.output_tensors_.get(node_output)
-                )
-                if tensor:
-                    output_tensor_info[node_output].shape.extend(
-                        [
-                            int(dim.dim_value)
-                            for dim in tensor.type.tensor_type.shape.dim
-                        ]
-                    )
-                    dtype_str, dtype_bytes = onnx_utils.tensor_type_to_str_and_size(
-                        tensor.type.tensor_type.elem_type
-                    )
-            elif node_output in self.init_tensors_:
-                output_tensor_info[node_output].shape.extend(
-                    [dim for dim in self.init_tensors_[node_output].dims]
-                )
-                dtype_str, dtype_bytes = onnx_utils.tensor_type_to_str_and_size(
-                    self.init_tensors_[node_output].data_type
-                )
-
-            else:
-                dtype_str = None
-                dtype_bytes = None
-
-            output_tensor_info[node_output].dtype = dtype_str
-            output_tensor_info[node_output].dtype_bytes = dtype_bytes
-
-            if (
-                all(isinstance(s, int) for s in output_tensor_info[node_output].shape)
-                and dtype_bytes
-            ):
-                tensor_size = float(
-                    np.prod(np.array(output_tensor_info[node_output].shape))
-                )
-                output_tensor_info[node_output].size_kbytes = (
-                    tensor_size * float(dtype_bytes) / 1024.0
-                )
-
-        return input_tensor_info, output_tensor_info
-
-    def parse_model_nodes(self, onnx_model: onnx.ModelProto) -> None:
+    def parse_model_nodes(
+        self, onnx_model: Union[onnx.ModelProto, onnx_utils.StagedModel]
+    ) -> None:
         """
         Calculate total number of FLOPs found in the onnx model.
         FLOP is defined as one floating-point operation. This distinguishes
         from multiply-accumulates (MACs) where FLOPs == 2 * MACs.
+        The optimize and shape inference stages are only run if the staged
+        model has not been through them already.
         """
 
-        # Initialze to zero so we can accumulate. Set to None during the
-        # model FLOPs calculation if it errors out.
+        staged_model = (
+            onnx_model
+            if isinstance(onnx_model, onnx_utils.StagedModel)
+            else onnx_utils.StagedModel(onnx_model)
+        )
+
+        # Initialze to zero, set to None if the model FLOPs cannot be counted
         self.flops = 0
 
         # Check to see if the model inputs have any dynamic shapes
-        if onnx_utils.get_dynamic_input_dims(onnx_model):
+        dynamic_input_dims = onnx_utils.get_dynamic_input_dims(staged_model.model_proto)
+        if dynamic_input_dims:
             self.flops = None
 
+        stages_failed = False
         try:
-            onnx_model, _ = onnx_utils.optimize_onnx_model(onnx_model)
-
-            onnx_model = onnx.shape_inference.infer_shapes(
-                onnx_model, strict_mode=True, data_prop=True
-            )
+            staged_model = onnx_utils.optimize_stage(staged_model)
+            staged_model = onnx_utils.infer_shapes_stage(staged_model)
         except Exception as e:  # pylint: disable=broad-except
             print(f"ONNX utils: {str(e)}")
             self.flops = None
+            stages_failed = True
 
-        # If the ONNX model contains one of the following unsupported ops, then this
-        # function will return None since the FLOP total is expected to be incorrect
-        unsupported_ops = [
-            "Einsum",
-            "RNN",
-            "GRU",
-            "DeformConv",
-        ]
-
-        if not self.input_tensors_:
-            self.input_tensors_ = {
-                tensor.name: tensor for tensor in onnx_model.graph.input
-            }
-
-        if not self.output_tensors_:
-            self.output_tensors_ = {
-                tensor.name: tensor for tensor in onnx_model.graph.output
-            }
+        onnx_model = staged_model.model_proto
 
-        if not self.value_tensors_:
-            self.value_tensors_ = {
-                tensor.name: tensor for tensor in onnx_model.graph.value_info
-            }
-
-        if not self.init_tensors_:
-            self.init_tensors_ = {
-                tensor.name: tensor for tensor in onnx_model.graph.initializer
-            }
+        self.tensor_index_ = onnx_utils.TensorInfoIndex(onnx_model)
+        graph_ir = GraphIR(onnx_model.graph)
+        # Whether each input slot of each node is fed by an initializer
+        initializer_inputs = graph_ir.is_initializer[graph_ir.input_ids]
 
-        for node in onnx_model.graph.node:  # pylint: disable=E1101
+        for node_id, node in enumerate(onnx_model.graph.node):  # pylint: disable=E1101
 
             node_info = NodeInfo()
 
@@ -240,17 +181,28 @@ class DigestOnnxModel(DigestModel):
             # to have this type of model info fed back to the user through a warnings section.
             if not node.name:
                 node.name = f"{node.op_type}_{len(self.node_data)}"
+                graph_ir.node_names[node_id] = node.name
 
             node_info.node_type = node.op_type
-            input_tensor_info, output_tensor_info = self.get_node_tensor_info_(node)
+            input_tensor_info, output_tensor_info = self.get_node_tensor_info_(
+                graph_ir, node_id
+            )
             node_info.inputs = input_tensor_info
             node_info.outputs = output_tensor_info
 
             # Check if this node has parameters through the init tensors
-            for input_name, input_tensor in node_info.inputs.items():
-                if input_name in self.init_tensors_:
+            input_slots = slice(
+                graph_ir.input_indptr[node_id], graph_ir.input_indptr[node_id + 1]
+            )
+            if initializer_inputs[input_slots].any():
+                initializer_ids = graph_ir.input_ids[input_slots][
+                    initializer_inputs[input_slots]
+                ]
+                for value_id in dict.fromkeys(initializer_ids.tolist()):
+                    input_name = graph_ir.value_names[value_id]
+                    input_tensor = node_info.inputs[input_name]
                     if all(isinstance(dim, int) for dim in input_tensor.shape):
-                        input_parameters = int(np.prod(np.array(input_tensor.shape)))
+                        input_parameters = math.prod(input_tensor.shape)
                         node_info.parameters += input_parameters
                         self.parameters += input_parameters
                         self.node_type_parameters[node.op_type] = (
@@ -268,249 +220,99 @@ class DigestOnnxModel(DigestModel):
 
             self.node_data[node.name] = node_info
 
-            if node.op_type in unsupported_ops:
-                self.flops = None
-                node_info.flops = None
-
-            try:
-
-                if (
-                    node.op_type == "MatMul"
-                    or node.op_type == "MatMulInteger"
-                    or node.op_type == "QLinearMatMul"
-                ):
-
-                    input_a = node_info.get_input(0).shape
-                    if node.op_type == "QLinearMatMul":
-                        input_b = node_info.get_input(3).shape
-                    else:
-                        input_b = node_info.get_input(1).shape
-
-                    if not all(
-                        isinstance(dim, int) for dim in input_a
-                    ) or not isinstance(input_b[-1], int):
-                        node_info.flops = None
-                        self.flops = None
-                        continue
-
-                    node_info.flops = int(
-                        2 * np.prod(np.array(input_a), dtype=np.int64) * input_b[-1]
-                    )
-
-                elif (
-                    node.op_type == "Mul"
-                    or node.op_type == "Div"
-                    or node.op_type == "Add"
-                ):
-                    input_a = node_info.get_input(0).shape
-                    input_b = node_info.get_input(1).shape
-
-                    if not all(isinstance(dim, int) for dim in input_a) or not all(
-                        isinstance(dim, int) for dim in input_b
-                    ):
-                        node_info.flops = None
-                        self.flops = None
-                        continue
-
-                    node_info.flops = int(
-                        np.prod(np.array(input_a), dtype=np.int64)
-                    ) + int(np.prod(np.array(input_b), dtype=np.int64))
-
-                elif node.op_type == "Gemm" or node.op_type == "QGemm":
-                    x_shape = node_info.get_input(0).shape
-                    if node.op_type == "Gemm":
-                        w_shape = node_info.get_input(1).shape
-                    else:
-                        w_shape = node_info.get_input(3).shape
-
-                    if not all(isinstance(dim, int) for dim in x_shape) or not all(
-                        isinstance(dim, int) for dim in w_shape
-                    ):
-                        node_info.flops = None
-                        self.flops = None
-                        continue
-
-                    mm_dims = [
-                        (
-                            x_shape[0]
-                            if not node_info.attributes.get("transA", 0)
-                            else x_shape[1]
-                        ),
-                        (
-                            x_shape[1]
-                            if not node_info.attributes.get("transA", 0)
-                            else x_shape[0]
-                        ),
-                        (
-                            w_shape[1]
-                            if not node_info.attributes.get("transB", 0)
-                            else w_shape[0]
-                        ),
-                    ]
+        flops_count = count_flops(self.node_data)
+        for node_name, error in flops_count.errors.items():
+            print(f"Error parsing node {node_name}: {error}")
+        self.node_data.flops[:] = flops_count.flops
+        self.node_data.flops_missing[:] = flops_count.missing
+        self.flops, self.node_type_flops = summarize_flops(
+            self.node_data, flops_count, model_flops_valid=self.flops is not None
+        )
 
-                    node_info.flops = int(
-                        2 * np.prod(np.array(mm_dims), dtype=np.int64)
-                    )
-
-                    if len(mm_dims) == 3:  # if there is a bias input
-                        bias_shape = node_info.get_input(2).shape
-                        node_info.flops += int(np.prod(np.array(bias_shape)))
-
-                elif (
-                    node.op_type == "Conv"
-                    or node.op_type == "ConvInteger"
-                    or node.op_type == "QLinearConv"
-                    or node.op_type == "ConvTranspose"
-                ):
-                    # N, C, d1, ..., dn
-                    x_shape = node_info.get_input(0).shape
-
-                    # M, C/group, k1, ..., kn. Note C and M are swapped for ConvTranspose
-                    if node.op_type == "QLinearConv":
-                        w_shape = node_info.get_input(3).shape
-                    else:
-                        w_shape = node_info.get_input(1).shape
-
-                    if not all(isinstance(dim, int) for dim in x_shape):
-                        node_info.flops = None
-                        self.flops = None
-                        continue
-
-                    x_shape_ints = cast(List[int], x_shape)
-                    w_shape_ints = cast(List[int], w_shape)
-
-                    has_bias = False  # Note, ConvInteger has no bias
-                    if node.op_type == "Conv" and len(node_info.inputs) == 3:
-                        has_bias = True
-                    elif node.op_type == "QLinearConv" and len(node_info.inputs) == 9:
-                        has_bias = True
-
-                    num_dims = len(x_shape_ints) - 2
-                    strides = node_info.attributes.get(
-                        "strides", [1] * num_dims
-                    )  # type: List[int]
-                    dilation = node_info.attributes.get(
-                        "dilations", [1] * num_dims
-                    )  # type: List[int]
-                    kernel_shape = w_shape_ints[2:]
-                    batch_size = x_shape_ints[0]
-                    out_channels = w_shape_ints[0]
-                    out_dims = [batch_size, out_channels]
-                    output_shape = node_info.attributes.get(
-                        "output_shape", []
-                    )  # type: List[int]
-
-                    # If output_shape is given then we do not need to compute it ourselves
-                    # The output_shape attribute does not include batch_size or channels and
-                    # is only valid for ConvTranspose
-                    if output_shape:
-                        out_dims.extend(output_shape)
-                    else:
-                        auto_pad = node_info.attributes.get(
-                            "auto_pad", "NOTSET".encode()
-                        ).decode()
-                        # SAME expects padding so that the output_shape = CEIL(input_shape / stride)
-                        if auto_pad == "SAME_UPPER" or auto_pad == "SAME_LOWER":
-                            out_dims.extend(
-                                [x * s for x, s in zip(x_shape_ints[2:], strides)]
-                            )
-                        else:
-                            # NOTSET means just use pads attribute
-                            if auto_pad == "NOTSET":
-                                pads = node_info.attributes.get(
-                                    "pads", [0] * num_dims * 2
-                                )
-                            # VALID essentially means no padding
-                            elif auto_pad == "VALID":
-                                pads = [0] * num_dims * 2
-
-                            for i in range(num_dims):
-                                dim_in = x_shape_ints[i + 2]  # type: int
-
-                                if node.op_type == "ConvTranspose":
-                                    out_dim = (
-                                        strides[i] * (dim_in - 1)
-                                        + ((kernel_shape[i] - 1) * dilation[i] + 1)
-                                        - pads[i]
-                                        - pads[i + num_dims]
-                                    )
-                                else:
-                                    out_dim = (
-                                        dim_in
-                                        + pads[i]
-                                        + pads[i + num_dims]
-                                        - dilation[i] * (kernel_shape[i] - 1)
-                                        - 1
-                                    ) // strides[i] + 1
-
-                                out_dims.append(out_dim)
-
-                    kernel_flops = int(
-                        np.prod(np.array(kernel_shape)) * w_shape_ints[1]
-                    )
-                    output_points = int(np.prod(np.array(out_dims)))
-                    bias_ops = output_points if has_bias else int(0)
-                    node_info.flops = 2 * kernel_flops * output_points + bias_ops
-
-                elif node.op_type == "LSTM" or node.op_type == "DynamicQuantizeLSTM":
-
-                    x_shape = node_info.get_input(
-                        0
-                    ).shape  # seq_length, batch_size, input_dim
-
-                    if not all(isinstance(dim, int) for dim in x_shape):
-                        node_info.flops = None
-                        self.flops = None
-                        continue
-
-                    x_shape_ints = cast(List[int], x_shape)
-                    hidden_size = node_info.attributes["hidden_size"]
-                    direction = (
-                        2
-                        if node_info.attributes.get("direction")
-                        == "bidirectional".encode()
-                        else 1
-                    )
-
-                    has_bias = True if len(node_info.inputs) >= 4 else False
-                    if has_bias:
-                        bias_shape = node_info.get_input(3).shape
-                        if isinstance(bias_shape[1], int):
-                            bias_ops = bias_shape[1]
-                        else:
-                            bias_ops = 0
-                    else:
-                        bias_ops = 0
-                    # seq_length, batch_size, input_dim = x_shape
-                    if not isinstance(bias_ops, int):
-                        bias_ops = int(0)
-                    num_gates = int(4)
-                    gate_input_flops = int(2 * x_shape_ints[2] * hidden_size)
-                    gate_hid_flops = int(2 * hidden_size * hidden_size)
-                    unit_flops = (
-                        num_gates * (gate_input_flops + gate_hid_flops) + bias_ops
-                    )
-                    node_info.flops = (
-                        x_shape_ints[1] * x_shape_ints[0] * direction * unit_flops
-                    )
-                # In this case we just hit an op that doesn't have FLOPs
-                else:
-                    node_info.flops = None
+        # The shapes inferred for a model with dynamic inputs keep the names of the
+        # dims, which lets the FLOPs be expressed once for all their values.
+        self.flops_expression = None
+        self.node_type_flops_expressions = {}
+        if self.flops is not None:
+            self.flops_expression = Polynomial.constant(self.flops)
+            self.node_type_flops_expressions = {
+                op_type: Polynomial.constant(flops)
+                for op_type, flops in self.node_type_flops.items()
+            }
+        elif dynamic_input_dims and not stages_failed:
+            polynomials = flops_polynomials(self.node_data, dynamic_input_dims)
+            if polynomials is not None:
+                self.flops_expression, self.node_type_flops_expressions = polynomials
+        self.activation_bytes_expression = self.get_activation_bytes_expression_(
+            dynamic_input_dims
+        )
 
-            except IndexError as err:
-                print(f"Error parsing node {node.name}: {err}")
-                node_info.flops = None
-                self.flops = None
-                continue
+    def get_activation_bytes_expression_(
+        self, dynamic_input_dims: List[str]
+    ) -> Optional[Polynomial]:
+        """Total size of the tensors produced or consumed by the nodes, excluding the
+        initializers. Returns None if the size of a tensor is not known."""
+        assert self.tensor_index_ is not None
+        node_table = self.node_data
+        names = node_table.tensor_names
+        activation_codes = [
+            code
+            for tensor_id, code in enumerate(node_table.tensor_info_codes.tolist())
+            if names[tensor_id]
+            and names[tensor_id] not in self.tensor_index_.initializer_names
+        ]
+        activation_bytes = Polynomial()
+        for code, count in Counter(activation_codes).items():
+            info = node_table.unique_tensor_infos[code]
+            numel = Polynomial.from_shape(info.shape, dynamic_input_dims)
+            if numel is None or not info.dtype_bytes:
+                return None
+            activation_bytes = activation_bytes + numel * (count * info.dtype_bytes)
+        return activation_bytes
+
+    def evaluate_dynamic_dims(self, dim_values: Dict[str, int]) -> "DimsEvaluation":
+        """Evaluates the FLOPs and tensor sizes of the model for values of its dynamic
+        input dims. This does not reload the model or run shape inference again."""
+        missing = [dim for dim in self.dynamic_input_dims if dim not in dim_values]
+        if missing:
+            raise ValueError(f"Missing values for dynamic dims: {', '.join(missing)}")
+        dim_values = {dim: dim_values[dim] for dim in self.dynamic_input_dims}
+
+        flops: Optional[int] = None
+        node_type_flops: Dict[str, int] = {}
+        if self.flops_expression is not None:
+            flops = int(self.flops_expression.evaluate(dim_values))
+            node_type_flops = {
+                op_type: int(expression.evaluate(dim_values))
+                for op_type, expression in self.node_type_flops_expressions.items()
+            }
+        elif self.dynamic_input_dims:
+            # The FLOPs are not polynomials in the dims, they are counted directly
+            flops, node_type_flops = summarize_flops(
+                self.node_data, count_flops(self.node_data, dim_values)
+            )
 
-            # Update the model level flops count
-            if node_info.flops is not None and self.flops is not None:
-                self.flops += node_info.flops
+        activation_kbytes = None
+        if self.activation_bytes_expression is not None:
+            activation_kbytes = (
+                float(self.activation_bytes_expression.evaluate(dim_values)) / 1024.0
+            )
 
-                # Update the node type flops count
-                self.node_type_flops[node.op_type] = (
-                    self.node_type_flops.get(node.op_type, 0) + node_info.flops
-                )
+        return DimsEvaluation(
+            dim_values=dim_values,
+            flops=flops,
+            node_type_flops=node_type_flops,
+            parameters=self.parameters,
+            model_inputs=TensorData(
+                (name, info.with_dim_values(dim_values))
+                for name, info in self.model_inputs.items()
+            ),
+            model_outputs=TensorData(
+                (name, info.with_dim_values(dim_values))
+                for name, info in self.model_outputs.items()
+            ),
+            activation_kbytes=activation_kbytes,
+        )
 
     def save_yaml_report(self, filepath: str) -> None:
 
@@ -522,7 +324,7 @@ class DigestOnnxModel(DigestModel):
 
         input_tensors = dict({k: vars(v) for k, v in self.model_inputs.items()})
         output_tensors = dict({k: vars(v) for k, v in self.model_outputs.items()})
-        digest_version = importlib.metadata.version("digestai")
+        digest_version = get_digest_version()
 
         yaml_data = {
             "report_date": report_date,
@@ -558,7 +360,7 @@ class DigestOnnxModel(DigestModel):
 
         report_date = datetime.now().strftime("%B %d, %Y")
 
-        digest_version = importlib.metadata.version("digestai")
+        digest_version = get_digest_version()
 
         with open(filepath, "w", encoding="utf-8") as f_p:
             f_p.write(f"Report created on {report_date}\n")
@@ -579,6 +381,8 @@ class DigestOnnxModel(DigestModel):
             f_p.write("\n")
             f_p.write(f"Total graph nodes: {sum(self.node_type_counts.values())}\n")
             f_p.write(f"Number of parameters: {self.parameters}\n")
+            if self.flops is None and self.flops_expression is not None:
+                f_p.write(f"Number of FLOPs: {self.flops_expression}\n")
             if self.flops:
                 f_p.write(f"Number of FLOPs: {self.flops}\n")
                 f_p.write("\n")
@@ -658,42 +462,52 @@ class DigestOnnxModel(DigestModel):
             f_p.write("\n\n")
 
 
-class WorkerSignals(QObject):
-    completed = Signal(DigestOnnxModel)
-
-
-class LoadDigestOnnxModelWorker(QRunnable):
-
-    def __init__(
-        self,
-        model_file_path: str,
-        model_name: str,
-    ):
-        super().__init__()
-        self.signals = WorkerSignals()
-        self.tab_name = model_name
-        self.model_file_path = model_file_path
-        self.unique_id: Optional[str] = None
-
-    @Slot()
-    def run(self):
-        try:
-            model_proto = onnx_utils.load_onnx(
-                self.model_file_path, load_external_data=False
-            )
-            opt_model, _ = onnx_utils.optimize_onnx_model(model_proto)
-        except FileNotFoundError as e:
-            print(f"File not found: {e.filename}")
-
-        digest_model = DigestOnnxModel(
-            opt_model,
-            model_name=self.tab_name,
-            onnx_filepath=self.model_file_path,
-        )
-
-        self.unique_id = digest_model.unique_id
-
-        if not self.tab_name:
-            self.tab_name = digest_model.model_name
+def load_digest_onnx_model(
+    onnx_filepath: str,
+    model_name: str = "",
+    save_proto: bool = True,
+    use_cache: bool = True,
+) -> DigestOnnxModel:
+    """Creates a DigestOnnxModel from an ONNX file. When use_cache is set the analysis
+    is looked up in the persistent cache by the hash of the file contents, and stored
+    there after a full analysis so that the next load of the same model is immediate."""
+
+    if not model_name:
+        model_name = os.path.splitext(os.path.basename(onnx_filepath))[0]
+
+    cache = get_analysis_cache() if use_cache else None
+    content_hash = onnx_utils.hash_file(onnx_filepath) if cache else None
+
+    if cache and content_hash:
+        digest_model = cache.get_model(content_hash)
+        if isinstance(digest_model, DigestOnnxModel):
+            # The cached analysis may come from a copy of the file with a different
+            # name or location, and every loaded model needs its own id.
+            digest_model.unique_id = str(uuid4())
+            digest_model.filepath = onnx_filepath
+            digest_model.model_name = model_name
+            if save_proto:
+                digest_model.model_proto = onnx_utils.load_onnx_lazy(onnx_filepath)
+            return digest_model
+
+    staged_model = onnx_utils.load_stage(onnx_filepath)
+    loaded_proto = staged_model.model_proto
+    # The model picks the pipeline up from the shape inference stage
+    staged_model = onnx_utils.optimize_stage(staged_model)
+    digest_model = DigestOnnxModel(
+        staged_model,
+        onnx_filepath=onnx_filepath,
+        model_name=model_name,
+        save_proto=False,
+    )
+    digest_model.content_hash = content_hash
+    # The proto kept by the model is the one loaded from the file. Its large
+    # initializers reference the file, see onnx_utils.load_external_data.
+    if save_proto:
+        digest_model.model_proto = loaded_proto
+
+    if cache and content_hash:
+        cache.put_model(content_hash, digest_model)
+
+    return digest_model
 
-        self.signals.completed.emit(digest_model)
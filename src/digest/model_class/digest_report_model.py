@@ -4,7 +4,8 @@ from collections import OrderedDict
 import csv
 import ast
 import re
-from PySide6.QtCore import QRunnable, Signal, Slot, QObject
+import json
+import hashlib
 from typing import Tuple, Optional, List, Dict, Any, Union
 import yaml
 from digest.model_class.digest_model import (
@@ -56,15 +57,14 @@ class DigestReportModel(DigestModel):
 
         self.model_type = SupportedModelTypes.REPORT
 
-        self.is_valid = validate_yaml(report_filepath)
+        report_data = load_yaml_report(report_filepath)
+        self.is_valid = report_data is not None
 
-        if not self.is_valid:
+        if report_data is None:
             print(f"The yaml file {report_filepath} is not a valid digest report.")
             return
 
-        self.model_data = OrderedDict()
-        with open(report_filepath, "r", encoding="utf-8") as yaml_f:
-            self.model_data = yaml.safe_load(yaml_f)
+        self.model_data = report_data
 
         model_name = self.model_data["model_name"]
         super().__init__(report_filepath, model_name, SupportedModelTypes.REPORT)
@@ -104,17 +104,15 @@ class DigestReportModel(DigestModel):
                     for key, value in row.items():
                         if key.startswith("Input") and value:
                             input_name, shape, dtype, size = parse_tensor_info(value)
-                            node_info.inputs[input_name] = TensorInfo()
-                            node_info.inputs[input_name].shape = shape
-                            node_info.inputs[input_name].dtype = dtype
-                            node_info.inputs[input_name].size_kbytes = size
+                            node_info.inputs[input_name] = TensorInfo(
+                                dtype=dtype, size_kbytes=size, shape=shape
+                            )
 
                         elif key.startswith("Output") and value:
                             output_name, shape, dtype, size = parse_tensor_info(value)
-                            node_info.outputs[output_name] = TensorInfo()
-                            node_info.outputs[output_name].shape = shape
-                            node_info.outputs[output_name].dtype = dtype
-                            node_info.outputs[output_name].size_kbytes = size
+                            node_info.outputs[output_name] = TensorInfo(
+                                dtype=dtype, size_kbytes=size, shape=shape
+                            )
 
                     self.node_data[node_name] = node_info
 
@@ -154,32 +152,12 @@ class DigestReportModel(DigestModel):
         return
 
 
-class WorkerSignals(QObject):
-    completed = Signal(DigestReportModel)
+# Keys of a report that change every time the same model is reported again
+REPORT_VOLATILE_KEYS = ["report_date", "model_file", "digest_version"]
 
 
-class LoadDigestReportModelWorker(QRunnable):
-
-    def __init__(
-        self,
-        model_file_path: str,
-        model_name: str,
-    ):
-        super().__init__()
-        self.signals = WorkerSignals()
-        self.tab_name = model_name
-        self.model_file_path = model_file_path
-        self.unique_id: Optional[str] = None
-
-    @Slot()
-    def run(self):
-
-        digest_model = DigestReportModel(self.model_file_path)
-        self.signals.completed.emit(digest_model)
-
-
-def validate_yaml(report_file_path: str) -> bool:
-    """Check that the provided yaml file is indeed a Digest Report file."""
+def load_yaml_report(report_file_path: str) -> Optional[Dict[str, Any]]:
+    """Returns the content of a Digest report, or None if the yaml file is not one"""
     expected_keys = [
         "report_date",
         "model_file",
@@ -198,20 +176,66 @@ def validate_yaml(report_file_path: str) -> bool:
 
         if not isinstance(yaml_content, dict):
             print("Error: YAML content is not a dictionary")
-            return False
+            return None
 
         for key in expected_keys:
             if key not in yaml_content:
                 # print(f"Error: Missing required key '{key}'")
-                return False
+                return None
 
-        return True
+        return yaml_content
     except yaml.YAMLError as _:
         # print(f"Error parsing YAML file: {e}")
-        return False
+        return None
     except IOError as _:
         # print(f"Error reading file: {e}")
-        return False
+        return None
+
+
+def validate_yaml(report_file_path: str) -> bool:
+    """Check that the provided yaml file is indeed a Digest Report file."""
+    return load_yaml_report(report_file_path) is not None
+
+
+def report_fingerprint(
+    report: Union[str, Dict[str, Any]],
+    skip_keys: Optional[List[str]] = None,
+) -> str:
+    """
+    Returns the sha256 hex digest of a canonical form of a YAML report, so that
+    reports can be grouped by hash instead of being compared in pairs.
+
+    :param report: Path to the YAML file or its loaded content
+    :param skip_keys: Keys to ignore at any depth, defaults to REPORT_VOLATILE_KEYS
+    :return: Reports with the same fingerprint are equal, ignoring skip_keys
+    """
+    if skip_keys is None:
+        skip_keys = REPORT_VOLATILE_KEYS
+
+    if isinstance(report, str):
+        with open(report, "r", encoding="utf-8") as file:
+            report = yaml.safe_load(file)
+
+    def canonical_form(value: Any) -> Any:
+        # Mappings become tagged lists of [key, value] pairs sorted by the encoded
+        # key, which keeps the keys of different types such as 1 and "1" apart
+        if isinstance(value, dict):
+            items = [
+                [canonical_form(key), canonical_form(item)]
+                for key, item in value.items()
+                if key not in skip_keys
+            ]
+            items.sort(key=lambda pair: encode(pair[0]))
+            return ["dict", items]
+        if isinstance(value, (list, tuple)):
+            return ["list", [canonical_form(item) for item in value]]
+        return value
+
+    def encode(value: Any) -> str:
+        return json.dumps(value, separators=(",", ":"), default=str)
+
+    canonical = encode(canonical_form(report))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
 
 def compare_yaml_files(
@@ -225,44 +249,6 @@ def compare_yaml_files(
     :param skip_keys: List of keys to ignore in the comparison
     :return: True if the files are equal (ignoring specified keys), False otherwise
     """
-
-    def load_yaml(file_path: str) -> Dict[str, Any]:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return yaml.safe_load(file)
-
-    def compare_dicts(
-        dict1: Dict[str, Any], dict2: Dict[str, Any], path: str = ""
-    ) -> List[str]:
-        differences = []
-        all_keys = set(dict1.keys()) | set(dict2.keys())
-
-        for key in all_keys:
-            if skip_keys and key in skip_keys:
-                continue
-
-            current_path = f"{path}.{key}" if path else key
-
-            if key not in dict1:
-                differences.append(f"Key '{current_path}' is missing in the first file")
-            elif key not in dict2:
-                differences.append(
-                    f"Key '{current_path}' is missing in the second file"
-                )
-            elif isinstance(dict1[key], dict) and isinstance(dict2[key], dict):
-                differences.extend(compare_dicts(dict1[key], dict2[key], current_path))
-            elif dict1[key] != dict2[key]:
-                differences.append(
-                    f"Value mismatch for key '{current_path}': {dict1[key]} != {dict2[key]}"
-                )
-
-        return differences
-
-    yaml1 = load_yaml(file1)
-    yaml2 = load_yaml(file2)
-
-    differences = compare_dicts(yaml1, yaml2)
-
-    if differences:
-        return False
-    else:
-        return True
+    return report_fingerprint(file1, skip_keys or []) == report_fingerprint(
+        file2, skip_keys or []
+    )
@@ -0,0 +1,533 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Table driven FLOP counting for the nodes stored in a NodeTable.
+
+Every supported op type has a formula in a registry. The nodes of the table are
+grouped by op type and each formula is evaluated once per group over stacked
+arrays of the input shapes. Formulas for custom ops can be added with
+register_flops_formula:
+
+    @register_flops_formula("MyOp")
+    def my_op_flops(batch: NodeBatch) -> np.ndarray:
+        x = batch.input(0)
+        batch.fail(~x.present)
+        batch.invalidate(~x.static)
+        return 2 * x.numel
+
+Formulas that are easier to write for a single node can be registered with
+vectorized=False, they receive a NodeInfo and return the FLOPs or None when
+they cannot be counted.
+
+FLOP is defined as one floating-point operation. This distinguishes
+from multiply-accumulates (MACs) where FLOPs == 2 * MACs.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+import numpy as np
+from digest.model_class.digest_model import NodeInfo, NodeTable, NodeView
+from utils.polynomial import Polynomial, interpolate_polynomials
+
+# If the model contains one of the following unsupported ops the model FLOPs
+# are not reported since the total is expected to be incorrect
+UNSUPPORTED_OPS = frozenset(["Einsum", "RNN", "GRU", "DeformConv"])
+
+FlopsFormula = Callable[["NodeBatch"], np.ndarray]
+
+_FLOPS_FORMULAS: Dict[str, FlopsFormula] = {}
+
+
+def register_flops_formula(*op_types: str, vectorized: bool = True) -> Callable:
+    """Decorator that registers a FLOP formula for one or more op types. A formula
+    registered for an op type that already has one replaces it."""
+
+    def decorator(formula: Callable) -> Callable:
+        batch_formula = formula if vectorized else _per_node(formula)
+        for op_type in op_types:
+            _FLOPS_FORMULAS[op_type] = batch_formula
+        return formula
+
+    return decorator
+
+
+def unregister_flops_formula(op_type: str) -> None:
+    _FLOPS_FORMULAS.pop(op_type, None)
+
+
+def get_flops_formula(op_type: str) -> Optional[FlopsFormula]:
+    return _FLOPS_FORMULAS.get(op_type)
+
+
+def _per_node(formula: Callable[[NodeInfo], Optional[int]]) -> FlopsFormula:
+    def batch_formula(batch: "NodeBatch") -> np.ndarray:
+        flops = np.zeros(len(batch), dtype=np.int64)
+        for i, node_info in enumerate(batch.nodes()):
+            try:
+                node_flops = formula(node_info)
+            except IndexError as err:
+                batch.fail_node(i, str(err))
+                continue
+            if node_flops is None:
+                batch.invalid[i] = True
+            else:
+                flops[i] = node_flops
+        return flops
+
+    return batch_formula
+
+
+class _TensorColumns:
+    """Shape information of the distinct tensor infos of a NodeTable as arrays. The
+    last entry is a placeholder used for inputs that a node does not have."""
+
+    def __init__(
+        self, node_table: NodeTable, dim_values: Optional[Dict[str, int]] = None
+    ) -> None:
+        shapes = [info.shape for info in node_table.unique_tensor_infos] + [[]]
+        self.codes = node_table.tensor_info_codes
+        self.rank = np.fromiter((len(shape) for shape in shapes), np.int64, len(shapes))
+        max_rank = int(self.rank.max())
+        self.dims = np.zeros((len(shapes), max_rank), dtype=np.int64)
+        self.dim_known = np.zeros((len(shapes), max_rank), dtype=np.bool_)
+        for code, shape in enumerate(shapes):
+            for axis, dim in enumerate(shape):
+                if dim_values and isinstance(dim, str):
+                    dim = dim_values.get(dim, dim)
+                if isinstance(dim, int):
+                    self.dims[code, axis] = dim
+                    self.dim_known[code, axis] = True
+        padding = np.arange(max_rank) >= self.rank[:, None]
+        self.static = np.all(self.dim_known | padding, axis=1)
+        self.numel = np.prod(np.where(padding, 1, self.dims), axis=1)
+        self.missing_id = len(shapes) - 1
+
+
+class TensorBatch:
+    """The shapes of one input or output tensor for every node of a NodeBatch"""
+
+    def __init__(
+        self, columns: _TensorColumns, tensor_ids: np.ndarray, present: np.ndarray
+    ) -> None:
+        self._columns = columns
+        self.tensor_ids = tensor_ids
+        # False for the nodes that do not have this tensor
+        self.present = present
+        self._codes = np.full(len(tensor_ids), columns.missing_id, dtype=np.int64)
+        self._codes[present] = columns.codes[tensor_ids[present]]
+        self.rank = columns.rank[self._codes]
+        # True where every dim of the shape is a known integer
+        self.static = columns.static[self._codes]
+        # Number of elements, only meaningful where static is True
+        self.numel = columns.numel[self._codes]
+
+    def has_dim(self, axis: int) -> np.ndarray:
+        index = self.rank + axis if axis < 0 else np.full_like(self.rank, axis)
+        return (index >= 0) & (index < self.rank)
+
+    def dim(self, axis: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the value of the dim at axis and a mask that is True where
+        that dim exists and is a known integer"""
+        exists = self.has_dim(axis)
+        index = self.rank + axis if axis < 0 else np.full_like(self.rank, axis)
+        index = np.where(exists, index, 0)
+        if self._columns.dims.shape[1] == 0:
+            return np.zeros_like(self.rank), exists
+        dims = self._columns.dims[self._codes, index]
+        known = exists & self._columns.dim_known[self._codes, index]
+        return np.where(known, dims, 0), known
+
+
+@dataclass
+class NodeBatch:
+    """All the nodes of a NodeTable with the same op type. Formulas report nodes
+    whose FLOPs cannot be counted through invalidate, and nodes that do not have
+    the inputs or dims the formula needs through fail."""
+
+    op_type: str
+    node_table: NodeTable
+    rows: np.ndarray
+    tensor_columns: _TensorColumns
+    # Values of named dims that replace them in the shapes seen by the formulas
+    dim_values: Optional[Dict[str, int]] = None
+    invalid: np.ndarray = field(init=False)
+    errors: Dict[int, str] = field(init=False, default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.invalid = np.zeros(len(self.rows), dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def input(self, index: int) -> TensorBatch:
+        tensor_ids, present = self.node_table.input_tensor_ids_at(self.rows, index)
+        return TensorBatch(self.tensor_columns, tensor_ids, present)
+
+    def output(self, index: int) -> TensorBatch:
+        tensor_ids, present = self.node_table.output_tensor_ids_at(self.rows, index)
+        return TensorBatch(self.tensor_columns, tensor_ids, present)
+
+    @property
+    def num_inputs(self) -> np.ndarray:
+        return self.node_table.num_inputs[self.rows]
+
+    def attribute(self, name: str, default: Any = None) -> List[Any]:
+        return [
+            attributes.get(name, default)
+            for attributes in self.node_table.attributes_at(self.rows)
+        ]
+
+    def nodes(self) -> List[NodeInfo]:
+        nodes: List[NodeInfo] = [
+            NodeView(self.node_table, row) for row in self.rows.tolist()
+        ]
+        if self.dim_values:
+            nodes = [node.with_dim_values(self.dim_values) for node in nodes]
+        return nodes
+
+    def invalidate(self, mask: np.ndarray) -> None:
+        self.invalid |= mask
+
+    def fail(self, mask: np.ndarray, message: str = "list index out of range") -> None:
+        for i in np.flatnonzero(mask & ~self.invalid).tolist():
+            self.fail_node(i, message)
+
+    def fail_node(self, index: int, message: str) -> None:
+        self.invalid[index] = True
+        self.errors.setdefault(index, message)
+
+
+@dataclass
+class FlopsCount:
+    """Result of counting the FLOPs of a NodeTable"""
+
+    # FLOPs per row of the table, only meaningful where missing is False
+    flops: np.ndarray
+    missing: np.ndarray
+    # Rows that prevent the model FLOPs from being counted
+    invalid: np.ndarray
+    # Node name to error message for the nodes that could not be parsed
+    errors: Dict[str, str]
+
+
+def count_flops(
+    node_table: NodeTable, dim_values: Optional[Dict[str, int]] = None
+) -> FlopsCount:
+    """Counts the FLOPs of every node of the table. The named dims found in
+    dim_values are replaced by their values, which counts the FLOPs of a model
+    with dynamic dims for those dims without going through shape inference again."""
+    num_rows = len(node_table)
+    flops = np.zeros(num_rows, dtype=np.int64)
+    missing = np.ones(num_rows, dtype=np.bool_)
+    invalid = np.zeros(num_rows, dtype=np.bool_)
+    errors: Dict[int, str] = {}
+    if not num_rows:
+        return FlopsCount(flops, missing, invalid, {})
+
+    tensor_columns = _TensorColumns(node_table, dim_values)
+    op_codes = node_table.op_type_codes
+    order = np.argsort(op_codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(op_codes[order])) + 1
+    for rows in np.split(order, boundaries):
+        code = int(op_codes[rows[0]])
+        if code < 0:
+            continue
+        op_type = node_table.op_types[code]
+        if op_type in UNSUPPORTED_OPS:
+            invalid[rows] = True
+            continue
+        formula = get_flops_formula(op_type)
+        if formula is None:
+            continue
+        batch = NodeBatch(op_type, node_table, rows, tensor_columns, dim_values)
+        batch_flops = formula(batch)
+        flops[rows] = np.where(batch.invalid, 0, batch_flops)
+        missing[rows] = batch.invalid
+        invalid[rows] = batch.invalid
+        errors.update({int(rows[i]): message for i, message in batch.errors.items()})
+
+    return FlopsCount(
+        flops,
+        missing,
+        invalid,
+        {node_table.node_name(row): errors[row] for row in sorted(errors)},
+    )
+
+
+def summarize_flops(
+    node_table: NodeTable, flops_count: FlopsCount, model_flops_valid: bool = True
+) -> Tuple[Optional[int], Dict[str, int]]:
+    """Returns the model FLOPs and the FLOPs per op type. The FLOPs are accumulated
+    in node order and the accumulation stops at the first node that invalidates the
+    model FLOPs, so the per op type FLOPs only cover the nodes before it."""
+    if not model_flops_valid:
+        return None, {}
+
+    invalid_rows = np.flatnonzero(flops_count.invalid)
+    end = int(invalid_rows[0]) if len(invalid_rows) else len(node_table)
+    counted = ~flops_count.missing[:end] & (node_table.op_type_codes[:end] >= 0)
+    codes = node_table.op_type_codes[:end][counted]
+    flops = flops_count.flops[:end][counted]
+
+    per_code = np.zeros(len(node_table.op_types), dtype=np.int64)
+    np.add.at(per_code, codes, flops)
+    unique_codes, first_rows = np.unique(codes, return_index=True)
+    node_type_flops = {
+        node_table.op_types[code]: int(per_code[code])
+        for code in unique_codes[np.argsort(first_rows)].tolist()
+    }
+
+    model_flops = None if len(invalid_rows) else int(flops.sum())
+    return model_flops, node_type_flops
+
+
+# The FLOP polynomials are recovered from a grid of dim values whose size is the
+# product of the degrees in each dim, bigger grids are not evaluated.
+MAX_INTERPOLATION_POINTS = 1024
+
+
+def _dim_degrees(node_table: NodeTable, symbols: List[str]) -> Dict[str, int]:
+    """Upper bound of the degree of the node FLOPs in each named dim, which is the
+    number of times the dim appears in the shapes of the inputs and outputs of the
+    nodes that have a FLOP formula."""
+    infos = node_table.unique_tensor_infos
+    occurrences = np.array(
+        [[info.shape.count(symbol) for symbol in symbols] for info in infos],
+        dtype=np.int64,
+    ).reshape(len(infos), len(symbols))
+    formula_codes = [
+        code
+        for code, op_type in enumerate(node_table.op_types)
+        if get_flops_formula(op_type) is not None
+    ]
+    rows = np.flatnonzero(np.isin(node_table.op_type_codes, formula_codes))
+    node_occurrences = np.zeros((len(rows), len(symbols)), dtype=np.int64)
+    codes = node_table.tensor_info_codes
+    for tensor_ids_at, counts in (
+        (node_table.input_tensor_ids_at, node_table.num_inputs),
+        (node_table.output_tensor_ids_at, node_table.num_outputs),
+    ):
+        for index in range(int(counts[rows].max(initial=0))):
+            tensor_ids, present = tensor_ids_at(rows, index)
+            node_occurrences[present] += occurrences[codes[tensor_ids[present]]]
+    return {
+        symbol: int(node_occurrences[:, i].max(initial=0))
+        for i, symbol in enumerate(symbols)
+    }
+
+
+# Ops that slide a window over the spatial dims of their first input. Their output
+# size is a floor of the input size, which is not a polynomial in the input dims.
+WINDOWED_OPS = frozenset(
+    [
+        "Conv",
+        "ConvInteger",
+        "QLinearConv",
+        "ConvTranspose",
+        "MaxPool",
+        "AveragePool",
+        "LpPool",
+        "QLinearAveragePool",
+    ]
+)
+
+
+def _has_dynamic_windows(node_table: NodeTable, symbols: List[str]) -> bool:
+    """Whether a windowed op of the table has a named dim in its spatial dims"""
+    window_codes = [
+        code
+        for code, op_type in enumerate(node_table.op_types)
+        if op_type in WINDOWED_OPS
+    ]
+    rows = np.flatnonzero(np.isin(node_table.op_type_codes, window_codes))
+    tensor_ids, present = node_table.input_tensor_ids_at(rows, 0)
+    infos = node_table.unique_tensor_infos
+    named = set(symbols)
+    return any(
+        not named.isdisjoint(infos[code].shape[2:])
+        for code in np.unique(node_table.tensor_info_codes[tensor_ids[present]])
+    )
+
+
+def flops_polynomials(
+    node_table: NodeTable, symbols: List[str]
+) -> Optional[Tuple[Polynomial, Dict[str, Polynomial]]]:
+    """Expresses the model FLOPs and the FLOPs per op type as polynomials in the
+    named dims of the table. Returns None if the model FLOPs cannot be counted, or
+    if they are not polynomials in the dims, which is the case of a windowed op
+    such as a strided Conv with a dynamic spatial dim. The FLOPs are then counted
+    for each set of dim values instead."""
+    if _has_dynamic_windows(node_table, symbols):
+        return None
+    degrees = _dim_degrees(node_table, symbols)
+    if math.prod(degree + 1 for degree in degrees.values()) > MAX_INTERPOLATION_POINTS:
+        return None
+
+    def node_type_flops_at(dim_values: Dict[str, int]) -> Optional[Dict[str, int]]:
+        model_flops, node_type_flops = summarize_flops(
+            node_table, count_flops(node_table, dim_values)
+        )
+        return None if model_flops is None else node_type_flops
+
+    node_type_polynomials = interpolate_polynomials(node_type_flops_at, degrees)
+    if node_type_polynomials is None:
+        return None
+    # The model FLOPs are the sum of the FLOPs per op type when they are valid
+    model_polynomial = sum(node_type_polynomials.values(), Polynomial())
+    return model_polynomial, node_type_polynomials
+
+
+@register_flops_formula("MatMul", "MatMulInteger", "QLinearMatMul")
+def _matmul_flops(batch: NodeBatch) -> np.ndarray:
+    input_a = batch.input(0)
+    input_b = batch.input(3 if batch.op_type == "QLinearMatMul" else 1)
+    batch.fail(~input_a.present)
+    batch.invalidate(~input_a.static)
+    batch.fail(~input_b.present | ~input_b.has_dim(-1))
+    b_cols, b_cols_known = input_b.dim(-1)
+    batch.invalidate(~b_cols_known)
+    return 2 * input_a.numel * b_cols
+
+
+@register_flops_formula("Mul", "Div", "Add")
+def _elementwise_flops(batch: NodeBatch) -> np.ndarray:
+    input_a = batch.input(0)
+    input_b = batch.input(1)
+    batch.fail(~input_a.present | ~input_b.present)
+    batch.invalidate(~input_a.static | ~input_b.static)
+    return input_a.numel + input_b.numel
+
+
+@register_flops_formula("Gemm", "QGemm")
+def _gemm_flops(batch: NodeBatch) -> np.ndarray:
+    x = batch.input(0)
+    w = batch.input(1 if batch.op_type == "Gemm" else 3)
+    batch.fail(~x.present | ~w.present)
+    batch.invalidate(~x.static | ~w.static)
+    batch.fail(~x.has_dim(0) | ~x.has_dim(1) | ~w.has_dim(0) | ~w.has_dim(1))
+
+    trans_a = np.array(batch.attribute("transA", 0), dtype=np.bool_)
+    trans_b = np.array(batch.attribute("transB", 0), dtype=np.bool_)
+    x_0, _ = x.dim(0)
+    x_1, _ = x.dim(1)
+    w_0, _ = w.dim(0)
+    w_1, _ = w.dim(1)
+    mm_dims = [
+        np.where(trans_a, x_1, x_0),
+        np.where(trans_a, x_0, x_1),
+        np.where(trans_b, w_0, w_1),
+    ]
+    flops = 2 * mm_dims[0] * mm_dims[1] * mm_dims[2]
+
+    # The bias is optional, for QGemm it comes after the quantization parameters of B
+    bias = batch.input(2 if batch.op_type == "Gemm" else 6)
+    batch.invalidate(bias.present & ~bias.static)
+    return flops + np.where(bias.present, bias.numel, 0)
+
+
+@register_flops_formula(
+    "Conv", "ConvInteger", "QLinearConv", "ConvTranspose", vectorized=False
+)
+def _conv_flops(node_info: NodeInfo) -> Optional[int]:
+    # N, C, d1, ..., dn
+    x_shape = node_info.get_input(0).shape
+
+    # M, C/group, k1, ..., kn. Note C and M are swapped for ConvTranspose
+    if node_info.node_type == "QLinearConv":
+        w_shape = node_info.get_input(3).shape
+    else:
+        w_shape = node_info.get_input(1).shape
+
+    if not all(isinstance(dim, int) for dim in x_shape):
+        return None
+
+    x_shape_ints = cast(List[int], x_shape)
+    w_shape_ints = cast(List[int], w_shape)
+
+    has_bias = False  # Note, ConvInteger has no bias
+    if node_info.node_type == "Conv" and len(node_info.inputs) == 3:
+        has_bias = True
+    elif node_info.node_type == "QLinearConv" and len(node_info.inputs) == 9:
+        has_bias = True
+
+    num_dims = len(x_shape_ints) - 2
+    strides = node_info.attributes.get("strides", [1] * num_dims)  # type: List[int]
+    dilation = node_info.attributes.get("dilations", [1] * num_dims)  # type: List[int]
+    kernel_shape = w_shape_ints[2:]
+    batch_size = x_shape_ints[0]
+    out_channels = w_shape_ints[0]
+    out_dims = [batch_size, out_channels]
+    output_shape = node_info.attributes.get("output_shape", [])  # type: List[int]
+
+    # If output_shape is given then we do not need to compute it ourselves
+    # The output_shape attribute does not include batch_size or channels and
+    # is only valid for ConvTranspose
+    if output_shape:
+        out_dims.extend(output_shape)
+    else:
+        auto_pad = node_info.attributes.get("auto_pad", "NOTSET".encode()).decode()
+        # SAME expects padding so that the output_shape = CEIL(input_shape / stride)
+        if auto_pad == "SAME_UPPER" or auto_pad == "SAME_LOWER":
+            out_dims.extend([x * s for x, s in zip(x_shape_ints[2:], strides)])
+        else:
+            # NOTSET means just use pads attribute
+            if auto_pad == "NOTSET":
+                pads = node_info.attributes.get("pads", [0] * num_dims * 2)
+            # VALID essentially means no padding
+            elif auto_pad == "VALID":
+                pads = [0] * num_dims * 2
+
+            for i in range(num_dims):
+                dim_in = x_shape_ints[i + 2]  # type: int
+
+                if node_info.node_type == "ConvTranspose":
+                    out_dim = (
+                        strides[i] * (dim_in - 1)
+                        + ((kernel_shape[i] - 1) * dilation[i] + 1)
+                        - pads[i]
+                        - pads[i + num_dims]
+                    )
+                else:
+                    out_dim = (
+                        dim_in
+                        + pads[i]
+                        + pads[i + num_dims]
+                        - dilation[i] * (kernel_shape[i] - 1)
+                        - 1
+                    ) // strides[i] + 1
+
+                # The input is smaller than the window
+                if out_dim <= 0:
+                    return None
+                out_dims.append(out_dim)
+
+    kernel_flops = int(np.prod(np.array(kernel_shape)) * w_shape_ints[1])
+    output_points = int(np.prod(np.array(out_dims)))
+    bias_ops = output_points if has_bias else int(0)
+    return 2 * kernel_flops * output_points + bias_ops
+
+
+@register_flops_formula("LSTM", "DynamicQuantizeLSTM", vectorized=False)
+def _lstm_flops(node_info: NodeInfo) -> Optional[int]:
+    x_shape = node_info.get_input(0).shape  # seq_length, batch_size, input_dim
+
+    if not all(isinstance(dim, int) for dim in x_shape):
+        return None
+
+    x_shape_ints = cast(List[int], x_shape)
+    hidden_size = node_info.attributes["hidden_size"]
+    direction = (
+        2 if node_info.attributes.get("direction") == "bidirectional".encode() else 1
+    )
+
+    bias_ops = 0
+    if len(node_info.inputs) >= 4:
+        bias_shape = node_info.get_input(3).shape
+        if isinstance(bias_shape[1], int):
+            bias_ops = bias_shape[1]
+    num_gates = int(4)
+    gate_input_flops = int(2 * x_shape_ints[2] * hidden_size)
+    gate_hid_flops = int(2 * hidden_size * hidden_size)
+    unit_flops = num_gates * (gate_input_flops + gate_hid_flops) + bias_ops
+    return x_shape_ints[1] * x_shape_ints[0] * direction * unit_flops
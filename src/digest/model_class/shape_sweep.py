@@ -0,0 +1,212 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Evaluates a model with dynamic input dims over a grid of static shapes. The model
+is parsed once, and every point of the grid is evaluated from that analysis, so
+no static copy of the model is written or loaded.
+
+    digest-sweep model.onnx --dims batch=1:64:*2 seq=128:8192:*2 -o sweep.csv
+"""
+
+import os
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+import pandas as pd
+from digest.model_class.digest_onnx_model import (
+    DigestOnnxModel,
+    DimsEvaluation,
+    load_digest_onnx_model,
+)
+
+# Points evaluated per task sent to a worker process
+SWEEP_CHUNK_SIZE = 16
+
+# Grids of models whose FLOPs need counting, rather than evaluating polynomials,
+# are only split across processes above this number of points
+MIN_PARALLEL_POINTS = 64
+
+
+def parse_dim_range(text: str) -> List[int]:
+    """Parses the values of a dim: a list such as "1,2,4", an inclusive range with
+    a step such as "128:1024:128", or a range with a factor such as "1:64:*2"."""
+    if ":" not in text:
+        return [int(value) for value in text.split(",") if value.strip()]
+
+    parts = text.split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Expected start:stop or start:stop:step, got '{text}'")
+    start, stop = int(parts[0]), int(parts[1])
+    step = parts[2].strip() if len(parts) == 3 else "1"
+    values = []
+    value = start
+    if step.startswith("*"):
+        factor = int(step[1:])
+        if factor < 2 or start < 1:
+            raise ValueError(f"A range with a factor must grow, got '{text}'")
+        while value <= stop:
+            values.append(value)
+            value *= factor
+    else:
+        increment = int(step)
+        if increment < 1:
+            raise ValueError(f"The step of a range must be positive, got '{text}'")
+        values = list(range(start, stop + 1, increment))
+    return values
+
+
+def parse_dim_grid(items: Sequence[str]) -> Dict[str, List[int]]:
+    """Parses name=values items, see parse_dim_range for the values"""
+    dim_ranges: Dict[str, List[int]] = {}
+    for item in items:
+        name, sep, values = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name=values for a dim, got '{item}'")
+        dim_ranges[name.strip()] = parse_dim_range(values)
+    return dim_ranges
+
+
+def dim_grid(dim_ranges: Dict[str, List[int]]) -> List[Dict[str, int]]:
+    """Every combination of the dim values, the last dim varies fastest"""
+    names = list(dim_ranges)
+    return [
+        dict(zip(names, values))
+        for values in product(*(dim_ranges[name] for name in names))
+    ]
+
+
+def evaluation_to_row(evaluation: DimsEvaluation) -> Dict[str, Optional[float]]:
+    def total_kbytes(tensors) -> Optional[float]:
+        sizes = [info.size_kbytes for info in tensors.values()]
+        return None if None in sizes else sum(sizes)
+
+    row: Dict[str, Optional[float]] = dict(evaluation.dim_values)
+    row["FLOPs"] = evaluation.flops
+    row["Parameters"] = evaluation.parameters
+    row["Input Size (KB)"] = total_kbytes(evaluation.model_inputs)
+    row["Output Size (KB)"] = total_kbytes(evaluation.model_outputs)
+    row["Activations Size (KB)"] = evaluation.activation_kbytes
+    return row
+
+
+# The model evaluated by a worker process, it is sent once when the worker starts
+_worker_model: Optional[DigestOnnxModel] = None
+
+
+def _init_worker(digest_model: DigestOnnxModel) -> None:
+    global _worker_model  # pylint: disable=global-statement
+    _worker_model = digest_model
+
+
+def _evaluate_chunk(points: List[Dict[str, int]]) -> List[Dict[str, Optional[float]]]:
+    assert _worker_model is not None
+    return [
+        evaluation_to_row(_worker_model.evaluate_dynamic_dims(point))
+        for point in points
+    ]
+
+
+def _evaluate_points(
+    digest_model: DigestOnnxModel, points: List[Dict[str, int]]
+) -> List[Dict[str, Optional[float]]]:
+    return [
+        evaluation_to_row(digest_model.evaluate_dynamic_dims(point)) for point in points
+    ]
+
+
+def sweep_shapes(
+    digest_model: DigestOnnxModel,
+    points: List[Dict[str, int]],
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Evaluates the model for every point of dim values and returns one row of
+    metrics per point. Models with FLOP expressions are evaluated in this process
+    since that only costs a polynomial evaluation per point. Otherwise the points
+    are split across worker processes that each receive the parsed model once."""
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    needs_counting = (
+        digest_model.flops_expression is None and digest_model.dynamic_input_dims
+    )
+    if not needs_counting or max_workers < 2 or len(points) < MIN_PARALLEL_POINTS:
+        rows = _evaluate_points(digest_model, points)
+    else:
+        chunks = [
+            points[i : i + SWEEP_CHUNK_SIZE]
+            for i in range(0, len(points), SWEEP_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, len(chunks)),
+            # Forking a process that runs Qt or ORT threads is not safe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(digest_model,),
+        ) as executor:
+            rows = [
+                row for chunk in executor.map(_evaluate_chunk, chunks) for row in chunk
+            ]
+
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Evaluate the FLOPs and tensor sizes of an ONNX model with "
+        "dynamic input dims for a grid of static shapes."
+    )
+    parser.add_argument("onnx_file", type=str, help="Path to the ONNX model.")
+    parser.add_argument(
+        "--dims",
+        nargs="+",
+        required=True,
+        help="Values of each dynamic dim as name=values. The values are a list "
+        "(batch=1,2,4), a range with a step (seq=128:1024:128) or a range with a "
+        "factor (seq=128:8192:*2).",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, help="Save the table to this CSV file."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes, defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always analyze the model instead of reusing the cached analysis.",
+    )
+    args = parser.parse_args()
+
+    try:
+        dim_ranges = parse_dim_grid(args.dims)
+    except ValueError as e:
+        parser.error(str(e))
+
+    digest_model = load_digest_onnx_model(
+        args.onnx_file, save_proto=False, use_cache=not args.no_cache
+    )
+    unknown_dims = set(dim_ranges) - set(digest_model.dynamic_input_dims)
+    missing_dims = set(digest_model.dynamic_input_dims) - set(dim_ranges)
+    if unknown_dims or missing_dims:
+        parser.error(
+            f"The dynamic input dims of the model are {digest_model.dynamic_input_dims}"
+        )
+
+    if digest_model.flops_expression is not None:
+        print(f"FLOPs: {digest_model.flops_expression}")
+
+    table = sweep_shapes(digest_model, dim_grid(dim_ranges), args.workers)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Saved {len(table)} shapes to {os.path.abspath(args.output)}")
+    else:
+        print(table.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""Qt workers that load models off the GUI thread. They live outside of
+digest.model_class so that the analysis core can be used without Qt."""
+
+# pylint: disable=no-name-in-module
+import threading
+from typing import Optional
+from PySide6.QtCore import QRunnable, Signal, Slot, QObject
+from digest.model_class.digest_onnx_model import (
+    DigestOnnxModel,
+    load_digest_onnx_model,
+)
+from digest.model_class.digest_report_model import DigestReportModel
+from utils import onnx_utils
+from utils.process_utils import run_isolated
+
+
+class OnnxWorkerSignals(QObject):
+    completed = Signal(DigestOnnxModel)
+    failed = Signal(str)
+
+
+class LoadDigestOnnxModelWorker(QRunnable):
+    """Loads an ONNX model off the GUI thread. When isolated, the model is analyzed
+    in a child process that is killed when it runs past timeout seconds, when its
+    resident memory goes past memory_limit bytes or when cancel_event is set. Only
+    the analysis is sent back, the proto is memory mapped again from the file. The
+    loads in the GUI process cannot be stopped and ignore cancel_event."""
+
+    def __init__(
+        self,
+        model_file_path: str,
+        model_name: str,
+        isolated: bool = False,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        super().__init__()
+        self.signals = OnnxWorkerSignals()
+        self.tab_name = model_name
+        self.model_file_path = model_file_path
+        self.unique_id: Optional[str] = None
+        self.isolated = isolated
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.cancel_event = cancel_event or threading.Event()
+
+    @Slot()
+    def run(self):
+        try:
+            if self.isolated:
+                digest_model = self.load_isolated()
+            else:
+                digest_model = load_digest_onnx_model(
+                    self.model_file_path,
+                    model_name=self.tab_name,
+                )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.signals.failed.emit(f"Unable to load {self.model_file_path}: {e}")
+            return
+
+        # A canceled load is not reported
+        if digest_model is None or (self.isolated and self.cancel_event.is_set()):
+            return
+
+        self.unique_id = digest_model.unique_id
+
+        if not self.tab_name:
+            self.tab_name = digest_model.model_name
+
+        self.signals.completed.emit(digest_model)
+
+    def load_isolated(self) -> Optional[DigestOnnxModel]:
+        result = run_isolated(
+            load_digest_onnx_model,
+            (self.model_file_path, self.tab_name, False),
+            timeout=self.timeout,
+            memory_limit=self.memory_limit,
+            canceled=self.cancel_event.is_set,
+        )
+        if result is None:
+            return None
+        if result.error is not None:
+            self.signals.failed.emit(
+                f"Unable to load {self.model_file_path}: {result.error}"
+            )
+            return None
+        digest_model = result.value
+        digest_model.model_proto = onnx_utils.load_onnx_lazy(self.model_file_path)
+        return digest_model
+
+
+class ReportWorkerSignals(QObject):
+    completed = Signal(DigestReportModel)
+
+
+class LoadDigestReportModelWorker(QRunnable):
+
+    def __init__(
+        self,
+        model_file_path: str,
+        model_name: str,
+    ):
+        super().__init__()
+        self.signals = ReportWorkerSignals()
+        self.tab_name = model_name
+        self.model_file_path = model_file_path
+        self.unique_id: Optional[str] = None
+
+    @Slot()
+    def run(self):
+
+        digest_model = DigestReportModel(self.model_file_path)
+        self.signals.completed.emit(digest_model)
@@ -57,7 +57,12 @@ class modelSummary(QWidget):
             self.model_proto = (
                 digest_model.model_proto if digest_model.model_proto else ModelProto()
             )
-            self.freeze_inputs = FreezeInputs(self.model_proto, model_name)
+            self.freeze_inputs = FreezeInputs(
+                self.model_proto,
+                model_name,
+                model_filepath=digest_model.filepath,
+                digest_model=digest_model,
+            )
             self.ui.freezeButton.clicked.connect(self.open_freeze_inputs)
             self.freeze_inputs.complete_signal.connect(self.close_freeze_window)
         elif isinstance(digest_model, DigestReportModel):
@@ -111,6 +116,13 @@ class modelSummary(QWidget):
                 pie_chart_data,
             )
 
+        elif (
+            isinstance(digest_model, DigestOnnxModel)
+            and digest_model.flops_expression is not None
+        ):
+            # Dynamic input dims, the FLOPs are shown as a function of the dims
+            flops_str = str(digest_model.flops_expression)
+
         self.ui.flops.setText(flops_str)
 
         # Inputs Table
@@ -1,11 +1,9 @@
 # Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
 
 import os
-import glob
-from typing import List, Optional, Dict, Union
-from collections import defaultdict
+from typing import List, Optional, Dict, Set, Tuple, Union
+import psutil
 from google.protobuf.message import DecodeError
-import onnx
 
 # pylint: disable=no-name-in-module
 from PySide6.QtWidgets import (
@@ -21,23 +19,46 @@ from PySide6.QtCore import Qt, Signal, QThread
 from digest.dialog import WarnDialog, ProgressDialog
 from digest.ui.multimodelselection_page_ui import Ui_MultiModelSelection
 from digest.multi_model_analysis import MultiModelAnalysis
-from digest.qt_utils import apply_dark_style_sheet, prompt_user_ram_limit
-from digest.model_class.digest_onnx_model import DigestOnnxModel
-from digest.model_class.digest_report_model import DigestReportModel, compare_yaml_files
+from digest.qt_utils import apply_dark_style_sheet
+from digest.model_class.digest_onnx_model import (
+    DigestOnnxModel,
+    load_digest_onnx_model,
+)
+from digest.model_class.digest_report_model import DigestReportModel
+from digest.folder_scanner import FolderScanThread
 from utils import onnx_utils
+from utils.process_utils import run_tasks
+
+
+# Number of onnx models analyzed in parallel, each in its own process
+ANALYSIS_WORKERS = os.cpu_count() or 1
+# Share of the available memory that the analysis may use
+ANALYSIS_MEMORY_FRACTION = 0.8
+# Memory used by a worker process before it loads a model
+WORKER_PROCESS_MEMORY = 256 * 1024 * 1024
 
 
 class AnalysisThread(QThread):
     open_progress = Signal(str, int)  # Signal to open dialog
     step_progress = Signal()  # Signal to send progress value
     close_progress = Signal()  # Signal to close dialog
+    model_analyzed = Signal(str, object)  # Signal for every analyzed model
     completed = Signal(list)  # Signal for thread completion
 
-    def __init__(self):
+    def __init__(
+        self,
+        num_workers: int = ANALYSIS_WORKERS,
+        memory_budget: Optional[int] = None,
+    ):
+        """The onnx models are analyzed on a pool of num_workers processes. A model
+        only starts while the memory estimates of the models being analyzed fit the
+        memory budget, which defaults to a share of the available memory."""
         super().__init__()
         self.model_dict: Dict[
             str, Optional[Union[DigestOnnxModel, DigestReportModel]]
         ] = {}
+        self.num_workers = num_workers
+        self.memory_budget = memory_budget
         self.user_canceled = False
 
     def run(self):
@@ -45,29 +66,54 @@ class AnalysisThread(QThread):
         # the user closes the window and re-opens it.
         self.open_progress.emit("Performing model analysis", len(self.model_dict))
 
+        tasks: List[Tuple[str, Tuple]] = []
+        memory: Dict[str, int] = {}
         for file, model in self.model_dict.items():
             if self.user_canceled:
-                self.close_progress.emit()
-                self.completed.emit([])
-                return
-            self.step_progress.emit()
-            if model:
-                continue
+                break
             model_name, file_ext = os.path.splitext(os.path.basename(file))
-            if file_ext == ".onnx":
-                model_proto = onnx_utils.load_onnx(file, False)
-                self.model_dict[file] = DigestOnnxModel(
-                    model_proto,
-                    onnx_filepath=file,
-                    model_name=model_name,
-                    save_proto=False,
-                )
+            if model:
+                self.step_progress.emit()
+            elif file_ext == ".onnx":
+                tasks.append((file, (file, model_name, False)))
+                try:
+                    memory[file] = onnx_utils.estimate_analysis_memory(file)
+                except (DecodeError, ValueError, IndexError, OSError) as error:
+                    print(f"Unable to estimate the memory used by {file}: {error}")
             elif file_ext == ".yaml":
+                # Reports are small and loaded right away
                 self.model_dict[file] = DigestReportModel(file)
+                self.model_analyzed.emit(file, self.model_dict[file])
+                self.step_progress.emit()
+
+        memory_budget = self.memory_budget
+        if memory_budget is None:
+            memory_budget = int(
+                psutil.virtual_memory().available * ANALYSIS_MEMORY_FRACTION
+            ) - WORKER_PROCESS_MEMORY * min(self.num_workers, len(tasks))
+
+        for result in run_tasks(
+            load_digest_onnx_model,
+            tasks,
+            self.num_workers,
+            memory=memory,
+            memory_budget=max(memory_budget, 0),
+            canceled=lambda: self.user_canceled,
+        ):
+            self.step_progress.emit()
+            if result.error is not None:
+                print(f"Failed to analyze {result.key}: {result.error}")
+                continue
+            self.model_dict[result.key] = result.value
+            self.model_analyzed.emit(result.key, result.value)
 
         self.close_progress.emit()
 
-        model_list = list(self.model_dict.values())
+        if self.user_canceled:
+            self.completed.emit([])
+            return
+
+        model_list = [model for model in self.model_dict.values() if model]
 
         self.completed.emit(model_list)
 
@@ -94,7 +140,10 @@ class MultiModelSelectionPage(QWidget):
         self.ui.radioAll.toggled.connect(self.update_list_view_items)
         self.ui.radioONNX.toggled.connect(self.update_list_view_items)
         self.ui.radioReports.toggled.connect(self.update_list_view_items)
+        self.ui.ignoreMetadataCheckBox.toggled.connect(self.rescan_directory)
         self.ui.selectFolderBtn.clicked.connect(self.openFolder)
+        self.ui.cancelScanBtn.clicked.connect(self.cancel_scan)
+        self.ui.cancelScanBtn.hide()
 
         # We want to retain the size when the duplicate label
         # is hidden to keep the two list columns even.
@@ -114,8 +163,15 @@ class MultiModelSelectionPage(QWidget):
         self.model_dict: Dict[
             str, Optional[Union[DigestOnnxModel, DigestReportModel]]
         ] = {}
+        self.analyzed_models: Dict[
+            str, Union[DigestOnnxModel, DigestReportModel]
+        ] = {}
 
         self.analysis_thread: Optional[AnalysisThread] = None
+        self.scan_thread: Optional[FolderScanThread] = None
+        # The canceled scans, kept until their threads return
+        self.stopped_scans: Set[FolderScanThread] = set()
+        self.num_duplicates = 0
         self.progress: Optional[ProgressDialog] = None
         self.analysis_window = QMainWindow()
 
@@ -170,12 +226,13 @@ class MultiModelSelectionPage(QWidget):
         # Show menu at the position of the mouse click
         menu.exec(self.ui.modelListView.viewport().mapToGlobal(pos))
 
-    def update_num_selected_label(self):
-        self.model_dict.clear()
-        for row in range(self.item_model.rowCount()):
-            item = self.item_model.item(row)
-            if item.checkState() == Qt.CheckState.Checked:
-                self.model_dict[item.data(Qt.ItemDataRole.DisplayRole)] = None
+    def update_num_selected_label(self, recount: bool = True):
+        if recount:
+            self.model_dict.clear()
+            for row in range(self.item_model.rowCount()):
+                item = self.item_model.item(row)
+                if item.checkState() == Qt.CheckState.Checked:
+                    self.model_dict[item.data(Qt.ItemDataRole.DisplayRole)] = None
 
         self.ui.numSelectedLabel.setText(f"{len(self.model_dict)} selected models")
         if self.model_dict:
@@ -187,6 +244,8 @@ class MultiModelSelectionPage(QWidget):
         radio_all_state = self.ui.radioAll.isChecked()
         radio_onnx_state = self.ui.radioONNX.isChecked()
         radio_reports_state = self.ui.radioReports.isChecked()
+        # The selection is counted once after all the rows are updated
+        self.item_model.blockSignals(True)
         for row in range(self.item_model.rowCount()):
             item = self.item_model.item(row)
             value = item.data(Qt.ItemDataRole.DisplayRole)
@@ -198,10 +257,14 @@ class MultiModelSelectionPage(QWidget):
                 item.setCheckState(Qt.CheckState.Checked)
             else:
                 item.setCheckState(Qt.CheckState.Unchecked)
+        self.item_model.blockSignals(False)
+        self.ui.modelListView.viewport().update()
+        self.update_num_selected_label()
 
     def set_directory(self, directory: str):
         """
-        Recursively searches a directory for onnx models and yaml report files.
+        Starts a background scan of a directory for onnx models and yaml report
+        files. The rows are added to the list view as the models are found.
         """
 
         if not os.path.exists(directory):
@@ -212,145 +275,129 @@ class MultiModelSelectionPage(QWidget):
         else:
             return
 
-        onnx_file_list = list(
-            glob.glob(os.path.join(directory, "**/*.onnx"), recursive=True)
-        )
-        onnx_file_list = [os.path.normpath(model_file) for model_file in onnx_file_list]
+        self.stop_scan()
+        self.analyzed_models.clear()
+        self.item_model.clear()
+        self.ui.duplicateListWidget.clear()
+        self.ui.duplicateLabel.hide()
+        self.ui.warningLabel.hide()
+        self.num_duplicates = 0
+        self.update_num_selected_label()
+        self.update_message_label("Scanning the selected directory for models.")
 
-        # TODO Move to another thread and see if we can capture tqdm
-        yaml_file_list = list(
-            glob.glob(os.path.join(directory, "**/*.yaml"), recursive=True)
+        self.scan_thread = FolderScanThread(
+            directory, ignore_metadata=self.ui.ignoreMetadataCheckBox.isChecked()
         )
-        yaml_file_list = [os.path.normpath(model_file) for model_file in yaml_file_list]
-
-        # Filter out YAML files that are not valid reports
-        report_file_list = []
-        for yaml_file in yaml_file_list:
-            digest_report = DigestReportModel(yaml_file)
-            if digest_report.is_valid:
-                report_file_list.append(yaml_file)
-
-        total_num_models = len(onnx_file_list) + len(report_file_list)
-
-        if total_num_models == 0:
-            self.update_message_label("No models found in the selected directory.")
+        self.scan_thread.model_found.connect(self.add_model_item)
+        self.scan_thread.duplicate_found.connect(self.add_duplicate_item)
+        self.scan_thread.progress.connect(self.update_scan_progress)
+        self.scan_thread.completed.connect(self.scan_completed)
+        self.ui.cancelScanBtn.show()
+        self.scan_thread.start()
+
+    def rescan_directory(self) -> None:
+        if self.current_dir:
+            directory, self.current_dir = self.current_dir, ""
+            self.set_directory(directory)
+
+    def stop_scan(self, wait: bool = False) -> None:
+        """Cancels the folder scan without blocking the GUI. The scan thread returns
+        on its own without waiting for the probes that are still running, and its
+        queued signals are ignored. With wait, the canceled scans are joined, which
+        is only done when the application is closed."""
+        if self.scan_thread:
+            scan_thread = self.scan_thread
+            scan_thread.stop_scanning()
+            self.stopped_scans.add(scan_thread)
+            scan_thread.finished.connect(
+                lambda: self.stopped_scans.discard(scan_thread)
+            )
+            if scan_thread.isFinished():
+                self.stopped_scans.discard(scan_thread)
+            self.scan_thread = None
+        if wait:
+            for scan_thread in list(self.stopped_scans):
+                scan_thread.wait()
+        self.ui.cancelScanBtn.hide()
+
+    def cancel_scan(self) -> None:
+        if self.scan_thread:
+            self.scan_thread.stop_scanning()
+
+    def is_scan_signal(self) -> bool:
+        # The signals queued by a previous scan are ignored
+        return self.scan_thread is not None and self.sender() is self.scan_thread
+
+    def add_model_item(self, filepath: str):
+        if not self.is_scan_signal():
             return
-
-        serialized_models_paths: defaultdict[bytes, List[str]] = defaultdict(list)
-
-        progress = ProgressDialog("Loading models", total_num_models, self)
-
-        memory_limit_percentage = 90
-        models_loaded = 0
-        for filepath in onnx_file_list + report_file_list:
-            progress.step()
-            if progress.wasCanceled():
-                break
-            try:
-                models_loaded += 1
-                extension = os.path.splitext(filepath)[-1]
-                if extension == ".onnx":
-                    model = onnx.load(filepath, load_external_data=False)
-                    serialized_models_paths[model.SerializeToString()].append(filepath)
-                elif extension == ".yaml":
-                    pass
-                dialog_msg = (
-                    "Warning: System RAM has exceeded the threshold of "
-                    f"{memory_limit_percentage}%. No further models will be loaded. "
-                )
-                if prompt_user_ram_limit(
-                    sys_ram_percent_limit=memory_limit_percentage,
-                    message=dialog_msg,
-                    parent=self,
-                ):
-                    self.update_warning_label(
-                        f"Loaded only {models_loaded - 1} out of {total_num_models} models "
-                        f"as memory consumption has reached {memory_limit_percentage}% of "
-                        "system memory. Preventing further loading of models."
-                    )
-                    print(
-                        "Preventing further model loads as mem consumption exceeded "
-                        f"{memory_limit_percentage}%"
-                    )
-                    break
-                else:
-                    self.ui.warningLabel.hide()
-
-            except DecodeError as error:
-                print(f"Error decoding model {filepath}: {error}")
-
-        progress = ProgressDialog(
-            "Processing Models",
-            len(serialized_models_paths) + len(report_file_list),
-            self,
+        extension = os.path.splitext(filepath)[-1]
+        checked = (
+            self.ui.radioAll.isChecked()
+            or (extension == ".onnx" and self.ui.radioONNX.isChecked())
+            or (extension == ".yaml" and self.ui.radioReports.isChecked())
+        )
+        item = QStandardItem(filepath)
+        item.setCheckable(True)
+        item.setCheckState(
+            Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
         )
+        self.item_model.appendRow(item)
+        if checked:
+            self.model_dict[filepath] = None
+            self.update_num_selected_label(recount=False)
 
-        num_duplicates = 0
-        self.item_model.clear()
-        self.ui.duplicateListWidget.clear()
-        for paths in serialized_models_paths.values():
-            if progress.wasCanceled():
-                break
-            progress.step()
-            if len(paths) > 1:
-                num_duplicates += 1
-                self.ui.duplicateListWidget.addItem(paths[0])
-                for dupe in paths[1:]:
-                    self.ui.duplicateListWidget.addItem(f"- Duplicate: {dupe}")
-            item = QStandardItem(paths[0])
-            item.setCheckable(True)
-            item.setCheckState(Qt.CheckState.Checked)
-            self.item_model.appendRow(item)
-
-        # Use a standard nested loop to detect duplicate reports
-        duplicate_reports: Dict[str, List[str]] = {}
-        processed_files = set()
-        for i in range(len(report_file_list)):
-            if progress.wasCanceled():
-                break
-            progress.step()
-            path1 = report_file_list[i]
-            if path1 in processed_files:
-                continue  # Skip already processed files
-
-            # We will use path1 as the unique model and save a list of duplicates
-            duplicate_reports[path1] = []
-            for j in range(i + 1, len(report_file_list)):
-                path2 = report_file_list[j]
-                if compare_yaml_files(
-                    path1, path2, ["report_date", "model_files", "digest_version"]
-                ):
-                    num_duplicates += 1
-                    duplicate_reports[path1].append(path2)
-                    processed_files.add(path2)
-
-        progress.close()
-
-        for path, dupes in duplicate_reports.items():
-            if dupes:
-                self.ui.duplicateListWidget.addItem(path)
-                for dupe in dupes:
-                    self.ui.duplicateListWidget.addItem(f"- Duplicate: {dupe}")
-            item = QStandardItem(path)
-            item.setCheckable(True)
-            item.setCheckState(Qt.CheckState.Checked)
-            self.item_model.appendRow(item)
-
-        if num_duplicates:
-            label_text = f"Ignoring {num_duplicates} duplicate model(s)."
-            self.ui.duplicateLabel.setText(label_text)
-            self.ui.duplicateLabel.show()
+    def add_duplicate_item(self, filepath: str, duplicate: str):
+        if not self.is_scan_signal():
+            return
+        duplicate_list = self.ui.duplicateListWidget
+        # The duplicates are listed below the model they duplicate
+        found = duplicate_list.findItems(filepath, Qt.MatchFlag.MatchExactly)
+        if found:
+            row = duplicate_list.row(found[0]) + 1
+            while row < duplicate_list.count() and duplicate_list.item(
+                row
+            ).text().startswith("- Duplicate: "):
+                row += 1
+            duplicate_list.insertItem(row, f"- Duplicate: {duplicate}")
         else:
-            self.ui.duplicateLabel.hide()
+            duplicate_list.addItem(filepath)
+            duplicate_list.addItem(f"- Duplicate: {duplicate}")
 
-        self.update_num_selected_label()
+        self.num_duplicates += 1
+        self.ui.duplicateLabel.setText(
+            f"Ignoring {self.num_duplicates} duplicate model(s)."
+        )
+        self.ui.duplicateLabel.show()
 
+    def update_scan_progress(self, num_scanned: int, num_files: int):
+        if not self.is_scan_signal():
+            return
         self.update_message_label(
-            f"Found a total of {total_num_models} model files. "
-            "Right click a model below "
-            "to open it up in the model summary view."
+            f"Scanning... checked {num_scanned} of {num_files} files found so far, "
+            f"{self.item_model.rowCount()} models and {self.num_duplicates} "
+            "duplicates."
         )
 
+    def scan_completed(self, finished: bool):
+        if not self.is_scan_signal():
+            return
+        self.ui.cancelScanBtn.hide()
+        total_num_models = self.item_model.rowCount() + self.num_duplicates
+        if not finished:
+            self.update_message_label(
+                f"Scan canceled after finding {total_num_models} model files. "
+                "Right click a model below to open it up in the model summary view."
+            )
+        elif total_num_models == 0:
+            self.update_message_label("No models found in the selected directory.")
+        else:
+            self.update_message_label(
+                f"Found a total of {total_num_models} model files. "
+                "Right click a model below "
+                "to open it up in the model summary view."
+            )
+
     def start_analysis(self):
 
         if not self.model_dict:
@@ -362,9 +409,20 @@ class MultiModelSelectionPage(QWidget):
         self.analysis_thread.close_progress.connect(self.close_progress)
         self.analysis_thread.step_progress.connect(self.step_progress)
         self.analysis_thread.open_progress.connect(self.open_progress)
-        self.analysis_thread.model_dict = self.model_dict
+        self.analysis_thread.model_analyzed.connect(self.add_analyzed_model)
+        # The models analyzed before, even by a canceled analysis, are reused
+        self.analysis_thread.model_dict = {
+            file: self.analyzed_models.get(file) for file in self.model_dict
+        }
         self.analysis_thread.start()
 
+    def add_analyzed_model(
+        self, filepath: str, model: Union[DigestOnnxModel, DigestReportModel]
+    ):
+        self.analyzed_models[filepath] = model
+        if self.progress:
+            self.progress.setLabelText(f"Analyzed {model.model_name}")
+
     def open_analysis(
         self, model_list: List[Union[DigestOnnxModel, DigestReportModel]]
     ):
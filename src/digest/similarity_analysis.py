@@ -4,10 +4,13 @@
 import os
 from typing import List, Optional
 from PySide6.QtCore import Signal, QRunnable, QObject
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 import pandas as pd
 from digest.subgraph_analysis.find_match import find_match
+from digest.subgraph_analysis.similarity_index import get_corpora_stamp
+from utils.analysis_cache import get_analysis_cache
 
 
 class WorkerSignals(QObject):
@@ -21,12 +24,16 @@ class SimilarityWorker(QRunnable):
         model_file_path: Optional[str] = None,
         png_file_path: Optional[str] = None,
         model_id: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        model_name: str = "",
     ):
         super().__init__()
         self.signals = WorkerSignals()
         self.model_filepath = model_file_path
         self.png_filepath = png_file_path
         self.model_id = model_id
+        self.content_hash = content_hash
+        self.model_name = model_name
 
     def run(self):
         if not self.model_filepath:
@@ -36,13 +43,55 @@ class SimilarityWorker(QRunnable):
         if not self.model_id:
             raise ValueError("You must set the model id")
 
+        df_sorted = None
         try:
-            most_similar, _, df_sorted = find_match(
-                self.model_filepath,
-                dequantize=False,
-                replace=True,
+            cache = get_analysis_cache() if self.content_hash else None
+            # The cached results are only used while the corpora they were scored
+            # against are unchanged
+            corpora_stamp = get_corpora_stamp() if cache else ""
+            cached_result = (
+                cache.get_similarity(self.content_hash)
+                if cache and self.content_hash
+                else None
             )
+            if cached_result and cached_result[0] == corpora_stamp:
+                _, most_similar, df_sorted = cached_result
+            else:
+                most_similar, _, df_sorted = find_match(
+                    self.model_filepath,
+                    dequantize=False,
+                    content_hash=self.content_hash,
+                )
+                if cache and self.content_hash:
+                    cache.put_similarity(
+                        self.content_hash, (corpora_stamp, most_similar, df_sorted)
+                    )
             most_similar = [os.path.basename(path) for path in most_similar]
+
+            # The heatmap is titled with the model name, a model opened under
+            # another name is rendered again
+            cached_heatmap = (
+                cache.get_heatmap(self.content_hash)
+                if cache and self.content_hash
+                else None
+            )
+            if cached_heatmap and cached_heatmap[:2] == (
+                corpora_stamp,
+                self.model_name,
+            ):
+                with open(self.png_filepath, "wb") as png_file:
+                    png_file.write(cached_heatmap[2])
+            else:
+                post_process(
+                    self.model_name, most_similar, df_sorted, self.png_filepath
+                )
+                if cache and self.content_hash:
+                    with open(self.png_filepath, "rb") as png_file:
+                        cache.put_heatmap(
+                            self.content_hash,
+                            (corpora_stamp, self.model_name, png_file.read()),
+                        )
+
             # We convert List[str] to str to send through the signal
             most_similar = ",".join(most_similar)
             self.signals.completed.emit(
@@ -63,10 +112,16 @@ def post_process(
     png_file_path: str,
     dark_mode: bool = True,
 ):
-    """Matplotlib is not thread safe so we must do post_processing on the main thread"""
-    if dark_mode:
-        plt.style.use("dark_background")
-    fig, ax = plt.subplots(figsize=(12, 10))
+    """Renders the similarity heatmap to a PNG file. The figure is drawn with the
+    object oriented Agg API instead of pyplot, which keeps global state, so this
+    is safe to call from the worker threads."""
+    foreground = "white" if dark_mode else "black"
+    background = "black" if dark_mode else "white"
+
+    fig = Figure(figsize=(12, 10), facecolor=background)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_facecolor(background)
     im = ax.imshow(df_sorted, cmap="viridis")
 
     # Show all ticks and label them with the respective list entries
@@ -74,13 +129,19 @@ def post_process(
     ax.set_yticks(np.arange(len(name_list)))
     ax.set_xticklabels([a[:5] for a in df_sorted.columns])
     ax.set_yticklabels(name_list)
+    ax.tick_params(colors=foreground)
+    for spine in ax.spines.values():
+        spine.set_edgecolor(foreground)
 
     # Rotate the tick labels and set their alignment
-    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment("right")
+        label.set_rotation_mode("anchor")
 
-    ax.set_title(f"Model Similarity Heatmap - {model_name}")
+    ax.set_title(f"Model Similarity Heatmap - {model_name}", color=foreground)
 
-    cb = plt.colorbar(
+    cb = fig.colorbar(
         im,
         ax=ax,
         shrink=0.5,
@@ -93,13 +154,13 @@ def post_process(
     cb.set_ticklabels(
         ["0.0 (Low)", "0.5 (Medium)", "1.0 (High)"]
     )  # Set corresponding labels
-    cb.set_label("Correlation Ratio", labelpad=-100)
+    cb.set_label("Correlation Ratio", labelpad=-100, color=foreground)
+    cb.ax.tick_params(colors=foreground)
+    cb.outline.set_edgecolor(foreground)
 
     fig.tight_layout()
 
     if png_file_path is None:
         png_file_path = "heatmap.png"
 
-    fig.savefig(png_file_path)
-
-    plt.close(fig)
+    fig.savefig(png_file_path, facecolor=background)
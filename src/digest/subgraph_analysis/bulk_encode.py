@@ -0,0 +1,278 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Bulk encoding of ONNX models into named similarity corpora, installed as the
+digest-encode command. The models of a directory or of a zip archive are
+encoded in worker processes and their WL feature counts are added straight to
+the database file of the corpus, without any intermediate JSON files.
+
+    digest-encode add internal /path/to/models --workers 32
+    digest-encode remove internal vision/resnet50
+    digest-encode rebuild internal /path/to/models
+    digest-encode list
+
+The models of a corpus are named by their path relative to the directory, or
+within the archive, without the .onnx extension. Adding a source again only
+encodes its new and changed models. The corpus is saved every SAVE_EVERY models,
+so an interrupted run keeps most of its work, and the similarity analysis scores
+every corpus found in the user cache directory.
+"""
+
+import os
+import time
+import zipfile
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import onnx
+from tqdm import tqdm
+from digest.subgraph_analysis.model_encode import encode_onnx_model, find_onnx_files
+from digest.subgraph_analysis.similarity_index import (
+    SimilarityIndex,
+    get_corpus_path,
+    list_corpora,
+)
+from utils.process_utils import run_tasks
+
+# Number of encoded models between two saves of the corpus
+SAVE_EVERY = 256
+
+
+@dataclass
+class EncodeStats:
+    encoded: int = 0
+    skipped: int = 0
+    # The error of every model that could not be encoded, by name
+    failed: Dict[str, str] = field(default_factory=dict)
+    encoded_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def models_per_second(self) -> float:
+        return self.encoded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.encoded_bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+def find_models(source: str) -> Dict[str, Tuple[Tuple[str, Optional[str]], Tuple]]:
+    """Returns the (path, archive member) and the signature of every model of a
+    directory, zip archive or ONNX file, by model name. The signature is the size
+    and modification time of a file, or the size and CRC of an archive member."""
+    models = {}
+    if os.path.isfile(source) and zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source, "r") as archive:
+            for info in archive.infolist():
+                if info.filename.endswith(".onnx") and not info.is_dir():
+                    name = os.path.splitext(info.filename)[0]
+                    models[name] = (
+                        (source, info.filename),
+                        (info.file_size, info.CRC),
+                    )
+    elif os.path.isfile(source) and source.endswith(".onnx"):
+        stat = os.stat(source)
+        name = os.path.splitext(os.path.basename(source))[0]
+        models[name] = ((source, None), (stat.st_size, stat.st_mtime_ns))
+    elif os.path.isdir(source):
+        for onnx_file in sorted(find_onnx_files(source)):
+            stat = os.stat(onnx_file)
+            name = os.path.splitext(os.path.relpath(onnx_file, source))[0]
+            models[name.replace(os.sep, "/")] = (
+                (onnx_file, None),
+                (stat.st_size, stat.st_mtime_ns),
+            )
+    else:
+        raise FileNotFoundError(
+            "The source must be an ONNX file, a directory or a zip archive of "
+            f"ONNX files. Got {source}"
+        )
+    return models
+
+
+def _encode_task(
+    path: str, member: Optional[str], model_name: str, dequantize: bool, rounds: int
+) -> Dict[str, Any]:
+    if member is None:
+        onnx_model = onnx.load(path, load_external_data=False)
+    else:
+        with zipfile.ZipFile(path, "r") as archive:
+            onnx_model = onnx.load_model_from_string(archive.read(member))
+    return encode_onnx_model(onnx_model, model_name, dequantize, rounds)
+
+
+def load_corpus(corpus: str) -> SimilarityIndex:
+    """Returns the index of a corpus, which is empty if it does not exist yet"""
+    # The corpus is modified and saved again, so it is not memory-mapped
+    index = SimilarityIndex.load(get_corpus_path(corpus), use_mmap=False)
+    return index or SimilarityIndex.empty()
+
+
+def save_corpus(corpus: str, index: SimilarityIndex) -> None:
+    corpus_path = get_corpus_path(corpus)
+    os.makedirs(os.path.dirname(corpus_path), exist_ok=True)
+    index.save(corpus_path)
+
+
+def encode_corpus(
+    corpus: str,
+    source: str,
+    workers: int = 1,
+    dequantize: bool = False,
+    rounds: int = 1,
+    timeout: Optional[float] = None,
+    rebuild: bool = False,
+) -> EncodeStats:
+    """Encodes the models of source into the named corpus. Models already in the
+    corpus with the same signature are skipped. With rebuild, every model of
+    source is encoded again and the models that are not in source are removed."""
+    models = find_models(source)
+    index = SimilarityIndex.empty() if rebuild else load_corpus(corpus)
+    stats = EncodeStats()
+
+    current = dict(zip(index.names, map(tuple, index.signatures.tolist())))
+    todo = [
+        name
+        for name, (_, signature) in models.items()
+        if current.get(name) != tuple(signature)
+    ]
+    stats.skipped = len(models) - len(todo)
+    # The largest models take the longest, starting them first keeps the workers
+    # from waiting on a single large model at the end of the run
+    todo.sort(key=lambda name: models[name][1][0], reverse=True)
+
+    print(
+        f"Encoding {len(todo)} models into the corpus {corpus}, "
+        f"{stats.skipped} already encoded."
+    )
+    tasks = [
+        (
+            name,
+            (*models[name][0], name.rsplit("/", 1)[-1], dequantize, rounds),
+        )
+        for name in todo
+    ]
+
+    start_time = time.monotonic()
+    encoded: Dict[str, Dict[str, Any]] = {}
+
+    def flush() -> None:
+        index.replace_models(encoded, {name: models[name][1] for name in encoded})
+        encoded.clear()
+        save_corpus(corpus, index)
+
+    for result in tqdm(
+        run_tasks(_encode_task, tasks, workers, timeout), total=len(tasks)
+    ):
+        if result.error is not None:
+            stats.failed[result.key] = result.error
+            print(f"Failed to encode {result.key}: {result.error}")
+            continue
+        encoded[result.key] = result.value
+        stats.encoded += 1
+        stats.encoded_bytes += models[result.key][1][0]
+        if len(encoded) >= SAVE_EVERY:
+            flush()
+    stats.elapsed = time.monotonic() - start_time
+    flush()
+
+    print(
+        f"Encoded {stats.encoded} models in {stats.elapsed:.1f} s, "
+        f"{stats.models_per_second:.2f} models/s and "
+        f"{stats.megabytes_per_second:.2f} MB/s. The corpus {corpus} has "
+        f"{len(index.names)} models."
+    )
+    if stats.failed:
+        print(f"{len(stats.failed)} models could not be encoded.")
+    return stats
+
+
+def remove_from_corpus(corpus: str, names: List[str]) -> int:
+    """Removes models from a corpus by name and returns how many were removed"""
+    index = load_corpus(corpus)
+    removed = index.remove_models(names)
+    if removed:
+        save_corpus(corpus, index)
+    return removed
+
+
+def delete_corpus(corpus: str) -> None:
+    corpus_path = get_corpus_path(corpus)
+    if os.path.exists(corpus_path):
+        os.remove(corpus_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Encode ONNX models in bulk into a named similarity corpus."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, help_text in (
+        ("add", "Encode the new and changed models of a source into a corpus."),
+        ("rebuild", "Encode all the models of a source into a new corpus."),
+    ):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("corpus", type=str, help="Name of the corpus.")
+        subparser.add_argument(
+            "source",
+            type=str,
+            help="ONNX file, directory or zip archive of ONNX files.",
+        )
+        subparser.add_argument(
+            "-j",
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of models encoded in parallel, defaults to the number "
+            "of CPUs.",
+        )
+        subparser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="Seconds after which the encoding of a model is stopped.",
+        )
+        subparser.add_argument(
+            "--dequantize", action="store_true", help="Remove quantization nodes"
+        )
+        subparser.add_argument(
+            "--rounds", type=int, default=1, help="Number of WL rounds, defaults to 1"
+        )
+
+    remove_parser = subparsers.add_parser(
+        "remove", help="Remove models from a corpus by name."
+    )
+    remove_parser.add_argument("corpus", type=str, help="Name of the corpus.")
+    remove_parser.add_argument("names", type=str, nargs="+", help="Model names.")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete a corpus.")
+    delete_parser.add_argument("corpus", type=str, help="Name of the corpus.")
+
+    subparsers.add_parser("list", help="List the corpora and their sizes.")
+
+    args = parser.parse_args()
+
+    if args.command in ("add", "rebuild"):
+        encode_corpus(
+            args.corpus,
+            args.source,
+            workers=args.workers,
+            dequantize=args.dequantize,
+            rounds=args.rounds,
+            timeout=args.timeout,
+            rebuild=args.command == "rebuild",
+        )
+    elif args.command == "remove":
+        removed = remove_from_corpus(args.corpus, args.names)
+        print(f"Removed {removed} models from the corpus {args.corpus}")
+    elif args.command == "delete":
+        delete_corpus(args.corpus)
+    else:
+        for corpus in list_corpora():
+            index = SimilarityIndex.load(get_corpus_path(corpus))
+            print(f"{corpus}: {len(index.names) if index else 'unreadable'} models")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,61 @@
 
 import os
 import argparse
-import json
-import zipfile
 import pandas as pd
 
 import numpy as np
 from digest.subgraph_analysis.model_encode import (
     encode_model,
 )  # pylint: disable=import-error
-
-
-def find_match(model_path, dequantize=False, replace=False):
-
-    # Unzip database if needed
-    analyzer_path = os.path.dirname(os.path.abspath(__file__))
-    database_path = os.path.join(analyzer_path, "database")
-    if not os.path.exists(database_path):
-        database_zip_path = os.path.join(analyzer_path, "database.zip")
-        with zipfile.ZipFile(database_zip_path, "r") as zip_ref:
-            print("Unpacking model database")
-            zip_ref.extractall(analyzer_path)
+from digest.subgraph_analysis.similarity_index import (
+    get_encodings_dir,
+    load_lsh,
+    load_similarity_indexes,
+    read_op_list,
+    score_indexes,
+)
+import utils.onnx_utils as onnx_utils
+
+
+def get_encoding_name(content_hash, dequantize=False):
+    """Returns the name of the encoding of a model in the directory of the models
+    encoded on this machine. Encodings are named after the hash of the model file,
+    so that models with the same file name do not overwrite each other and a model
+    that was encoded before is never encoded again."""
+    return f"{content_hash}-dequantized" if dequantize else content_hash
+
+
+def get_model_name(index, row):
+    """Returns the name of the model encoded in a row of an index. Models encoded
+    under the hash of their file keep their name in their description."""
+    return index.description(row).get("model_name") or index.names[row]
+
+
+def find_match(
+    model_path, dequantize=False, replace=False, content_hash=None, approximate=False
+):
+    """Scores the model against the similarity database, the corpora and the models
+    encoded on this machine. With approximate, only the candidates found by the LSH
+    tables of the databases are scored, which scales to very large databases but may
+    miss some of the best matches."""
 
     # Open feature of target model
+    encodings_dir = get_encodings_dir()
     model_name = os.path.splitext(os.path.basename(model_path))[0]
-    target_model_path = os.path.join(database_path, f"{model_name}.json")
+    if not content_hash:
+        content_hash = onnx_utils.hash_file(model_path)
+    encoding_name = get_encoding_name(content_hash, dequantize)
+    target_model_path = os.path.join(encodings_dir, f"{encoding_name}.json")
     if os.path.exists(target_model_path):
         print(f"{target_model_path} found.")
         if replace:
             print("Replacing it!")
-            encode_model(model_path=model_path, dequantize=dequantize)
+            encode_model(
+                model_path=model_path,
+                model_name=model_name,
+                dequantize=dequantize,
+                file_name=encoding_name,
+            )
         else:
             print(
                 "Using encoded model found in the cache. Use `--replace` "
@@ -38,23 +64,16 @@ def find_match(model_path, dequantize=False, replace=False):
             )
     else:
         print("Encoding model for the first time.")
-        encode_model(model_path=model_path, dequantize=dequantize)
-
-    with open(target_model_path, "r", encoding="utf-8") as json_file:
-        target_model = json.load(json_file)
-
-    # Get features of all models in the database
-    # Note that the target model is intentionally part of this list
-    models_json = []
-    for root, _, files in os.walk(database_path):
-        for file in files:
-            if file.endswith(".json"):
-                models_json.append(os.path.join(root, file))
+        encode_model(
+            model_path=model_path,
+            model_name=model_name,
+            dequantize=dequantize,
+            file_name=encoding_name,
+        )
 
     # Filter columns we will show
-    target_op_dict = target_model["op_list"]
-    target_op_dict.pop("input", None)
-    target_op_dict.pop("output", None)
+    target_op_dict = read_op_list(target_model_path)
+    full_target_op_dict = target_op_dict
 
     # Only keep the top num_subgraphs subgraphs and all ops
     num_subgraphs = 20
@@ -63,48 +82,28 @@ def find_match(model_path, dequantize=False, replace=False):
     ops = list({k: v for k, v in target_op_dict.items() if len(k) != 32}.keys())
     target_op_dict = {k: v for k, v in target_op_dict.items() if k in subgraphs + ops}
 
-    df = pd.DataFrame(columns=["Name", "Score"] + list(target_op_dict))
-
-    scores = {}
-    for reference_json in models_json:
-        reference_basename = os.path.basename(reference_json)
-        reference_name = os.path.splitext(reference_basename)[0]
-        with open(reference_json, "r", encoding="utf-8") as ref_json_f:
-            reference_model = json.load(ref_json_f)
-
-        score = 0
-        row = {"Name": reference_name}
-
-        for subgraph in target_op_dict:
-            if subgraph in reference_model["op_list"]:
-
-                ratio = reference_model["op_list"][subgraph] / target_op_dict[subgraph]
-                if ratio > 1:
-                    ratio = 1 / ratio
-                row[subgraph] = ratio
-                score += row[subgraph]
-            else:
-                row[subgraph] = 0.0
-        score = score / len(target_op_dict)
-        row["Score"] = score
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        scores[reference_name] = score
-
-    # Convert to pandas and sort by score
-    df_sorted = df.sort_values(by="Score", ascending=False)
+    # Score all models of the database and the models encoded on this machine
+    # Note that the target model is intentionally part of the encoded models
+    indexes = load_similarity_indexes(encodings_dir)
+    candidates = None
+    if approximate:
+        candidates = [load_lsh(index).query(full_target_op_dict) for index in indexes]
+    locations, ratios, scores = score_indexes(indexes, target_op_dict, candidates)
+    order = np.argsort(-scores, kind="stable")
 
     # Only keep top and bottom values
-    df_sorted = pd.concat([df_sorted.head(25), df_sorted.tail(5)])
+    order = np.concatenate([order[:25], order[-5:]])
 
-    name_list = df_sorted["Name"].tolist()
-    df_sorted.drop("Score", axis=1, inplace=True)
-    df_sorted.drop("Name", axis=1, inplace=True)
+    name_list = [get_model_name(*locations[i]) for i in order]
     df_sorted = pd.DataFrame(
-        np.array(df_sorted.values),
+        ratios[order],
         index=range(len(name_list)),
-        columns=df_sorted.columns,
+        columns=list(target_op_dict),
     )
 
+    best_index, best_row = locations[order[0]]
+    reference_model = best_index.description(best_row)
+
     return name_list, reference_model, df_sorted
 
 
@@ -117,9 +116,16 @@ def main():
     parser.add_argument(
         "--replace", action="store_true", help="Replace models previously encoded"
     )
+    parser.add_argument(
+        "--approximate",
+        action="store_true",
+        help="Only score the candidates of the LSH tables of the databases",
+    )
 
     args = parser.parse_args()
-    find_match(args.model_path, args.dequantize, args.replace)
+    find_match(
+        args.model_path, args.dequantize, args.replace, approximate=args.approximate
+    )
 
 
 if __name__ == "__main__":
@@ -8,27 +8,49 @@ from typing import Dict, Optional, List
 import argparse
 import numpy as np
 import onnx
-import networkx as nx
+from digest.subgraph_analysis.similarity_index import get_encodings_dir, mix64
+from utils.graph_ir import GraphIR
 
 
 def remove_node(model, op_type):
+    """
+    Removes the op_type nodes of the graph and re-routes the inputs of the nodes
+    consuming their outputs to the first input of the removed nodes.
+    """
     graph = model.graph
-    nodes_to_remove = []
-
-    for node in graph.node:
-        if node.op_type == op_type:
-            for output_name in node.output:
-                for _, input_node in enumerate(graph.node):
-                    if output_name in input_node.input:
-                        # Re-route inputs of subsequent nodes to inputs of op_type
-                        for i, input_node_input in enumerate(input_node.input):
-                            if input_node_input == output_name:
-                                input_node.input[i] = node.input[0]
-            nodes_to_remove.append(node)
+    graph_ir = GraphIR(graph)
+    removed = [
+        node
+        for node, node_op_type in enumerate(graph_ir.op_types)
+        if node_op_type == op_type
+    ]
+    if not removed:
+        return
+
+    # Inputs re-routed to a name that is itself the output of a removed node
+    rerouted: Dict[str, List[int]] = {}
+    for node in removed:
+        for output_id in graph_ir.node_outputs(node).tolist():
+            output_name = graph_ir.value_names[output_id]
+            consumers = dict.fromkeys(
+                graph_ir.consumers(output_id).tolist() + rerouted.pop(output_name, [])
+            )
+            for consumer in consumers:
+                consumer_inputs = graph.node[consumer].input
+                if output_name not in consumer_inputs:
+                    continue
+                # Re-route inputs of subsequent nodes to inputs of op_type
+                replacement = graph.node[node].input[0]
+                for i, input_name in enumerate(consumer_inputs):
+                    if input_name == output_name:
+                        consumer_inputs[i] = replacement
+                rerouted.setdefault(replacement, []).append(consumer)
 
-    # Remove DequantizeLinear nodes from the graph
-    for node in nodes_to_remove:
-        graph.node.remove(node)
+    # Remove the op_type nodes from the graph
+    removed_nodes = set(removed)
+    kept = [node for i, node in enumerate(graph.node) if i not in removed_nodes]
+    del graph.node[:]
+    graph.node.extend(kept)
 
 
 def dequantize_model(onnx_model):
@@ -157,6 +179,75 @@ class WeisfeilerLehmanMachine:
             self.features = self.do_a_recursion()
 
 
+def extract_wl_features(edges: List, features: Dict, rounds: int) -> List[str]:
+    """
+    Extracts the same WL features as WeisfeilerLehmanMachine over a CSR adjacency.
+    Every round compresses the labels to integers with a 64 bit hash of the label
+    of each node and the multiset of the labels of its neighbors, so the MD5 of
+    the joined strings is only computed once per distinct label instead of once
+    per node.
+    """
+    extracted_features = [str(v) for v in features.values()]
+    if not edges:
+        return extracted_features
+
+    # Nodes that are not part of any edge are not part of the graph, and the graph
+    # nodes are ordered by their first appearance in the edges
+    endpoints = np.asarray(edges, dtype=np.int64).reshape(-1)
+    node_ids, first_seen, endpoint_nodes = np.unique(
+        endpoints, return_index=True, return_inverse=True
+    )
+    node_order = np.argsort(first_seen, kind="stable")
+
+    # Undirected adjacency without duplicate edges, as in a networkx Graph
+    sources, targets = endpoint_nodes[0::2], endpoint_nodes[1::2]
+    num_nodes = len(node_ids)
+    pairs = np.unique(
+        np.concatenate([sources, targets]) * num_nodes
+        + np.concatenate([targets, sources])
+    )
+    rows, indices = pairs // num_nodes, pairs % num_nodes
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+
+    label_ids: Dict[str, int] = {}
+    labels = np.array(
+        [
+            label_ids.setdefault(str(features[node_id]), len(label_ids))
+            for node_id in node_ids.tolist()
+        ],
+        dtype=np.int64,
+    )
+    label_strings = list(label_ids)
+
+    for _ in range(rounds):
+        label_hashes = mix64(labels + 1)
+        neighbor_sums = np.concatenate(
+            [np.zeros(1, dtype=np.uint64), np.cumsum(label_hashes[indices])]
+        )
+        multiset_hashes = neighbor_sums[indptr[1:]] - neighbor_sums[indptr[:-1]]
+        signatures = mix64(label_hashes ^ mix64(multiset_hashes))
+        _, representatives, new_labels = np.unique(
+            signatures, return_index=True, return_inverse=True
+        )
+
+        new_label_strings = []
+        for node in representatives.tolist():
+            neighbors = labels[indices[indptr[node] : indptr[node + 1]]].tolist()
+            joined = "_".join(
+                [label_strings[labels[node]]]
+                + sorted(label_strings[label] for label in neighbors)
+            )
+            new_label_strings.append(hashlib.md5(joined.encode()).hexdigest())
+
+        labels = new_labels.reshape(-1)
+        label_strings = new_label_strings
+        extracted_features.extend(
+            label_strings[label] for label in labels[node_order].tolist()
+        )
+    return extracted_features
+
+
 def feature_extractor(
     rounds: int,
     path: Optional[str] = None,
@@ -174,12 +265,8 @@ def feature_extractor(
     if path:
         edges, features, _ = dataset_reader(path)
 
-    # Create undirected graph
-    graph = nx.from_edgelist(edges)
-
     # Return a single doc for each WL machine
-    machine = WeisfeilerLehmanMachine(graph, features, rounds)
-    return machine.extracted_features
+    return extract_wl_features(edges, features, rounds)
 
 
 def dataset_reader(path: str):
@@ -206,12 +293,10 @@ class GraphConverter:
         self.node_id_counter = 0
         self.edges = []
         self.features = {}
-        self.edge_is_input_of_node = {}  # edge -> node
-        self.edge_is_output_of_node = {}  # edge -> node
         self.node_has_inputs_check = {}
         self.node_has_outputs_check = {}
         self.edge_expects_no_input_nodes = (
-            []
+            set()
         )  # This is an edge of an input node or identity node
 
     def add_node(self, node_name, feature):
@@ -245,78 +330,82 @@ class GraphConverter:
                                 This is ok as many edges are simply constants.
                                 Set it to False to debug smaller graphs.
         """
-        # Keep track of all edges in the graph
-        for node in onnx_model.graph.node:
-
-            # Create a mapping of nodes and node ids
-            self.add_node(node.name, feature=node.op_type)
+        graph = onnx_model.graph
+        graph_ir = GraphIR(graph)
 
-            # Keep track of all input edges
-            for input_edge in node.input:
+        # Create a mapping of nodes and node ids
+        for node_name, op_type in zip(graph_ir.node_names, graph_ir.op_types):
+            self.add_node(node_name, feature=op_type)
 
-                # Edges that are inputs to identity nodes are not expected to come from any nodes
-                # We also don't expect weights and biases to come from any nodes
-                if (
-                    node.op_type == "Identity"
-                    or input_edge.endswith(".weight")
-                    or input_edge.endswith(".bias")
-                ):
-                    self.edge_expects_no_input_nodes.append(input_edge)
-
-                # A single edge can be the input of multiple nodes!
-                if input_edge not in self.edge_is_input_of_node:
-                    self.edge_is_input_of_node[input_edge] = [node.name]
-                else:
-                    self.edge_is_input_of_node[input_edge].append(node.name)
-
-            # Keep track of all output edges
-            for output_edge in node.output:
-                self.edge_is_output_of_node[output_edge] = node.name
-
-        # Add inputs as both nodes and input edges
-        for input_node in onnx_model.graph.input:
+        # Add inputs and outputs as both nodes and edges
+        for input_node in graph.input:
             self.add_node(input_node.name, feature="input")
-            self.edge_is_output_of_node[input_node.name] = input_node.name
-
-        # Add outputs as both nodes and output edges
-        for output_node in onnx_model.graph.output:
+        for output_node in graph.output:
             self.add_node(output_node.name, feature="output")
-            if output_node.name not in self.edge_is_input_of_node:
-                self.edge_is_input_of_node[output_node.name] = [output_node.name]
-            else:
-                self.edge_is_input_of_node[output_node.name].append(output_node.name)
 
-        # Create a list containing all edges
-        all_edges = list(
-            set(
-                list(self.edge_is_output_of_node.keys())
-                + list(self.edge_is_input_of_node.keys())
-            )
+        # Edges that are inputs to identity nodes are not expected to come from any nodes
+        # We also don't expect weights and biases to come from any nodes
+        is_identity = np.array(graph_ir.op_types, dtype=object) == "Identity"
+        for value_id in np.unique(graph_ir.input_ids).tolist():
+            edge = graph_ir.value_names[value_id]
+            if (
+                edge.endswith(".weight")
+                or edge.endswith(".bias")
+                or is_identity[graph_ir.consumers(value_id)].any()
+            ):
+                self.edge_expects_no_input_nodes.add(edge)
+
+        # Graph inputs are the source of their edge even if a node also outputs it
+        is_graph_input = np.zeros(graph_ir.num_values, dtype=bool)
+        is_graph_input[graph_ir.graph_input_ids] = True
+        graph_output_counts = np.bincount(
+            graph_ir.graph_output_ids, minlength=graph_ir.num_values
         )
 
-        # Add all edges to our IR
-        for edge in all_edges:
-            if edge not in self.edge_expects_no_input_nodes:
-
-                if edge not in self.edge_is_output_of_node and (
-                    "onnx::" in edge or skip_input_edge_check
-                ):
-                    # Some nodes have input edges named "onnx::" that are constants,
-                    # but are unfortunately not marked as so. This means that we can't
-                    # always verify wether inputs from some nodes are actually outputs
-                    # from another node or simply constants.
-                    # Here, we assume we are correctly identifying all relationships and skip
-                    # checking "onnx::" input edges.
-                    continue
+        # List all edges in a deterministic order: the outputs of the nodes and the
+        # graph inputs first, then the inputs of the nodes and the graph outputs
+        edge_ids = np.concatenate(
+            [
+                graph_ir.output_ids,
+                graph_ir.graph_input_ids,
+                graph_ir.input_ids,
+                graph_ir.graph_output_ids,
+            ]
+        )
+        _, first_seen = np.unique(edge_ids, return_index=True)
+        all_edges = edge_ids[np.sort(first_seen)].tolist()
 
-                edge_from_node = self.edge_is_output_of_node[edge]
-                try:
-                    edges_to_node = self.edge_is_input_of_node[edge]
-                except KeyError:
-                    print(f"Could not find {edge}")
-                else:
-                    for edge_to_node in edges_to_node:
-                        self.add_edge(edge_from_node, edge_to_node)
+        # Add all edges to our IR
+        for value_id in all_edges:
+            edge = graph_ir.value_names[value_id]
+            if edge in self.edge_expects_no_input_nodes:
+                continue
+
+            producer = graph_ir.producers[value_id]
+            if is_graph_input[value_id]:
+                edge_from_node = edge
+            elif producer >= 0:
+                edge_from_node = graph_ir.node_names[producer]
+            elif "onnx::" in edge or skip_input_edge_check:
+                # Some nodes have input edges named "onnx::" that are constants,
+                # but are unfortunately not marked as so. This means that we can't
+                # always verify wether inputs from some nodes are actually outputs
+                # from another node or simply constants.
+                # Here, we assume we are correctly identifying all relationships and skip
+                # checking "onnx::" input edges.
+                continue
+            else:
+                raise KeyError(edge)
+
+            # A single edge can be the input of multiple nodes!
+            edges_to_node = [
+                graph_ir.node_names[consumer]
+                for consumer in graph_ir.consumers(value_id).tolist()
+            ] + [edge] * int(graph_output_counts[value_id])
+            if not edges_to_node:
+                print(f"Could not find {edge}")
+            for edge_to_node in edges_to_node:
+                self.add_edge(edge_from_node, edge_to_node)
 
         # Ensuse we are not finding other artifacts and thinking that those are nodes
         # We expect to have all existing graph nodes + inputs + outputs as nodes
@@ -362,13 +451,9 @@ def find_onnx_files(directory):
     return onnx_files
 
 
-def encode_model(model_path, model_name=None, dequantize=False):
-    onnx_model = onnx.load(model_path, load_external_data=False)
-
-    # Set a default name
-    if not model_name:
-        model_name = os.path.splitext(os.path.basename(model_path))[0]
-
+def encode_onnx_model(onnx_model, model_name, dequantize=False, rounds=1) -> Dict:
+    """Returns the description of an encoded model, with its WL feature counts in
+    op_list. Dequantizing modifies onnx_model in place."""
     # Dequantize if needed
     if dequantize:
         dequantize_model(onnx_model)
@@ -384,23 +469,48 @@ def encode_model(model_path, model_name=None, dequantize=False):
 
     # Extract subgraphs from nx graph
     wl_features = feature_extractor(
-        rounds=1, edges=converter.edges, features=converter.features
+        rounds=rounds, edges=converter.edges, features=converter.features
     )
     subgraphs = dict(Counter(wl_features))
 
-    # Save as json
-    model_description = {
+    return {
+        "model_name": model_name,
         "input_dims": input_dims,
         "parameters": parameters,
         "onnx_model_info": onnx_model_info,
         "op_list": subgraphs,
     }
-    analyzer_path = os.path.dirname(os.path.abspath(__file__))
-    database_path = os.path.join(analyzer_path, "database")
-    out_location = os.path.join(database_path, f"{model_name}.json")
+
+
+def encode_model(
+    model_path,
+    model_name=None,
+    dequantize=False,
+    output_dir=None,
+    rounds=1,
+    file_name=None,
+):
+    """Encodes the model into a JSON file of output_dir, which defaults to the
+    directory of the models encoded on this machine, and returns its path. The
+    file is named after the model unless file_name is set. The similarity
+    database is encoded with a single WL round."""
+    onnx_model = onnx.load(model_path, load_external_data=False)
+
+    # Set a default name
+    if not model_name:
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+
+    model_description = encode_onnx_model(onnx_model, model_name, dequantize, rounds)
+
+    # Save as json
+    if not output_dir:
+        output_dir = get_encodings_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    out_location = os.path.join(output_dir, f"{file_name or model_name}.json")
     with open(out_location, "w", encoding="utf-8") as json_file:
         json.dump(model_description, json_file)
     print(f"Model encoded and saved to {out_location}")
+    return out_location
 
 
 def main():
@@ -410,10 +520,24 @@ def main():
     parser.add_argument(
         "--dequantize", action="store_true", help="Remove quantization nodes"
     )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        help="Directory of the encoded model (optional), defaults to the user cache",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=1, help="Number of WL rounds, defaults to 1"
+    )
 
     args = parser.parse_args()
 
-    encode_model(args.model_path, args.model_name, args.dequantize)
+    encode_model(
+        args.model_path,
+        args.model_name,
+        args.dequantize,
+        args.output_dir,
+        args.rounds,
+    )
 
 
 if __name__ == "__main__":
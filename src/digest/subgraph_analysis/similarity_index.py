@@ -0,0 +1,813 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+The similarity database of encoded models. The WL feature counts of all models
+are kept in a single CSR matrix, with one row per model and one column per
+feature of an interned vocabulary, and scoring a target model against every
+model is a single vectorized pass over the matrix.
+
+A database is a single versioned file that is memory-mapped read-only, so the
+database shipped with the package is used in place without any extraction. The
+models encoded on this machine are kept as JSON files in a user cache directory,
+together with an index of them in the same format that is updated as models are
+encoded. Named corpora of models encoded in bulk, see bulk_encode, are database
+files of their own in the user cache directory.
+
+For databases too large to scan on every query, MinHashLSH keeps MinHash
+signatures of the feature multisets of the models in an LSH table, and only the
+candidates it returns are scored exactly.
+"""
+
+import os
+import io
+import json
+import hashlib
+import mmap
+import zipfile
+import argparse
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from utils.analysis_cache import get_default_cache_dir
+
+DATABASE_MAGIC = b"DIGESTSIMDB\x00"
+DATABASE_FORMAT_VERSION = 2
+# Every array starts at a multiple of this many bytes from the start of the file
+DATABASE_ALIGNMENT = 64
+
+# The database of public models that ships with digest
+DATABASE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "database.simdb"
+)
+
+INDEX_FILENAME = "similarity_index.simdb"
+ENCODINGS_DIR_NAME = "similarity_encodings"
+CORPORA_DIR_NAME = "similarity_corpora"
+CORPUS_EXTENSION = ".simdb"
+LSH_DIR_NAME = "similarity_lsh"
+
+# The signatures have MINHASH_PERMUTATIONS values split into LSH_BANDS bands. Two
+# models are candidates when all the values of one of their bands are equal, which
+# is likely above a weighted Jaccard similarity of (1 / bands) ** (bands / values).
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+MINHASH_SEED = 0x5EED
+# Bound on the size of the hash matrix computed at once when building signatures
+MINHASH_CHUNK_ELEMENTS = 1 << 24
+
+
+def get_encodings_dir() -> str:
+    """Returns the directory of the models encoded on this machine"""
+    return os.path.join(get_default_cache_dir(), ENCODINGS_DIR_NAME)
+
+
+def get_corpora_dir() -> str:
+    """Returns the directory of the named corpora encoded on this machine"""
+    return os.path.join(get_default_cache_dir(), CORPORA_DIR_NAME)
+
+
+def get_corpus_path(corpus: str) -> str:
+    return os.path.join(get_corpora_dir(), f"{corpus}{CORPUS_EXTENSION}")
+
+
+def list_corpora() -> List[str]:
+    """Returns the names of the corpora encoded on this machine"""
+    corpora_dir = get_corpora_dir()
+    if not os.path.isdir(corpora_dir):
+        return []
+    return sorted(
+        os.path.splitext(name)[0]
+        for name in os.listdir(corpora_dir)
+        if name.endswith(CORPUS_EXTENSION)
+    )
+
+
+def get_corpora_stamp() -> str:
+    """Returns a stamp of the similarity database and of the corpora, built from
+    their paths, sizes and modification times. It changes whenever a corpus is
+    added, removed or saved again, so results cached with it can be checked."""
+    stamp = hashlib.sha256()
+    for path in [DATABASE_PATH] + [get_corpus_path(name) for name in list_corpora()]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stamp.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return stamp.hexdigest()
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer, a fast non-cryptographic hash of uint64 values"""
+    values = values.astype(np.uint64)
+    values ^= values >> np.uint64(30)
+    values *= np.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94D049BB133111EB)
+    values ^= values >> np.uint64(31)
+    return values
+
+
+def read_op_list(model_json_path: str) -> Dict[str, int]:
+    """Returns the WL feature counts of an encoded model without the graph inputs
+    and outputs, which are not scored"""
+    with open(model_json_path, "r", encoding="utf-8") as json_file:
+        op_list = json.load(json_file)["op_list"]
+    op_list.pop("input", None)
+    op_list.pop("output", None)
+    return op_list
+
+
+def _scan_database(database_path: str) -> Dict[str, Tuple[int, int]]:
+    """Returns the size and modification time of every encoded model by name"""
+    signatures = {}
+    with os.scandir(database_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                stat = entry.stat()
+                signatures[os.path.splitext(entry.name)[0]] = (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+    return signatures
+
+
+def _split_description(model_description: Dict[str, Any]) -> Tuple[Dict, str]:
+    """Splits an encoded model into the scored feature counts and the JSON of the
+    rest of its description"""
+    op_list = dict(model_description["op_list"])
+    unscored = {
+        feature: op_list.pop(feature)
+        for feature in ("input", "output")
+        if feature in op_list
+    }
+    return op_list, json.dumps(dict(model_description, op_list=unscored))
+
+
+class StringTable:
+    """A list of strings stored as UTF-8 bytes and their offsets, which can be
+    memory-mapped as two arrays"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings: List[str]) -> "StringTable":
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return (
+            self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+        )
+
+    def to_list(self) -> List[str]:
+        text = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        return [
+            text[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+
+def _align(offset: int) -> int:
+    return -(-offset // DATABASE_ALIGNMENT) * DATABASE_ALIGNMENT
+
+
+def _row_entries(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Returns the positions of the entries of the given rows of a CSR matrix"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    return np.repeat(starts, lengths) + offsets
+
+
+def _write_database(path: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Writes the arrays to a database file. The file starts with the magic bytes,
+    the format version and the length of a JSON header that holds the dtype,
+    shape and offset of every array."""
+    offsets = {}
+    end = 0
+    for name, array in arrays.items():
+        offsets[name] = _align(end)
+        end = offsets[name] + array.nbytes
+    header = json.dumps(
+        {
+            name: {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offsets[name],
+            }
+            for name, array in arrays.items()
+        }
+    ).encode("utf-8")
+    prefix = (
+        DATABASE_MAGIC
+        + np.array(DATABASE_FORMAT_VERSION, "<u4").tobytes()
+        + np.array(len(header), "<u8").tobytes()
+    )
+    data_start = _align(len(prefix) + len(header))
+
+    # Written next to the target and renamed so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as database_file:
+        database_file.write(prefix + header)
+        for name, array in arrays.items():
+            database_file.seek(data_start + offsets[name])
+            database_file.write(np.ascontiguousarray(array).tobytes())
+        # Empty arrays at the end still lie within the file
+        database_file.truncate(data_start + end)
+    os.replace(temp_path, path)
+
+
+def _read_database(path: str, use_mmap: bool) -> Optional[Dict[str, np.ndarray]]:
+    """Returns the arrays of a database file as read-only views of the file, or
+    None if the file is missing or is not a database of this version"""
+    try:
+        with open(path, "rb") as database_file:
+            if use_mmap:
+                buffer: Union[mmap.mmap, bytes] = mmap.mmap(
+                    database_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                buffer = database_file.read()
+    except (OSError, ValueError):
+        return None
+
+    prefix_length = len(DATABASE_MAGIC) + 12
+    if len(buffer) < prefix_length or buffer[: len(DATABASE_MAGIC)] != DATABASE_MAGIC:
+        return None
+    version = int(np.frombuffer(buffer, "<u4", 1, len(DATABASE_MAGIC))[0])
+    if version != DATABASE_FORMAT_VERSION:
+        return None
+    header_length = int(np.frombuffer(buffer, "<u8", 1, len(DATABASE_MAGIC) + 4)[0])
+    header = json.loads(
+        bytes(buffer[prefix_length : prefix_length + header_length]).decode("utf-8")
+    )
+    data_start = _align(prefix_length + header_length)
+    arrays = {}
+    for name, info in header.items():
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            buffer, dtype, count, data_start + info["offset"]
+        ).reshape(info["shape"])
+    return arrays
+
+
+class SimilarityIndex:
+    """WL feature counts of the models of a database as a CSR matrix. Row i
+    holds the counts of names[i] at columns indices[indptr[i]:indptr[i + 1]]."""
+
+    def __init__(
+        self,
+        names: List[str],
+        signatures: np.ndarray,
+        vocabulary: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        descriptions: StringTable,
+    ) -> None:
+        self.names = names
+        # The size and modification time of the JSON file of every row, which
+        # are zeros for a database that is not built from a directory
+        self.signatures = signatures
+        self.vocabulary = vocabulary
+        self.feature_ids = {feature: i for i, feature in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        # The JSON of every model description without its scored features
+        self.descriptions = descriptions
+        # The file the index was loaded from, if any
+        self.path: Optional[str] = None
+        self._name_set: Optional[set] = None
+
+    @classmethod
+    def empty(cls) -> "SimilarityIndex":
+        return cls(
+            [],
+            np.zeros((0, 2), dtype=np.int64),
+            [],
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+            StringTable.from_list([]),
+        )
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> Optional["SimilarityIndex"]:
+        """Returns the database saved at path, or None if there is no usable
+        database file. With use_mmap, the large arrays are memory-mapped
+        read-only instead of read into memory."""
+        arrays = _read_database(path, use_mmap)
+        if arrays is None:
+            return None
+        try:
+            index = cls(
+                StringTable(arrays["names_blob"], arrays["names_offsets"]).to_list(),
+                arrays["signatures"],
+                StringTable(
+                    arrays["vocabulary_blob"], arrays["vocabulary_offsets"]
+                ).to_list(),
+                arrays["indptr"],
+                arrays["indices"],
+                arrays["data"],
+                StringTable(
+                    arrays["descriptions_blob"], arrays["descriptions_offsets"]
+                ),
+            )
+        except KeyError:
+            return None
+        index.path = path
+        return index
+
+    def has_model(self, name: str) -> bool:
+        if self._name_set is None:
+            self._name_set = set(self.names)
+        return name in self._name_set
+
+    def save(self, path: str) -> None:
+        names = StringTable.from_list(self.names)
+        vocabulary = StringTable.from_list(self.vocabulary)
+        _write_database(
+            path,
+            {
+                "names_blob": names.blob,
+                "names_offsets": names.offsets,
+                "signatures": self.signatures,
+                "vocabulary_blob": vocabulary.blob,
+                "vocabulary_offsets": vocabulary.offsets,
+                "indptr": self.indptr,
+                "indices": self.indices,
+                "data": self.data,
+                "descriptions_blob": self.descriptions.blob,
+                "descriptions_offsets": self.descriptions.offsets,
+            },
+        )
+
+    def _intern(self, feature: str) -> int:
+        feature_id = self.feature_ids.get(feature)
+        if feature_id is None:
+            feature_id = len(self.vocabulary)
+            self.feature_ids[feature] = feature_id
+            self.vocabulary.append(feature)
+        return feature_id
+
+    def description(self, row: int) -> Dict[str, Any]:
+        """Returns the encoded model of a row as it was read from its JSON"""
+        model_description = json.loads(self.descriptions[row])
+        start, end = self.indptr[row], self.indptr[row + 1]
+        model_description["op_list"] = dict(
+            zip(
+                [self.vocabulary[i] for i in self.indices[start:end].tolist()],
+                self.data[start:end].tolist(),
+            ),
+            **model_description["op_list"],
+        )
+        return model_description
+
+    def update(self, database_path: str) -> bool:
+        """Brings the index in sync with the encoded models of a directory by
+        reading only the files that were added or changed. Returns True if the
+        index changed."""
+        on_disk = _scan_database(database_path)
+        keep = np.array(
+            [
+                on_disk.get(name) == tuple(signature)
+                for name, signature in zip(self.names, self.signatures.tolist())
+            ],
+            dtype=bool,
+        )
+        kept_names = [name for name, kept in zip(self.names, keep) if kept]
+        new_names = sorted(set(on_disk) - set(kept_names))
+        if keep.all() and not new_names:
+            return False
+
+        new_models = []
+        for name in new_names:
+            with open(
+                os.path.join(database_path, f"{name}.json"), "r", encoding="utf-8"
+            ) as json_file:
+                new_models.append((name, json.load(json_file)))
+        self._replace_rows(keep, new_models)
+        self.signatures = np.array(
+            [on_disk[name] for name in self.names], dtype=np.int64
+        ).reshape(-1, 2)
+        return True
+
+    def replace_models(
+        self,
+        models: Dict[str, Dict[str, Any]],
+        signatures: Optional[Dict[str, Tuple[int, int]]] = None,
+    ) -> None:
+        """Adds the encoded models given by name, in place of the rows of the
+        same names. The signatures of the new rows default to zeros."""
+        signatures = signatures or {}
+        keep = np.array([name not in models for name in self.names], dtype=bool)
+        kept_signatures = self.signatures[keep]
+        self._replace_rows(keep, list(models.items()))
+        new_signatures = np.array(
+            [signatures.get(name, (0, 0)) for name in models], dtype=np.int64
+        ).reshape(-1, 2)
+        self.signatures = np.concatenate([kept_signatures, new_signatures])
+
+    def remove_models(self, names: List[str]) -> int:
+        """Removes the rows of the given names and returns how many were removed"""
+        removed = set(names)
+        keep = np.array([name not in removed for name in self.names], dtype=bool)
+        if keep.all():
+            return 0
+        self.signatures = self.signatures[keep]
+        self._replace_rows(keep, [])
+        return int((~keep).sum())
+
+    def _replace_rows(
+        self, keep: np.ndarray, new_models: List[Tuple[str, Dict[str, Any]]]
+    ) -> None:
+        """Keeps the rows selected by keep and appends the encoded models"""
+        row_lengths = [np.diff(self.indptr)[keep]]
+        entry_mask = np.repeat(keep, np.diff(self.indptr))
+        indices = [self.indices[entry_mask]]
+        data = [self.data[entry_mask]]
+        names = [name for name, kept in zip(self.names, keep) if kept]
+        descriptions = [self.descriptions[i] for i in np.flatnonzero(keep).tolist()]
+
+        for name, model_description in new_models:
+            op_list, description = _split_description(model_description)
+            indices.append(
+                np.array([self._intern(feature) for feature in op_list], np.int32)
+            )
+            data.append(np.array(list(op_list.values()), dtype=np.int32))
+            row_lengths.append(np.array([len(op_list)]))
+            names.append(name)
+            descriptions.append(description)
+
+        self.names = names
+        self._name_set = None
+        self.indptr = np.concatenate([[0], np.cumsum(np.concatenate(row_lengths))])
+        self.indptr = self.indptr.astype(np.int64)
+        self.indices = np.concatenate(indices).astype(np.int32)
+        self.data = np.concatenate(data).astype(np.int32)
+        self.descriptions = StringTable.from_list(descriptions)
+
+    @classmethod
+    def from_models(cls, models: Dict[str, Dict[str, Any]]) -> "SimilarityIndex":
+        """Builds an index of encoded models given by name"""
+        index = cls.empty()
+        index._replace_rows(
+            np.zeros(0, dtype=bool), [(name, models[name]) for name in sorted(models)]
+        )
+        index.signatures = np.zeros((len(index.names), 2), dtype=np.int64)
+        return index
+
+    def score(
+        self, target_counts: Dict[str, int], rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores every model, or the models of the given rows, against the target
+        feature counts. Returns the per-feature ratios, of shape (models, target
+        features), and the scores, the mean of the ratios of every model. The ratio
+        of a feature is the smaller of the two counts divided by the larger one, or
+        0 when the model does not have the feature."""
+        target = np.array(list(target_counts.values()), dtype=np.float64)
+        column_of_feature = np.full(len(self.vocabulary) + 1, -1, dtype=np.int64)
+        target_ids = [self.feature_ids.get(f, -1) for f in target_counts]
+        column_of_feature[target_ids] = np.arange(len(target_ids))
+        # A feature that no model has maps to the sentinel slot at the end
+        column_of_feature[-1] = -1
+
+        if rows is None:
+            rows = np.arange(len(self.names))
+            entries = np.arange(len(self.indices))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            entries = _row_entries(self.indptr, rows)
+        row_lengths = self.indptr[rows + 1] - self.indptr[rows]
+
+        counts = np.zeros((len(rows), len(target)), dtype=np.float64)
+        columns = column_of_feature[self.indices[entries]]
+        in_target = columns >= 0
+        entry_rows = np.repeat(np.arange(len(rows)), row_lengths)
+        counts[entry_rows[in_target], columns[in_target]] = self.data[entries][
+            in_target
+        ]
+
+        ratios = np.minimum(counts, target) / np.maximum(counts, target)
+        scores = ratios.mean(axis=1) if len(target) else np.zeros(len(rows))
+        return ratios, scores
+
+    def top_k(
+        self, target_counts: Dict[str, int], k: int
+    ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Returns the names, scores and ratios of the k best matching models"""
+        ratios, scores = self.score(target_counts)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [self.names[i] for i in order], scores[order], ratios[order]
+
+
+def _feature_hashes(features: List[str]) -> np.ndarray:
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(),
+                "little",
+            )
+            for feature in features
+        ],
+        dtype=np.uint64,
+    )
+
+
+def _weighted_tokens(
+    feature_hashes: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Expands every feature with count c into the tokens of levels 0 to log2(c).
+    The Jaccard similarity of two token sets is a weighted Jaccard similarity of
+    the feature multisets on a log scale of the counts. Returns the tokens and the
+    number of tokens of every feature."""
+    levels = np.floor(np.log2(np.maximum(counts, 1))).astype(np.int64) + 1
+    level = np.arange(levels.sum()) - np.repeat(np.cumsum(levels) - levels, levels)
+    tokens = mix64(np.repeat(feature_hashes, levels) ^ level.astype(np.uint64))
+    return tokens, levels
+
+
+def _permutations(num_permutations: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The multipliers and increments of the hash functions of the signatures"""
+    rng = np.random.default_rng(MINHASH_SEED)
+    multipliers = rng.integers(
+        0, np.iinfo(np.uint64).max, num_permutations, dtype=np.uint64, endpoint=True
+    )
+    increments = rng.integers(
+        0, np.iinfo(np.uint64).max, num_permutations, dtype=np.uint64, endpoint=True
+    )
+    return multipliers | np.uint64(1), increments
+
+
+class MinHashLSH:
+    """Locality sensitive hashing of the models of a SimilarityIndex. Every model
+    has a MinHash signature of its weighted feature tokens, split into bands, and
+    the hashes of band b of all models are kept sorted in band_keys[b] with their
+    rows in band_rows[b]. A query only looks up its own band hashes, so its cost
+    grows with the number of candidates rather than with the number of models."""
+
+    def __init__(self, band_keys: np.ndarray, band_rows: np.ndarray) -> None:
+        self.band_keys = band_keys
+        self.band_rows = band_rows
+
+    @property
+    def num_bands(self) -> int:
+        return len(self.band_keys)
+
+    @staticmethod
+    def signatures(
+        tokens: np.ndarray, token_indptr: np.ndarray, num_permutations: int
+    ) -> np.ndarray:
+        """Returns the MinHash signatures, of shape (rows, num_permutations), of the
+        token sets given as a CSR list. Empty sets have the maximal signature."""
+        multipliers, increments = _permutations(num_permutations)
+        num_rows = len(token_indptr) - 1
+        signatures = np.full(
+            (num_rows, num_permutations), np.iinfo(np.uint64).max, dtype=np.uint64
+        )
+        nonempty = np.flatnonzero(np.diff(token_indptr))
+        row_ends = token_indptr[nonempty + 1]
+        chunk_tokens = max(1, MINHASH_CHUNK_ELEMENTS // num_permutations)
+        start = 0
+        while start < len(nonempty):
+            # Whole rows whose tokens fit in the chunk, at least one row
+            first_token = token_indptr[nonempty[start]]
+            stop = max(
+                start + 1,
+                int(np.searchsorted(row_ends, first_token + chunk_tokens, "right")),
+            )
+            rows = nonempty[start:stop]
+            chunk = tokens[first_token : token_indptr[rows[-1] + 1]]
+            hashes = multipliers[:, None] * chunk[None, :] + increments[:, None]
+            signatures[rows] = np.minimum.reduceat(
+                hashes, token_indptr[rows] - first_token, axis=1
+            ).T
+            start = stop
+        return signatures
+
+    @staticmethod
+    def band_hashes(signatures: np.ndarray, num_bands: int) -> np.ndarray:
+        """Combines the values of every band of the signatures into one hash"""
+        bands = signatures.reshape(len(signatures), num_bands, -1)
+        keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+        for value in range(bands.shape[2]):
+            keys = mix64(keys ^ bands[:, :, value])
+        return keys
+
+    @classmethod
+    def build(
+        cls,
+        index: SimilarityIndex,
+        num_permutations: int = MINHASH_PERMUTATIONS,
+        num_bands: int = LSH_BANDS,
+    ) -> "MinHashLSH":
+        tokens, levels = _weighted_tokens(
+            _feature_hashes(index.vocabulary)[index.indices], index.data
+        )
+        token_indptr = np.zeros(len(index.names) + 1, dtype=np.int64)
+        level_indptr = np.concatenate([[0], np.cumsum(levels)])
+        token_indptr[1:] = level_indptr[index.indptr[1:]]
+        keys = cls.band_hashes(
+            cls.signatures(tokens, token_indptr, num_permutations), num_bands
+        ).T
+        band_rows = np.argsort(keys, axis=1, kind="stable")
+        return cls(np.take_along_axis(keys, band_rows, axis=1), band_rows)
+
+    def query(
+        self,
+        target_counts: Dict[str, int],
+        num_permutations: int = MINHASH_PERMUTATIONS,
+    ) -> np.ndarray:
+        """Returns the sorted rows of the models that share a band with the target"""
+        tokens, _ = _weighted_tokens(
+            _feature_hashes(list(target_counts)),
+            np.array(list(target_counts.values()), dtype=np.int64),
+        )
+        signature = self.signatures(
+            tokens, np.array([0, len(tokens)], dtype=np.int64), num_permutations
+        )
+        keys = self.band_hashes(signature, self.num_bands)[0]
+        candidates = []
+        for band, key in enumerate(keys):
+            start = np.searchsorted(self.band_keys[band], key, side="left")
+            stop = np.searchsorted(self.band_keys[band], key, side="right")
+            candidates.append(self.band_rows[band, start:stop])
+        return np.unique(np.concatenate(candidates))
+
+    def save(self, path: str, stamp: np.ndarray) -> None:
+        _write_database(
+            path,
+            {"stamp": stamp, "band_keys": self.band_keys, "band_rows": self.band_rows},
+        )
+
+    @classmethod
+    def load(cls, path: str, stamp: np.ndarray) -> Optional["MinHashLSH"]:
+        """Returns the LSH table saved at path if it was saved with the same stamp"""
+        arrays = _read_database(path, use_mmap=True)
+        if arrays is None or "stamp" not in arrays:
+            return None
+        if not np.array_equal(arrays["stamp"], stamp):
+            return None
+        return cls(arrays["band_keys"], arrays["band_rows"])
+
+
+def load_lsh(index: SimilarityIndex) -> MinHashLSH:
+    """Returns the LSH table of an index. The table of an index read from a file is
+    cached in the user cache directory until the file changes."""
+    if index.path is None:
+        return MinHashLSH.build(index)
+    stat = os.stat(index.path)
+    stamp = np.array(
+        [
+            stat.st_size,
+            stat.st_mtime_ns,
+            len(index.names),
+            MINHASH_PERMUTATIONS,
+            LSH_BANDS,
+        ],
+        dtype=np.int64,
+    )
+    path_hash = hashlib.sha1(os.path.abspath(index.path).encode("utf-8")).hexdigest()
+    lsh_path = os.path.join(get_default_cache_dir(), LSH_DIR_NAME, f"{path_hash}.simdb")
+    lsh = MinHashLSH.load(lsh_path, stamp)
+    if lsh is None:
+        lsh = MinHashLSH.build(index)
+        try:
+            os.makedirs(os.path.dirname(lsh_path), exist_ok=True)
+            lsh.save(lsh_path, stamp)
+        except OSError as error:
+            print(f"Could not cache the LSH table of {index.path}: {error}")
+    return lsh
+
+
+def load_similarity_index(database_path: str) -> SimilarityIndex:
+    """Loads the index saved in a directory of encoded models, updates it with the
+    models encoded since it was saved and saves it again if it changed"""
+    index_path = os.path.join(database_path, INDEX_FILENAME)
+    # The index is small and replaced on updates, so it is not memory-mapped
+    index = SimilarityIndex.load(index_path, use_mmap=False) or SimilarityIndex.empty()
+    if index.update(database_path):
+        index.save(index_path)
+        index.path = index_path
+    return index
+
+
+def load_similarity_indexes(
+    encodings_dir: Optional[str] = None,
+) -> List[SimilarityIndex]:
+    """Returns the database shipped with digest, the named corpora and the index
+    of the models encoded on this machine, in this order"""
+    indexes = []
+    database = SimilarityIndex.load(DATABASE_PATH)
+    if database is None:
+        print(f"Could not read the similarity database {DATABASE_PATH}")
+    else:
+        indexes.append(database)
+    for corpus in list_corpora():
+        corpus_index = SimilarityIndex.load(get_corpus_path(corpus))
+        if corpus_index is None:
+            print(f"Could not read the similarity corpus {corpus}")
+        else:
+            indexes.append(corpus_index)
+    encodings_dir = encodings_dir or get_encodings_dir()
+    if os.path.isdir(encodings_dir):
+        indexes.append(load_similarity_index(encodings_dir))
+    return indexes
+
+
+def score_indexes(
+    indexes: List[SimilarityIndex],
+    target_counts: Dict[str, int],
+    candidates: Optional[List[np.ndarray]] = None,
+) -> Tuple[List[Tuple[SimilarityIndex, int]], np.ndarray, np.ndarray]:
+    """Scores the models of several indexes together, or only the candidate rows
+    of every index if they are given. A model of a later index replaces the model
+    of the same name in the earlier ones. Returns the index and row of every model
+    with their ratios and scores."""
+    locations: List[Tuple[SimilarityIndex, int]] = []
+    ratios = []
+    scores = []
+    for position, index in enumerate(indexes):
+        later_indexes = indexes[position + 1 :]
+        index_rows = (
+            range(len(index.names))
+            if candidates is None
+            else candidates[position].tolist()
+        )
+        rows = [
+            row
+            for row in index_rows
+            if not any(later.has_model(index.names[row]) for later in later_indexes)
+        ]
+        index_ratios, index_scores = index.score(
+            target_counts, np.array(rows, dtype=np.int64)
+        )
+        locations.extend((index, row) for row in rows)
+        ratios.append(index_ratios)
+        scores.append(index_scores)
+    if not indexes:
+        return [], np.zeros((0, len(target_counts))), np.zeros(0)
+    return locations, np.concatenate(ratios), np.concatenate(scores)
+
+
+def _read_encoded_models(source: str) -> Dict[str, Dict[str, Any]]:
+    """Reads the encoded models of a directory or of a zip of JSON files"""
+    models = {}
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source, "r") as zip_ref:
+            for member in zip_ref.namelist():
+                if member.endswith(".json"):
+                    with zip_ref.open(member) as json_file:
+                        name = os.path.splitext(os.path.basename(member))[0]
+                        models[name] = json.load(io.TextIOWrapper(json_file, "utf-8"))
+    else:
+        for name in _scan_database(source):
+            with open(
+                os.path.join(source, f"{name}.json"), "r", encoding="utf-8"
+            ) as json_file:
+                models[name] = json.load(json_file)
+    return models
+
+
+def build_database(source: str, output_path: str) -> SimilarityIndex:
+    """Builds a database file from a directory or a zip of encoded models"""
+    index = SimilarityIndex.from_models(_read_encoded_models(source))
+    index.save(output_path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a similarity database from encoded models"
+    )
+    parser.add_argument(
+        "source", type=str, help="Directory or zip of encoded model JSON files"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=DATABASE_PATH,
+        help="Path of the database file, defaults to the database of the package",
+    )
+
+    args = parser.parse_args()
+    index = build_database(args.source, args.output)
+    print(
+        f"Saved {len(index.names)} models with {len(index.vocabulary)} features "
+        f"to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,7 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QAbstractItemView, QApplication, QHBoxLayout, QLabel,
-    QListView, QListWidget, QListWidgetItem, QPushButton,
+    QCheckBox, QListView, QListWidget, QListWidgetItem, QPushButton,
     QRadioButton, QSizePolicy, QSpacerItem, QVBoxLayout,
     QWidget)
 
@@ -70,6 +70,14 @@ class Ui_MultiModelSelection(object):
 
         self.horizontalLayout_2.addWidget(self.openAnalysisBtn)
 
+        self.cancelScanBtn = QPushButton(MultiModelSelection)
+        self.cancelScanBtn.setObjectName(u"cancelScanBtn")
+        sizePolicy.setHeightForWidth(self.cancelScanBtn.sizePolicy().hasHeightForWidth())
+        self.cancelScanBtn.setSizePolicy(sizePolicy)
+        self.cancelScanBtn.setStyleSheet(u"")
+
+        self.horizontalLayout_2.addWidget(self.cancelScanBtn)
+
         self.horizontalSpacer = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
 
         self.horizontalLayout_2.addItem(self.horizontalSpacer)
@@ -135,6 +143,12 @@ class Ui_MultiModelSelection(object):
 
         self.horizontalLayout_3.addWidget(self.radioReports)
 
+        self.ignoreMetadataCheckBox = QCheckBox(MultiModelSelection)
+        self.ignoreMetadataCheckBox.setObjectName(u"ignoreMetadataCheckBox")
+        self.ignoreMetadataCheckBox.setMinimumSize(QSize(0, 33))
+
+        self.horizontalLayout_3.addWidget(self.ignoreMetadataCheckBox)
+
         self.horizontalSpacer_2 = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
 
         self.horizontalLayout_3.addItem(self.horizontalSpacer_2)
@@ -223,11 +237,16 @@ class Ui_MultiModelSelection(object):
         self.subtitleLabel.setText(QCoreApplication.translate("MultiModelSelection", u"<html><head/><body><p><span style=\" font-size:12pt;\">Select a folder to open multiple models for analysis</span></p></body></html>", None))
         self.selectFolderBtn.setText(QCoreApplication.translate("MultiModelSelection", u"Select Folder", None))
         self.openAnalysisBtn.setText(QCoreApplication.translate("MultiModelSelection", u"Open Analysis", None))
+        self.cancelScanBtn.setText(QCoreApplication.translate("MultiModelSelection", u"Cancel Scan", None))
         self.infoLabel.setText("")
         self.warningLabel.setText(QCoreApplication.translate("MultiModelSelection", u"Warning", None))
         self.radioAll.setText(QCoreApplication.translate("MultiModelSelection", u"All", None))
         self.radioONNX.setText(QCoreApplication.translate("MultiModelSelection", u"ONNX", None))
         self.radioReports.setText(QCoreApplication.translate("MultiModelSelection", u"Reports", None))
+#if QT_CONFIG(tooltip)
+        self.ignoreMetadataCheckBox.setToolTip(QCoreApplication.translate("MultiModelSelection", u"Treat ONNX models that differ only in their metadata or node names as duplicates", None))
+#endif // QT_CONFIG(tooltip)
+        self.ignoreMetadataCheckBox.setText(QCoreApplication.translate("MultiModelSelection", u"Ignore Metadata", None))
         self.numSelectedLabel.setText(QCoreApplication.translate("MultiModelSelection", u"0 selected models", None))
         self.duplicateLabel.setText(QCoreApplication.translate("MultiModelSelection", u"Ignoring 0 duplicate model(s).", None))
     # retranslateUi
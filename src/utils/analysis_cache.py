@@ -0,0 +1,166 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import importlib.metadata
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+from platformdirs import user_cache_dir
+
+# Bump this whenever the layout of the cached objects changes so that entries
+# written by an older layout of the same digest version are not reused.
+CACHE_FORMAT_VERSION = 6
+
+# Setting this environment variable moves the cache out of the user cache directory
+CACHE_DIR_ENV_VAR = "DIGEST_CACHE_DIR"
+
+
+def get_digest_version() -> str:
+    try:
+        return importlib.metadata.version("digestai")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def get_default_cache_dir() -> str:
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return cache_dir
+    return os.path.join(user_cache_dir("digest"), "analysis_cache")
+
+
+class AnalysisCache:
+    """Persistent cache of analysis results keyed by the content hash of the model
+    file and the digest version. The index is a SQLite database and the results are
+    stored next to it as pickled blobs. The cache is best effort, any failure to read
+    or write it is reported and treated as a cache miss."""
+
+    MODEL = "model"
+    SIMILARITY = "similarity"
+    HEATMAP = "heatmap"
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir = cache_dir if cache_dir else get_default_cache_dir()
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.index_path = os.path.join(self.cache_dir, "index.sqlite")
+        self.digest_version = get_digest_version()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "content_hash TEXT NOT NULL, "
+                "digest_version TEXT NOT NULL, "
+                "format_version INTEGER NOT NULL, "
+                "kind TEXT NOT NULL, "
+                "blob TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "created REAL NOT NULL, "
+                "PRIMARY KEY (content_hash, digest_version, format_version, kind))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A short lived connection per operation keeps the cache safe to use from
+        # the GUI worker threads as well as from several processes.
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _blob_path(self, content_hash: str, kind: str) -> str:
+        blob_name = (
+            f"{content_hash}-{self.digest_version}-{CACHE_FORMAT_VERSION}-{kind}.pkl"
+        )
+        return os.path.join(self.blob_dir, content_hash[:2], blob_name)
+
+    def get(self, content_hash: str, kind: str) -> Optional[Any]:
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT blob FROM entries WHERE content_hash = ? AND "
+                    "digest_version = ? AND format_version = ? AND kind = ?",
+                    (content_hash, self.digest_version, CACHE_FORMAT_VERSION, kind),
+                ).fetchone()
+            if not row:
+                return None
+            with open(os.path.join(self.blob_dir, row[0]), "rb") as blob_file:
+                return pickle.load(blob_file)
+        except Exception as error:  # pylint: disable=broad-except
+            # Blobs written by an incompatible build can fail to unpickle in many ways
+            print(f"Analysis cache read failed for {content_hash}: {error}")
+            return None
+
+    def put(self, content_hash: str, kind: str, value: Any) -> None:
+        blob_path = self._blob_path(content_hash, kind)
+        try:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Write to a temporary file first so a reader never sees a partial blob
+            tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+            with os.fdopen(tmp_fd, "wb") as blob_file:
+                pickle.dump(value, blob_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, blob_path)
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        content_hash,
+                        self.digest_version,
+                        CACHE_FORMAT_VERSION,
+                        kind,
+                        os.path.relpath(blob_path, self.blob_dir),
+                        os.path.getsize(blob_path),
+                        time.time(),
+                    ),
+                )
+        except (sqlite3.Error, OSError, pickle.PicklingError) as error:
+            print(f"Analysis cache write failed for {content_hash}: {error}")
+
+    def get_model(self, content_hash: str) -> Optional[Any]:
+        return self.get(content_hash, self.MODEL)
+
+    def put_model(self, content_hash: str, digest_model: Any) -> None:
+        self.put(content_hash, self.MODEL, digest_model)
+
+    def get_similarity(self, content_hash: str) -> Optional[Any]:
+        return self.get(content_hash, self.SIMILARITY)
+
+    def put_similarity(self, content_hash: str, similarity_result: Any) -> None:
+        self.put(content_hash, self.SIMILARITY, similarity_result)
+
+    def get_heatmap(self, content_hash: str) -> Optional[Any]:
+        return self.get(content_hash, self.HEATMAP)
+
+    def put_heatmap(self, content_hash: str, heatmap: Any) -> None:
+        self.put(content_hash, self.HEATMAP, heatmap)
+
+    def clear(self) -> None:
+        """Removes every entry and blob from the cache."""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT blob FROM entries").fetchall()
+            connection.execute("DELETE FROM entries")
+        for (blob,) in rows:
+            try:
+                os.remove(os.path.join(self.blob_dir, blob))
+            except OSError:
+                pass
+
+
+_default_cache: Optional[AnalysisCache] = None
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """Returns the cache shared by the GUI and the scripts, or None if it could
+    not be created (for example on a read-only home directory)."""
+    global _default_cache  # pylint: disable=global-statement
+    if _default_cache is None or _default_cache.cache_dir != get_default_cache_dir():
+        try:
+            _default_cache = AnalysisCache()
+        except (sqlite3.Error, OSError) as error:
+            print(f"Analysis cache is unavailable: {error}")
+            return None
+    return _default_cache
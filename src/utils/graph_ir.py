@@ -0,0 +1,109 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+An index of the nodes and values of an ONNX graph as NumPy arrays, built in a
+single pass over the graph. Value names are interned to ids, the inputs and
+outputs of every node are CSR lists of value ids, and every value knows its
+producer and its consumers, so walking the graph never rescans the node list.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+import onnx
+
+
+def _csr(rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    ids = np.fromiter(
+        (value for row in rows for value in row), dtype=np.int64, count=indptr[-1]
+    )
+    return indptr, ids
+
+
+class GraphIR:
+    """Producer and consumer index arrays of the top level nodes of a graph.
+
+    Node i has the inputs value_names[input_ids[input_indptr[i]:input_indptr[i + 1]]]
+    and likewise for its outputs. producers[v] is the last node that outputs value v,
+    or -1 for graph inputs, initializers and missing optional inputs, and
+    consumer_nodes[consumer_indptr[v]:consumer_indptr[v + 1]] are the nodes that
+    take v as an input, in node order and once per input slot."""
+
+    def __init__(self, graph: onnx.GraphProto) -> None:
+        self.value_ids: Dict[str, int] = {}
+        self.value_names: List[str] = []
+        self.node_names: List[str] = []
+        self.op_types: List[str] = []
+
+        input_rows = []
+        output_rows = []
+        for node in graph.node:
+            self.node_names.append(node.name)
+            self.op_types.append(node.op_type)
+            input_rows.append([self.intern(name) for name in node.input])
+            output_rows.append([self.intern(name) for name in node.output])
+        self.graph_input_ids = np.array(
+            [self.intern(value.name) for value in graph.input], dtype=np.int64
+        )
+        self.graph_output_ids = np.array(
+            [self.intern(value.name) for value in graph.output], dtype=np.int64
+        )
+        initializer_ids = [self.intern(tensor.name) for tensor in graph.initializer]
+
+        self.input_indptr, self.input_ids = _csr(input_rows)
+        self.output_indptr, self.output_ids = _csr(output_rows)
+
+        num_values = len(self.value_names)
+        self.is_initializer = np.zeros(num_values, dtype=bool)
+        self.is_initializer[initializer_ids] = True
+
+        # The last producer of a value is the one with the largest node index
+        self.producers = np.full(num_values, -1, dtype=np.int64)
+        np.maximum.at(
+            self.producers,
+            self.output_ids,
+            np.repeat(np.arange(self.num_nodes), np.diff(self.output_indptr)),
+        )
+
+        input_nodes = np.repeat(np.arange(self.num_nodes), np.diff(self.input_indptr))
+        order = np.argsort(self.input_ids, kind="stable")
+        self.consumer_nodes = input_nodes[order]
+        self.consumer_indptr = np.zeros(num_values + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.input_ids, minlength=num_values),
+            out=self.consumer_indptr[1:],
+        )
+
+    def intern(self, name: str) -> int:
+        value_id = self.value_ids.get(name)
+        if value_id is None:
+            value_id = len(self.value_names)
+            self.value_ids[name] = value_id
+            self.value_names.append(name)
+        return value_id
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_names)
+
+    @property
+    def num_values(self) -> int:
+        return len(self.value_names)
+
+    def node_inputs(self, node: int) -> np.ndarray:
+        return self.input_ids[self.input_indptr[node] : self.input_indptr[node + 1]]
+
+    def node_outputs(self, node: int) -> np.ndarray:
+        return self.output_ids[self.output_indptr[node] : self.output_indptr[node + 1]]
+
+    def consumers(self, value_id: int) -> np.ndarray:
+        return self.consumer_nodes[
+            self.consumer_indptr[value_id] : self.consumer_indptr[value_id + 1]
+        ]
+
+    def input_names(self, node: int) -> List[str]:
+        return [self.value_names[i] for i in self.node_inputs(node).tolist()]
+
+    def output_names(self, node: int) -> List[str]:
+        return [self.value_names[i] for i in self.node_outputs(node).tolist()]
@@ -1,12 +1,19 @@
 # Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
 
 import os
+import math
+import mmap
+import shutil
+import hashlib
+import weakref
 import tempfile
+from enum import IntEnum
+from dataclasses import dataclass, field
 from collections import Counter
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union, TYPE_CHECKING
 import numpy as np
 import onnx
-import onnxruntime as ort
+from onnx import external_data_helper
 from digest.model_class.digest_model import (
     NodeTypeCounts,
     NodeData,
@@ -15,30 +22,96 @@ from digest.model_class.digest_model import (
     TensorInfo,
 )
 
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
+# Mapping of ONNX's data types to Python data types and their byte sizes
+TENSOR_TYPE_MAPPING = {
+    1: ("float32", 4),
+    2: ("uint8", 1),
+    3: ("int8", 1),
+    4: ("uint16", 2),
+    5: ("int16", 2),
+    6: ("int32", 4),
+    7: ("int64", 8),
+    8: ("string", 0),  # Variable size
+    9: ("bool", 1),
+    10: ("float16", 2),
+    11: ("double", 8),
+    12: ("uint32", 4),
+    13: ("uint64", 8),
+    14: ("complex64", 8),  # Comprises two 32-bit floats
+    15: ("complex128", 16),  # Comprises two 64-bit floats
+    16: ("bfloat16", 2),
+}
+
 
 # Convert tensor type to human-readable string and size in bytes
 def tensor_type_to_str_and_size(elem_type) -> Tuple[str, int]:
-    # Mapping of ONNX's data types to Python data types and their byte sizes
-    type_mapping = {
-        1: ("float32", 4),
-        2: ("uint8", 1),
-        3: ("int8", 1),
-        4: ("uint16", 2),
-        5: ("int16", 2),
-        6: ("int32", 4),
-        7: ("int64", 8),
-        8: ("string", 0),  # Variable size
-        9: ("bool", 1),
-        10: ("float16", 2),
-        11: ("double", 8),
-        12: ("uint32", 4),
-        13: ("uint64", 8),
-        14: ("complex64", 8),  # Comprises two 32-bit floats
-        15: ("complex128", 16),  # Comprises two 64-bit floats
-        16: ("bfloat16", 2),
-    }
+    return TENSOR_TYPE_MAPPING.get(elem_type, ("unknown", 0))
+
+
+class TensorInfoIndex:
+    """Resolves the value names of a graph to TensorInfo. The graph is indexed in a
+    single pass and each name is decoded the first time it is requested. Tensors with
+    the same type and shape share one TensorInfo object, so the producer and all the
+    consumers of a value reference the same instance."""
+
+    def __init__(self, onnx_model: onnx.ModelProto) -> None:
+        graph = onnx_model.graph
+        self._protos: Dict[str, Union[onnx.ValueInfoProto, onnx.TensorProto]] = {}
+        # Graph inputs take precedence over value infos, then graph outputs and
+        # finally initializers, so they are added in the reverse order.
+        for initializer in graph.initializer:
+            self._protos[initializer.name] = initializer
+        for tensor in graph.output:
+            self._protos[tensor.name] = tensor
+        for tensor in graph.value_info:
+            self._protos[tensor.name] = tensor
+        for tensor in graph.input:
+            self._protos[tensor.name] = tensor
+        self.initializer_names = frozenset(
+            initializer.name for initializer in graph.initializer
+        )
+        self._infos: Dict[str, TensorInfo] = {}
+        self._interned: Dict[TensorInfo, TensorInfo] = {}
+
+    def __getitem__(self, name: str) -> TensorInfo:
+        info = self._infos.get(name)
+        if info is None:
+            info = self._decode(self._protos.get(name))
+            info = self._interned.setdefault(info, info)
+            self._infos[name] = info
+        return info
+
+    def tensor_data(self, names) -> TensorData:
+        return TensorData((name, self[name]) for name in names)
+
+    @staticmethod
+    def _decode(
+        tensor: Optional[Union[onnx.ValueInfoProto, onnx.TensorProto]],
+    ) -> TensorInfo:
+        if tensor is None:
+            return TensorInfo()
+
+        shape: List[Union[int, str]] = []
+        if isinstance(tensor, onnx.TensorProto):
+            shape.extend(tensor.dims)
+            elem_type = tensor.data_type
+        else:
+            for dim in tensor.type.tensor_type.shape.dim:
+                if dim.HasField("dim_value"):
+                    shape.append(dim.dim_value)
+                elif dim.HasField("dim_param"):
+                    shape.append(dim.dim_param)
+            elem_type = tensor.type.tensor_type.elem_type
+
+        dtype, dtype_bytes = tensor_type_to_str_and_size(elem_type)
+        size_kbytes = None
+        if all(isinstance(dim, int) for dim in shape) and dtype_bytes:
+            size_kbytes = float(math.prod(shape)) * float(dtype_bytes) / 1024.0
 
-    return type_mapping.get(elem_type, ("unknown", 0))
+        return TensorInfo(dtype, dtype_bytes, size_kbytes, shape)
 
 
 def load_onnx(onnx_path: str, load_external_data: bool = True) -> onnx.ModelProto:
@@ -48,6 +121,449 @@ def load_onnx(onnx_path: str, load_external_data: bool = True) -> onnx.ModelProt
         raise ValueError(f"ONNX file {onnx_path} does not exist.")
 
 
+# Initializers smaller than this are kept in the proto by the lazy loader. This keeps
+# the small constants that shape inference reads, such as the target shape of a Reshape.
+LAZY_INITIALIZER_MIN_BYTES = 1024
+
+# Protobuf field numbers and wire types used by the lazy loader
+_MODEL_GRAPH_FIELD = 7
+_GRAPH_INITIALIZER_FIELD = 5
+_TENSOR_RAW_DATA_FIELD = 9
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+
+def _read_varint(buffer: memoryview, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _iter_fields(buffer: memoryview, start: int, end: int):
+    """Yields (field number, wire type, field start, value start, value end) for each
+    field of the serialized message between start and end"""
+    pos = start
+    while pos < end:
+        field_start = pos
+        key, pos = _read_varint(buffer, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == _WIRE_VARINT:
+            _, value_end = _read_varint(buffer, pos)
+        elif wire_type == _WIRE_FIXED64:
+            value_end = pos + 8
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(buffer, pos)
+            value_end = pos + length
+        elif wire_type == _WIRE_FIXED32:
+            value_end = pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        if value_end > end:
+            raise ValueError("Truncated protobuf message")
+        yield field_number, wire_type, field_start, pos, value_end
+        pos = value_end
+
+
+def _length_delimited(field_number: int, value: bytes) -> bytes:
+    key = (field_number << 3) | _WIRE_LENGTH_DELIMITED
+    return _encode_varint(key) + _encode_varint(len(value)) + value
+
+
+def _strip_fields(
+    buffer: memoryview,
+    start: int,
+    end: int,
+    field_number: int,
+    rewrite,
+) -> bytes:
+    """Returns the message between start and end with every length delimited field
+    of the given number replaced by rewrite(value start, value end), or dropped when
+    rewrite returns None."""
+    pieces = []
+    span_start = start
+    for number, wire_type, field_start, value_start, value_end in _iter_fields(
+        buffer, start, end
+    ):
+        if number != field_number or wire_type != _WIRE_LENGTH_DELIMITED:
+            continue
+        value = rewrite(value_start, value_end)
+        if value is False:
+            continue
+        pieces.append(bytes(buffer[span_start:field_start]))
+        if value is not None:
+            pieces.append(_length_delimited(field_number, value))
+        span_start = value_end
+    pieces.append(bytes(buffer[span_start:end]))
+    return b"".join(pieces)
+
+
+def load_onnx_lazy(
+    onnx_path: str, min_lazy_bytes: int = LAZY_INITIALIZER_MIN_BYTES
+) -> onnx.ModelProto:
+    """Loads an ONNX model without the payload of its large initializers. The file is
+    memory mapped and the raw data of every initializer of at least min_lazy_bytes is
+    replaced by an external data reference to its location in the same file, so the
+    memory used is close to the size of the graph. Initializers that are already
+    stored as external data are left as they are. The weights can be loaded later with
+    onnx.external_data_helper.load_external_data_for_model(model, model_dir)."""
+
+    if not os.path.exists(onnx_path):
+        raise ValueError(f"ONNX file {onnx_path} does not exist.")
+
+    references: List[Optional[Tuple[int, int]]] = []
+
+    def strip_tensor(start: int, end: int, buffer: memoryview):
+        reference = None
+
+        def strip_raw_data(value_start: int, value_end: int):
+            nonlocal reference
+            if value_end - value_start < min_lazy_bytes:
+                return False
+            reference = (value_start, value_end - value_start)
+            return None
+
+        tensor = _strip_fields(
+            buffer, start, end, _TENSOR_RAW_DATA_FIELD, strip_raw_data
+        )
+        references.append(reference)
+        return tensor if reference else False
+
+    try:
+        with open(onnx_path, "rb") as model_file, mmap.mmap(
+            model_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped_file:
+            buffer = memoryview(mapped_file)
+            try:
+                model_bytes = _strip_fields(
+                    buffer,
+                    0,
+                    len(buffer),
+                    _MODEL_GRAPH_FIELD,
+                    lambda start, end: _strip_fields(
+                        buffer,
+                        start,
+                        end,
+                        _GRAPH_INITIALIZER_FIELD,
+                        lambda start, end: strip_tensor(start, end, buffer),
+                    ),
+                )
+            finally:
+                buffer.release()
+    except (ValueError, IndexError, OSError) as error:
+        print(f"Lazy loading of {onnx_path} failed, loading it fully: {error}")
+        return load_onnx(onnx_path, load_external_data=False)
+
+    model_proto = onnx.ModelProto()
+    model_proto.ParseFromString(model_bytes)
+    location = os.path.basename(onnx_path)
+    for tensor, reference in zip(model_proto.graph.initializer, references):
+        if reference is None:
+            continue
+        offset, length = reference
+        tensor.data_location = onnx.TensorProto.EXTERNAL
+        del tensor.external_data[:]
+        for key, value in (
+            ("location", location),
+            ("offset", offset),
+            ("length", length),
+        ):
+            entry = tensor.external_data.add()
+            entry.key = key
+            entry.value = str(value)
+    return model_proto
+
+
+# Protobuf field numbers read by the probe
+_MODEL_IR_VERSION_FIELD = 1
+_MODEL_PRODUCER_NAME_FIELD = 2
+_MODEL_PRODUCER_VERSION_FIELD = 3
+_MODEL_OPSET_IMPORT_FIELD = 8
+_GRAPH_NODE_FIELD = 1
+_GRAPH_NAME_FIELD = 2
+_GRAPH_INPUT_FIELD = 11
+_GRAPH_OUTPUT_FIELD = 12
+
+# Fields left out of the canonical hashes. They name and document a model without
+# changing what it computes: the producer, domain, model version, doc string and
+# metadata of the model, the name and doc string of its graph and of its nodes.
+_MODEL_METADATA_FIELDS = frozenset({2, 3, 4, 5, 6, 14})
+_GRAPH_METADATA_FIELDS = frozenset({2, 10})
+_NODE_METADATA_FIELDS = frozenset({3, 6})
+
+
+@dataclass
+class ModelProbe:
+    """Metadata of an ONNX file read by probe_onnx without loading the model"""
+
+    filepath: str
+    file_size: int
+    ir_version: Optional[int] = None
+    producer_name: str = ""
+    producer_version: str = ""
+    opset: Optional[int] = None
+    imports: Dict[str, int] = field(default_factory=dict)
+    graph_name: str = ""
+    inputs: TensorData = field(default_factory=TensorData)
+    outputs: TensorData = field(default_factory=TensorData)
+    dynamic_input_dims: List[str] = field(default_factory=list)
+    node_count: int = 0
+    initializer_count: int = 0
+    # Hash of the serialized model without the initializer payloads. Files with the
+    # same fingerprint have the same graph but may still differ in their weights.
+    graph_fingerprint: str = ""
+    # Same as the graph fingerprint without the metadata, see hash_onnx_canonical
+    canonical_fingerprint: str = ""
+
+
+def probe_onnx(onnx_path: str) -> ModelProbe:
+    """Reads the metadata of an ONNX file by walking its protobuf wire format. The file
+    is memory mapped, the nodes are only counted and the initializer payloads are
+    skipped, so probing a multi-GB model touches little more than its graph."""
+
+    if not os.path.exists(onnx_path):
+        raise ValueError(f"ONNX file {onnx_path} does not exist.")
+
+    probe = ModelProbe(onnx_path, os.path.getsize(onnx_path))
+    # The small messages are parsed into a skeleton model so that the usual helpers
+    # can be used to read them.
+    skeleton = onnx.ModelProto()
+    fingerprint = hashlib.sha256()
+
+    def hash_graph(buffer: memoryview, start: int, end: int) -> None:
+        for number, wire_type, field_start, value_start, value_end in _iter_fields(
+            buffer, start, end
+        ):
+            if wire_type != _WIRE_LENGTH_DELIMITED:
+                fingerprint.update(buffer[field_start:value_end])
+            elif number == _GRAPH_INITIALIZER_FIELD:
+                probe.initializer_count += 1
+                fingerprint.update(buffer[field_start:value_start])
+                for tensor_field in _iter_fields(buffer, value_start, value_end):
+                    # Only the tag and length of the raw data are part of the fingerprint
+                    if tensor_field[0] == _TENSOR_RAW_DATA_FIELD:
+                        fingerprint.update(buffer[tensor_field[2] : tensor_field[3]])
+                    else:
+                        fingerprint.update(buffer[tensor_field[2] : tensor_field[4]])
+            else:
+                fingerprint.update(buffer[field_start:value_end])
+                if number == _GRAPH_NODE_FIELD:
+                    probe.node_count += 1
+                elif number == _GRAPH_NAME_FIELD:
+                    skeleton.graph.name = bytes(buffer[value_start:value_end]).decode()
+                elif number == _GRAPH_INPUT_FIELD:
+                    skeleton.graph.input.add().ParseFromString(
+                        bytes(buffer[value_start:value_end])
+                    )
+                elif number == _GRAPH_OUTPUT_FIELD:
+                    skeleton.graph.output.add().ParseFromString(
+                        bytes(buffer[value_start:value_end])
+                    )
+
+    with open(onnx_path, "rb") as model_file, mmap.mmap(
+        model_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
+        buffer = memoryview(mapped_file)
+        try:
+            for number, wire_type, field_start, value_start, value_end in _iter_fields(
+                buffer, 0, len(buffer)
+            ):
+                if number == _MODEL_GRAPH_FIELD and wire_type == _WIRE_LENGTH_DELIMITED:
+                    fingerprint.update(buffer[field_start:value_start])
+                    hash_graph(buffer, value_start, value_end)
+                    continue
+                fingerprint.update(buffer[field_start:value_end])
+                if number == _MODEL_IR_VERSION_FIELD and wire_type == _WIRE_VARINT:
+                    skeleton.ir_version = _read_varint(buffer, value_start)[0]
+                elif number == _MODEL_PRODUCER_NAME_FIELD:
+                    skeleton.producer_name = bytes(
+                        buffer[value_start:value_end]
+                    ).decode()
+                elif number == _MODEL_PRODUCER_VERSION_FIELD:
+                    skeleton.producer_version = bytes(
+                        buffer[value_start:value_end]
+                    ).decode()
+                elif number == _MODEL_OPSET_IMPORT_FIELD:
+                    skeleton.opset_import.add().ParseFromString(
+                        bytes(buffer[value_start:value_end])
+                    )
+            probe.canonical_fingerprint = _hash_canonical(
+                buffer, include_weights=False
+            )
+        finally:
+            buffer.release()
+
+    probe.ir_version = skeleton.ir_version if skeleton.HasField("ir_version") else None
+    probe.producer_name = skeleton.producer_name
+    probe.producer_version = skeleton.producer_version
+    probe.opset = get_opset(skeleton)
+    probe.imports = {
+        import_.domain: import_.version for import_ in skeleton.opset_import
+    }
+    probe.graph_name = skeleton.graph.name
+    probe.inputs = get_model_input_shapes_types(skeleton)
+    probe.outputs = get_model_output_shapes_types(skeleton)
+    probe.dynamic_input_dims = get_dynamic_input_dims(skeleton)
+    probe.graph_fingerprint = fingerprint.hexdigest()
+    return probe
+
+
+def _hash_canonical(buffer: memoryview, include_weights: bool) -> str:
+    # The length of a graph or of a node depends on the names it holds, so nested
+    # messages are hashed on their own and only their tag and digest are hashed with
+    # the message around them
+    nested_messages = {
+        "model": {_MODEL_GRAPH_FIELD: "graph"},
+        "graph": {_GRAPH_NODE_FIELD: "node"},
+        "node": {},
+    }
+    skip_fields = {
+        "model": _MODEL_METADATA_FIELDS,
+        "graph": _GRAPH_METADATA_FIELDS,
+        "node": _NODE_METADATA_FIELDS,
+    }
+
+    def hash_message(message: str, start: int, end: int) -> bytes:
+        sha256 = hashlib.sha256()
+        for number, wire_type, field_start, value_start, value_end in _iter_fields(
+            buffer, start, end
+        ):
+            if number in skip_fields[message]:
+                continue
+            if wire_type != _WIRE_LENGTH_DELIMITED:
+                sha256.update(buffer[field_start:value_end])
+            elif number in nested_messages[message]:
+                sha256.update(_encode_varint((number << 3) | wire_type))
+                sha256.update(
+                    hash_message(
+                        nested_messages[message][number], value_start, value_end
+                    )
+                )
+            elif (
+                message == "graph"
+                and number == _GRAPH_INITIALIZER_FIELD
+                and not include_weights
+            ):
+                sha256.update(buffer[field_start:value_start])
+                for tensor_field in _iter_fields(buffer, value_start, value_end):
+                    if tensor_field[0] == _TENSOR_RAW_DATA_FIELD:
+                        sha256.update(buffer[tensor_field[2] : tensor_field[3]])
+                    else:
+                        sha256.update(buffer[tensor_field[2] : tensor_field[4]])
+            else:
+                sha256.update(buffer[field_start:value_end])
+        return sha256.digest()
+
+    return hash_message("model", 0, len(buffer)).hex()
+
+
+def hash_onnx_canonical(onnx_path: str, include_weights: bool = True) -> str:
+    """Returns the sha256 hex digest of an ONNX model without its metadata, so that
+    models differing only in their producer version, doc strings or node names have
+    the same hash. The file is memory mapped and hashed in place, without parsing the
+    model. Without include_weights, only the sizes of the initializers are hashed."""
+    with open(onnx_path, "rb") as model_file, mmap.mmap(
+        model_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
+        buffer = memoryview(mapped_file)
+        try:
+            return _hash_canonical(buffer, include_weights)
+        finally:
+            buffer.release()
+
+
+# Memory used by the analysis of a model on top of that of its process. The model is
+# held by the loader, by onnxruntime while it optimizes the graph and by the optimized
+# proto, and every node holds the tensor and attribute info of the Digest model.
+ANALYSIS_MEMORY_PER_FILE_BYTE = 5
+ANALYSIS_MEMORY_PER_NODE = 32 * 1024
+
+
+def estimate_analysis_memory(onnx_path: str) -> int:
+    """Returns an estimate in bytes of the memory used to analyze an ONNX model, from
+    the size of the file and the node count read by probe_onnx. Weights stored as
+    external data are not part of the estimate."""
+    probe = probe_onnx(onnx_path)
+    return (
+        probe.file_size * ANALYSIS_MEMORY_PER_FILE_BYTE
+        + probe.node_count * ANALYSIS_MEMORY_PER_NODE
+    )
+
+
+def get_model_size(model_proto: onnx.ModelProto) -> int:
+    """Returns the size in bytes of the model including the initializers that are
+    stored outside of the proto"""
+    size = model_proto.ByteSize()
+    for tensor in model_proto.graph.initializer:
+        if tensor.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        external_data = {entry.key: entry.value for entry in tensor.external_data}
+        if "length" in external_data:
+            size += int(external_data["length"])
+        else:
+            _, dtype_bytes = tensor_type_to_str_and_size(tensor.data_type)
+            size += math.prod(tensor.dims) * dtype_bytes
+    return size
+
+
+# Name of the optimized model in the output directory of optimize_onnx_model
+OPTIMIZED_MODEL_FILE = "opt.onnx"
+
+
+def _needs_external_initializers(
+    model_proto: onnx.ModelProto, model_filepath: Optional[str]
+) -> bool:
+    """The optimized model is saved with its initializers in a separate file when it is
+    too large for a single protobuf, or when the source model keeps its weights in other
+    files, which onnxruntime would otherwise reference from the temporary directory."""
+    lazy_location = os.path.basename(model_filepath) if model_filepath else None
+    for tensor in model_proto.graph.initializer:
+        if tensor.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        external_data = {entry.key: entry.value for entry in tensor.external_data}
+        # References to the model file itself come from the lazy loader
+        if external_data.get("location") != lazy_location:
+            return True
+    return get_model_size(model_proto) >= onnx.checker.MAXIMUM_PROTOBUF
+
+
+def load_external_data(model_proto: onnx.ModelProto, onnx_path: str) -> None:
+    """Reads the initializer payloads referenced by a lazily loaded model into the proto"""
+    if any(
+        tensor.data_location == onnx.TensorProto.EXTERNAL
+        for tensor in model_proto.graph.initializer
+    ):
+        external_data_helper.load_external_data_for_model(
+            model_proto, os.path.dirname(os.path.abspath(onnx_path))
+        )
+
+
+def hash_file(filepath: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """Returns the sha256 hex digest of the file contents. The file is read in
+    fixed size chunks so that large models are never held in memory."""
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
 def get_opset(model: onnx.ModelProto) -> Union[None, int]:
     for import_ in model.opset_import:
         if import_.domain == "" or import_.domain == "ai.onnx":
@@ -78,12 +594,7 @@ def get_node_type_counts(model: onnx.ModelProto) -> NodeTypeCounts:
 
 
 def get_node_shape_counts(node_data: NodeData) -> NodeShapeCounts:
-    tensor_shape_counter = NodeShapeCounts()
-    for _, info in node_data.items():
-        shape_hash = tuple([tuple(v.shape) for _, v in info.inputs.items()])
-        if info.node_type:
-            tensor_shape_counter[info.node_type][shape_hash] += 1
-    return tensor_shape_counter
+    return node_data.node_shape_counts()
 
 
 def attribute_to_dict(attribute):
@@ -115,10 +626,23 @@ def get_dynamic_input_dims(onnx_model: onnx.ModelProto) -> List[str]:
     return dynamic_input_dim_names
 
 
+def parse_dim_values(text: str) -> Dict[str, int]:
+    """Parses dynamic dim values written as name=value pairs separated by commas,
+    for example "batch=8,seq=512"."""
+    dim_values: Dict[str, int] = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name=value for a dim value, got '{item}'")
+        dim_values[name.strip()] = int(value)
+    return dim_values
+
+
 def get_model_input_shapes_types(onnx_model: onnx.ModelProto):
     input_shapes_types = TensorData()
     for tensor in onnx_model.graph.input:
-        input_shapes_types[tensor.name] = TensorInfo()
         tensor_shape: List[Union[str, int]] = []
         for dim in tensor.type.tensor_type.shape.dim:
             if dim.dim_value:
@@ -135,10 +659,9 @@ def get_model_input_shapes_types(onnx_model: onnx.ModelProto):
             tensor_size = float(np.prod(np.array(tensor_shape)))
             size_kbytes = tensor_size * float(type_byte_size) / 1024.0
 
-        input_shapes_types[tensor.name].dtype = type_str
-        input_shapes_types[tensor.name].dtype_bytes = type_byte_size
-        input_shapes_types[tensor.name].shape = tensor_shape
-        input_shapes_types[tensor.name].size_kbytes = size_kbytes
+        input_shapes_types[tensor.name] = TensorInfo(
+            type_str, type_byte_size, size_kbytes, tensor_shape
+        )
 
     return input_shapes_types
 
@@ -146,7 +669,6 @@ def get_model_input_shapes_types(onnx_model: onnx.ModelProto):
 def get_model_output_shapes_types(onnx_model: onnx.ModelProto):
     output_shapes_types = TensorData()
     for tensor in onnx_model.graph.output:
-        output_shapes_types[tensor.name] = TensorInfo()
         tensor_shape: List[Union[str, int]] = []
         for dim in tensor.type.tensor_type.shape.dim:
             if dim.dim_value:
@@ -163,10 +685,9 @@ def get_model_output_shapes_types(onnx_model: onnx.ModelProto):
             tensor_size = float(np.prod(np.array(tensor_shape)))
             size_kbytes = tensor_size * float(type_byte_size) / 1024.0
 
-        output_shapes_types[tensor.name].dtype = type_str
-        output_shapes_types[tensor.name].dtype_bytes = type_byte_size
-        output_shapes_types[tensor.name].shape = tensor_shape
-        output_shapes_types[tensor.name].size_kbytes = size_kbytes
+        output_shapes_types[tensor.name] = TensorInfo(
+            type_str, type_byte_size, size_kbytes, tensor_shape
+        )
 
     return output_shapes_types
 
@@ -174,8 +695,35 @@ def get_model_output_shapes_types(onnx_model: onnx.ModelProto):
 def optimize_onnx_model(
     model_proto: onnx.ModelProto,
     model_filepath: Optional[str] = None,
-    optimization_level=ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    optimization_level: Optional["ort.GraphOptimizationLevel"] = None,
+    output_dir: Optional[str] = None,
 ) -> Tuple[onnx.ModelProto, bool]:
+    """Optimizes the model with onnxruntime, ORT_ENABLE_BASIC by default. The
+    returned flag is False if the model could not be optimized.
+
+    The optimized model is saved in output_dir and only its graph is loaded back, its
+    large initializers reference the files in output_dir, see load_onnx_lazy. The
+    caller must keep output_dir until it is done with the weights. Without output_dir
+    the model is optimized in a temporary directory and the returned proto holds all
+    of its weights."""
+
+    if output_dir is None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            optimized_proto, optimized = optimize_onnx_model(
+                model_proto, model_filepath, optimization_level, tmpdir
+            )
+            if optimized:
+                load_external_data(
+                    optimized_proto, os.path.join(tmpdir, OPTIMIZED_MODEL_FILE)
+                )
+            return optimized_proto, optimized
+
+    # onnxruntime is imported on first use, it is a large part of the import time
+    # of this module and most of the helpers here do not need it.
+    import onnxruntime as ort  # pylint: disable=import-outside-toplevel
+
+    if optimization_level is None:
+        optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
 
     # Attempt to optimize the model using onnxruntime.
     # In many cases, the model may not be capable of optimizations because
@@ -183,31 +731,147 @@ def optimize_onnx_model(
     # it could be due to digest not loading external data. These can be
     # included as future features.
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        try:
-            sess_options = ort.SessionOptions()
-            sess_options.graph_optimization_level = optimization_level
-            sess_options.optimized_model_filepath = str(
-                os.path.join(tmpdir, "opt.onnx")
+    # When the model file is given onnxruntime reads it directly, which also resolves
+    # the external data of the model and avoids serializing protos larger than 2GB.
+
+    try:
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = optimization_level
+        sess_options.optimized_model_filepath = str(
+            os.path.join(output_dir, OPTIMIZED_MODEL_FILE)
+        )
+        if _needs_external_initializers(model_proto, model_filepath):
+            sess_options.add_session_config_entry(
+                "session.optimized_model_external_initializers_file_name",
+                f"{OPTIMIZED_MODEL_FILE}.data",
             )
-            _ = ort.InferenceSession(
-                model_filepath if model_filepath else model_proto.SerializeToString(),
-                sess_options,
-                providers=["CPUExecutionProvider"],
+            sess_options.add_session_config_entry(
+                "session.optimized_model_external_initializers_min_size_in_bytes",
+                str(LAZY_INITIALIZER_MIN_BYTES),
             )
-        except Exception as e:  # pylint: disable=broad-except
-            print(f"Error loading model into inference session: {e}")
-            return model_proto, False
+        _ = ort.InferenceSession(
+            model_filepath if model_filepath else model_proto.SerializeToString(),
+            sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"Error loading model into inference session: {e}")
+        return model_proto, False
 
-        try:
-            onnx.checker.check_model(
-                sess_options.optimized_model_filepath, full_check=True
-            )
-            model_proto = load_onnx(
-                sess_options.optimized_model_filepath, load_external_data=False
+    try:
+        onnx.checker.check_model(sess_options.optimized_model_filepath, full_check=True)
+        model_proto = load_onnx_lazy(sess_options.optimized_model_filepath)
+        return model_proto, True
+
+    except onnx.checker.ValidationError:
+        print("Model did not pass checker!")
+        return model_proto, False
+
+
+class ModelStage(IntEnum):
+    """The stages of the analysis pipeline in the order they are applied:
+    load -> optimize -> infer shapes. Parsing the nodes is the final step and is
+    performed by DigestOnnxModel."""
+
+    LOADED = 1
+    OPTIMIZED = 2
+    SHAPES_INFERRED = 3
+
+
+class ModelWorkdir:
+    """Temporary directory that is removed once the object is garbage collected,
+    without the warning of tempfile.TemporaryDirectory"""
+
+    def __init__(self) -> None:
+        self.name = tempfile.mkdtemp(prefix="digest_")
+        self._finalizer = weakref.finalize(
+            self, shutil.rmtree, self.name, ignore_errors=True
+        )
+
+    def cleanup(self) -> None:
+        self._finalizer()
+
+
+@dataclass
+class StagedModel:
+    """The artifact passed between the pipeline stages. The stage records the last
+    step that was applied to the model proto so that it is never repeated."""
+
+    model_proto: onnx.ModelProto
+    stage: ModelStage = ModelStage.LOADED
+    filepath: Optional[str] = None
+    # True when the model proto is the unmodified content of the file at filepath,
+    # in that case the stages can read the file instead of serializing the proto.
+    matches_file: bool = False
+    # Holds the optimized model that the large initializers of the proto reference.
+    # It is shared by the later stages and removed with the last of them.
+    workdir: Optional[ModelWorkdir] = None
+
+    def load_external_data(self) -> None:
+        """Reads the large initializers left out of the proto, see load_onnx_lazy"""
+        if self.workdir is not None:
+            load_external_data(
+                self.model_proto, os.path.join(self.workdir.name, OPTIMIZED_MODEL_FILE)
             )
-            return model_proto, True
+        elif self.filepath:
+            load_external_data(self.model_proto, self.filepath)
 
-        except onnx.checker.ValidationError:
-            print("Model did not pass checker!")
-            return model_proto, False
+
+def load_stage(
+    onnx_path: str, load_external_data: bool = False, lazy: bool = True
+) -> StagedModel:
+    """Loads the model for the pipeline. Unless the external data is requested the
+    large initializers are left in the file, see load_onnx_lazy."""
+    if lazy and not load_external_data:
+        model_proto = load_onnx_lazy(onnx_path)
+    else:
+        model_proto = load_onnx(onnx_path, load_external_data=load_external_data)
+    return StagedModel(model_proto, ModelStage.LOADED, onnx_path, matches_file=True)
+
+
+def optimize_stage(staged_model: StagedModel) -> StagedModel:
+    if staged_model.stage >= ModelStage.OPTIMIZED:
+        return staged_model
+    # A failed optimization still completes the stage, the unoptimized proto is
+    # passed along so that the remaining stages do not attempt it again.
+    workdir: Optional[ModelWorkdir] = ModelWorkdir()
+    model_proto, optimized = optimize_onnx_model(
+        staged_model.model_proto,
+        staged_model.filepath if staged_model.matches_file else None,
+        output_dir=workdir.name,
+    )
+    if not optimized:
+        workdir.cleanup()
+        workdir = None
+    return StagedModel(
+        model_proto, ModelStage.OPTIMIZED, staged_model.filepath, workdir=workdir
+    )
+
+
+def infer_shapes_stage(staged_model: StagedModel) -> StagedModel:
+    if staged_model.stage >= ModelStage.SHAPES_INFERRED:
+        return staged_model
+    model_proto = onnx.shape_inference.infer_shapes(
+        staged_model.model_proto, strict_mode=True, data_prop=True
+    )
+    return StagedModel(
+        model_proto,
+        ModelStage.SHAPES_INFERRED,
+        staged_model.filepath,
+        workdir=staged_model.workdir,
+    )
+
+
+def run_pipeline(
+    model: Union[onnx.ModelProto, StagedModel],
+    until: ModelStage = ModelStage.SHAPES_INFERRED,
+) -> StagedModel:
+    """Runs the stages that have not been applied to the model yet, up to and
+    including the stage given by until. A bare ModelProto is treated as freshly loaded.
+    """
+    staged_model = model if isinstance(model, StagedModel) else StagedModel(model)
+    if until >= ModelStage.OPTIMIZED:
+        staged_model = optimize_stage(staged_model)
+    if until >= ModelStage.SHAPES_INFERRED:
+        staged_model = infer_shapes_stage(staged_model)
+    return staged_model
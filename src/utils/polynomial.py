@@ -0,0 +1,308 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+Polynomials over the named dynamic dims of a model, for example the FLOPs of a
+model with a dynamic batch size and sequence length:
+
+    >>> flops = 2 * Polynomial.symbol("batch") * Polynomial.symbol("seq") ** 2
+    >>> str(flops)
+    '2*batch*seq^2'
+    >>> flops.evaluate({"batch": 4, "seq": 128})
+    131072
+
+The coefficients are exact integers or fractions so that evaluating a polynomial
+for large dims gives the same result as counting with those dims directly.
+"""
+
+import random
+from fractions import Fraction
+from itertools import product
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# A monomial is a sorted tuple of (symbol, power) pairs, the constant term is ()
+Monomial = Tuple[Tuple[str, int], ...]
+Coefficient = Union[int, Fraction]
+
+
+def _normalize(coefficient: Coefficient) -> Coefficient:
+    if isinstance(coefficient, Fraction) and coefficient.denominator == 1:
+        return coefficient.numerator
+    return coefficient
+
+
+def _multiply_monomials(first: Monomial, second: Monomial) -> Monomial:
+    powers = dict(first)
+    for symbol, power in second:
+        powers[symbol] = powers.get(symbol, 0) + power
+    return tuple(sorted(powers.items()))
+
+
+class Polynomial:
+    """An immutable polynomial with integer or rational coefficients"""
+
+    __slots__ = ("_terms",)
+
+    def __init__(self, terms: Optional[Mapping[Monomial, Coefficient]] = None) -> None:
+        self._terms: Dict[Monomial, Coefficient] = {
+            monomial: _normalize(coefficient)
+            for monomial, coefficient in (terms or {}).items()
+            if coefficient != 0
+        }
+
+    @classmethod
+    def constant(cls, value: Coefficient) -> "Polynomial":
+        return cls({(): value})
+
+    @classmethod
+    def symbol(cls, name: str) -> "Polynomial":
+        return cls({((name, 1),): 1})
+
+    @classmethod
+    def from_shape(
+        cls, shape: Iterable[Union[int, str]], symbols: Iterable[str]
+    ) -> Optional["Polynomial"]:
+        """The number of elements of a tensor shape. Returns None if the shape has
+        a dim that is neither an integer nor one of the symbols."""
+        symbols = set(symbols)
+        numel = cls.constant(1)
+        for dim in shape:
+            if isinstance(dim, int):
+                numel = numel * dim
+            elif dim in symbols:
+                numel = numel * cls.symbol(dim)
+            else:
+                return None
+        return numel
+
+    @property
+    def terms(self) -> Dict[Monomial, Coefficient]:
+        return dict(self._terms)
+
+    @property
+    def symbols(self) -> List[str]:
+        return sorted({symbol for monomial in self._terms for symbol, _ in monomial})
+
+    def is_constant(self) -> bool:
+        return all(monomial == () for monomial in self._terms)
+
+    def is_integral(self) -> bool:
+        return all(isinstance(c, int) for c in self._terms.values())
+
+    def degree(self, symbol: Optional[str] = None) -> int:
+        """The total degree, or the degree in a single symbol"""
+        return max(
+            (
+                sum(p for s, p in monomial if symbol is None or s == symbol)
+                for monomial in self._terms
+            ),
+            default=0,
+        )
+
+    def evaluate(self, dim_values: Mapping[str, int]) -> Coefficient:
+        missing = [symbol for symbol in self.symbols if symbol not in dim_values]
+        if missing:
+            raise ValueError(f"Missing values for dynamic dims: {', '.join(missing)}")
+        total: Coefficient = 0
+        for monomial, coefficient in self._terms.items():
+            term = coefficient
+            for symbol, power in monomial:
+                term *= dim_values[symbol] ** power
+            total += term
+        return _normalize(total)
+
+    def substitute(self, dim_values: Mapping[str, int]) -> "Polynomial":
+        """Replaces the symbols found in dim_values and keeps the others"""
+        result = Polynomial()
+        for monomial, coefficient in self._terms.items():
+            term = Polynomial.constant(coefficient)
+            for symbol, power in monomial:
+                if symbol in dim_values:
+                    term = term * dim_values[symbol] ** power
+                else:
+                    term = term * Polynomial({((symbol, power),): 1})
+            result = result + term
+        return result
+
+    def __add__(self, other: Union["Polynomial", Coefficient]) -> "Polynomial":
+        if not isinstance(other, Polynomial):
+            other = Polynomial.constant(other)
+        terms = dict(self._terms)
+        for monomial, coefficient in other._terms.items():
+            terms[monomial] = terms.get(monomial, 0) + coefficient
+        return Polynomial(terms)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> "Polynomial":
+        return self * -1
+
+    def __sub__(self, other: Union["Polynomial", Coefficient]) -> "Polynomial":
+        return self + (-other)
+
+    def __rsub__(self, other: Coefficient) -> "Polynomial":
+        return (-self) + other
+
+    def __mul__(self, other: Union["Polynomial", Coefficient]) -> "Polynomial":
+        if not isinstance(other, Polynomial):
+            return Polynomial(
+                {monomial: c * other for monomial, c in self._terms.items()}
+            )
+        terms: Dict[Monomial, Coefficient] = {}
+        for monomial_a, coefficient_a in self._terms.items():
+            for monomial_b, coefficient_b in other._terms.items():
+                monomial = _multiply_monomials(monomial_a, monomial_b)
+                terms[monomial] = terms.get(monomial, 0) + coefficient_a * coefficient_b
+        return Polynomial(terms)
+
+    __rmul__ = __mul__
+
+    def __pow__(self, exponent: int) -> "Polynomial":
+        result = Polynomial.constant(1)
+        for _ in range(exponent):
+            result = result * self
+        return result
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (int, Fraction)):
+            other = Polynomial.constant(other)
+        if not isinstance(other, Polynomial):
+            return NotImplemented
+        return self._terms == other._terms
+
+    def __hash__(self) -> int:
+        return hash(frozenset(self._terms.items()))
+
+    def __getstate__(self) -> Dict[Monomial, Coefficient]:
+        return self._terms
+
+    def __setstate__(self, state: Dict[Monomial, Coefficient]) -> None:
+        self._terms = state
+
+    def __repr__(self) -> str:
+        return f"Polynomial('{self}')"
+
+    def __str__(self) -> str:
+        if not self._terms:
+            return "0"
+
+        # Highest degree terms first, then alphabetical
+        def sort_key(monomial: Monomial):
+            return (-sum(power for _, power in monomial), monomial)
+
+        text = ""
+        for monomial in sorted(self._terms, key=sort_key):
+            coefficient = self._terms[monomial]
+            factors = [
+                symbol if power == 1 else f"{symbol}^{power}"
+                for symbol, power in monomial
+            ]
+            magnitude = abs(coefficient)
+            if magnitude != 1 or not factors:
+                factors.insert(0, str(magnitude))
+            term = "*".join(factors)
+            if not text:
+                text = f"-{term}" if coefficient < 0 else term
+            else:
+                text += f" - {term}" if coefficient < 0 else f" + {term}"
+        return text
+
+
+def _lagrange_basis(points: List[int]) -> List[List[Fraction]]:
+    """The power basis coefficients of the Lagrange basis polynomials"""
+    basis = []
+    for j, x_j in enumerate(points):
+        coefficients = [Fraction(1)]
+        denominator = 1
+        for m, x_m in enumerate(points):
+            if m == j:
+                continue
+            # Multiply by (x - x_m)
+            shifted = [Fraction(0)] + coefficients
+            for k, coefficient in enumerate(coefficients):
+                shifted[k] -= x_m * coefficient
+            coefficients = shifted
+            denominator *= x_j - x_m
+        basis.append([coefficient / denominator for coefficient in coefficients])
+    return basis
+
+
+# The fit is checked at a point next to the grid and at random points up to
+# CHECK_DISTANCE past the grid, which catch the floors of strided windows whose
+# kernel times stride is bigger than the grid.
+NUM_CHECK_POINTS = 4
+CHECK_DISTANCE = 1024
+
+
+def interpolate_polynomials(
+    function: Callable[[Dict[str, int]], Optional[Dict[str, int]]],
+    degrees: Mapping[str, int],
+) -> Optional[Dict[str, Polynomial]]:
+    """Recovers integer polynomials from a function that returns their values for
+    concrete dim values. degrees is an upper bound of the degree of the polynomials
+    in each symbol. The function is evaluated on a grid of product(degree + 1)
+    points and at NUM_CHECK_POINTS + 1 more points to check the result. Returns
+    None if the function returns None for a point, if it returns different keys
+    for different points, or if the values are not those of integer polynomials
+    of the given degrees."""
+    symbols = sorted(degrees)
+    points = {symbol: list(range(1, degrees[symbol] + 2)) for symbol in symbols}
+    grid_values: Dict[Tuple[int, ...], Dict[str, int]] = {}
+    keys: Optional[List[str]] = None
+    for grid_point in product(*(points[symbol] for symbol in symbols)):
+        values = function(dict(zip(symbols, grid_point)))
+        if values is None or (keys is not None and list(values) != keys):
+            return None
+        keys = list(values)
+        grid_values[grid_point] = values
+    assert keys is not None
+
+    # The tensor product of the Lagrange bases in every symbol
+    polynomials = {key: Polynomial() for key in keys}
+    bases = [_lagrange_basis(points[symbol]) for symbol in symbols]
+    basis_polynomials = [
+        [
+            Polynomial(
+                {
+                    (((symbol, k),) if k else ()): coefficient
+                    for k, coefficient in enumerate(coefficients)
+                }
+            )
+            for coefficients in basis
+        ]
+        for symbol, basis in zip(symbols, bases)
+    ]
+    for indices in product(*(range(len(points[symbol])) for symbol in symbols)):
+        grid_point = tuple(points[symbol][i] for symbol, i in zip(symbols, indices))
+        lagrange = Polynomial.constant(1)
+        for symbol_index, i in enumerate(indices):
+            lagrange = lagrange * basis_polynomials[symbol_index][i]
+        for key in keys:
+            polynomials[key] = (
+                polynomials[key] + lagrange * grid_values[grid_point][key]
+            )
+
+    if not all(polynomial.is_integral() for polynomial in polynomials.values()):
+        return None
+
+    # Interpolation always succeeds, the extra points catch functions that are not
+    # polynomials of the given degrees such as the output size of a strided Conv.
+    # The random points are seeded so that the result does not change between runs.
+    rng = random.Random(0)
+    all_check_points = [
+        {symbol: degrees[symbol] + 3 for symbol in symbols},
+        *(
+            {
+                symbol: degrees[symbol] + rng.randint(4, CHECK_DISTANCE)
+                for symbol in symbols
+            }
+            for _ in range(NUM_CHECK_POINTS)
+        ),
+    ]
+    for check_point in all_check_points:
+        values = function(check_point)
+        if values is None or list(values) != keys:
+            return None
+        if any(polynomials[key].evaluate(check_point) != values[key] for key in keys):
+            return None
+
+    return polynomials
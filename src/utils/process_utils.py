@@ -0,0 +1,335 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+"""
+A process pool for analysis tasks that may hang or crash. Unlike the pools of
+concurrent.futures and multiprocessing, a task that runs past its timeout or
+that kills its worker is reported as a failed result, the worker is replaced and
+the remaining tasks keep running. Tasks can be given a memory estimate, and are
+only started while the estimates of the running tasks fit a memory budget. The
+resident memory of the workers can also be capped, a worker that goes past the
+limit is killed and its task fails instead of the machine.
+"""
+
+import time
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+import psutil
+
+# Time given to a worker to exit on its own before it is terminated
+WORKER_SHUTDOWN_TIMEOUT = 5.0
+# Longest time between two checks for the cancellation of the tasks
+CANCEL_POLL_INTERVAL = 0.1
+# Longest time between two checks of the resident memory of the workers
+MEMORY_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class TaskResult:
+    key: Any
+    value: Any = None
+    # Set when the task raised, timed out or its worker exited
+    error: Optional[str] = None
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+
+def _worker_main(
+    connection: multiprocessing.connection.Connection, function: Callable
+) -> None:
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        key, args = message
+        # The run time is measured here so that it does not depend on how soon the
+        # parent collects the result
+        start_time = time.monotonic()
+        try:
+            value = function(*args)
+        except Exception as e:  # pylint: disable=broad-except
+            error = f"{type(e).__name__}: {e}"
+            connection.send((key, None, error, time.monotonic() - start_time))
+            continue
+        connection.send((key, value, None, time.monotonic() - start_time))
+
+
+def _resident_memory(pid: int) -> int:
+    """Returns the resident memory of a process in bytes. The pages of mapped files,
+    such as the memory mapped models, are not counted where they are reported."""
+    try:
+        memory_info = psutil.Process(pid).memory_info()
+    except psutil.Error:
+        return 0
+    return memory_info.rss - getattr(memory_info, "shared", 0)
+
+
+class _Worker:
+    def __init__(self, context, function: Callable) -> None:
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_connection, function),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.key: Any = None
+        self.start_time = 0.0
+        self.busy = False
+        self.memory = 0
+
+    def submit(self, key: Any, args: Tuple, memory: int = 0) -> None:
+        self.key = key
+        self.start_time = time.monotonic()
+        self.busy = True
+        self.memory = memory
+        self.connection.send((key, args))
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(WORKER_SHUTDOWN_TIMEOUT)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class SupervisedPool:
+    """Runs a picklable, module level function over tasks in spawned worker
+    processes. Spawned workers do not inherit the threads of the parent, such as
+    those of Qt or onnxruntime, which makes them safe to start from the GUI. With
+    a memory_limit, a worker whose resident memory goes past that many bytes is
+    killed and its task fails. The memory is checked every MEMORY_POLL_INTERVAL,
+    so a task that allocates quickly can go past the limit in between."""
+
+    def __init__(
+        self,
+        function: Callable,
+        num_workers: int,
+        timeout: Optional[float] = None,
+        memory_budget: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+    ) -> None:
+        self.function = function
+        self.num_workers = max(1, num_workers)
+        self.timeout = timeout
+        self.memory_budget = memory_budget
+        self.memory_limit = memory_limit
+        self._context = multiprocessing.get_context("spawn")
+
+    def imap_unordered(
+        self,
+        tasks: Iterable[Tuple[Any, Tuple]],
+        memory: Optional[Dict[Any, int]] = None,
+        canceled: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[TaskResult]:
+        """Yields a TaskResult for every (key, args) task as soon as it completes.
+        The tasks are started in the given order, except that with a memory budget
+        a task whose estimate in bytes, memory[key], does not fit next to the
+        running tasks is passed by the smaller tasks that fit. A task always starts
+        when no other task is running. The running tasks are killed when canceled
+        returns True or when the iteration is stopped.
+
+        The timeout of a task is the wall-clock time since it started, as of the
+        last wait for the workers. A task whose result arrived in time is never
+        reported as timed out, however long the caller takes between results."""
+        pending: Deque[Tuple[Any, Tuple]] = deque(tasks)
+        memory = memory or {}
+        workers: List[_Worker] = []
+
+        def next_task() -> Optional[Tuple[Any, Tuple, int]]:
+            if not pending:
+                return None
+            if self.memory_budget is None:
+                key, args = pending.popleft()
+                return key, args, memory.get(key, 0)
+            used = sum(worker.memory for worker in workers if worker.busy)
+            for index, (key, args) in enumerate(pending):
+                if not used or used + memory.get(key, 0) <= self.memory_budget:
+                    del pending[index]
+                    return key, args, memory.get(key, 0)
+            return None
+
+        try:
+            while pending or any(worker.busy for worker in workers):
+                if canceled and canceled():
+                    return
+                for worker in workers:
+                    if not worker.busy:
+                        task = next_task()
+                        if task is None:
+                            break
+                        worker.submit(*task)
+                while len(workers) < self.num_workers:
+                    task = next_task()
+                    if task is None:
+                        break
+                    worker = _Worker(self._context, self.function)
+                    worker.submit(*task)
+                    workers.append(worker)
+
+                busy = [worker for worker in workers if worker.busy]
+                timeout = self._wait_timeout(busy)
+                if canceled:
+                    timeout = (
+                        CANCEL_POLL_INTERVAL
+                        if timeout is None
+                        else min(timeout, CANCEL_POLL_INTERVAL)
+                    )
+                if self.memory_limit is not None:
+                    timeout = (
+                        MEMORY_POLL_INTERVAL
+                        if timeout is None
+                        else min(timeout, MEMORY_POLL_INTERVAL)
+                    )
+                multiprocessing.connection.wait(
+                    [worker.connection for worker in busy]
+                    + [worker.process.sentinel for worker in busy],
+                    timeout=timeout,
+                )
+                # Timeouts are checked as of the wait, the time the consumer of
+                # the results spends between them does not count against the tasks
+                waited_time = time.monotonic()
+                for worker in list(workers):
+                    if not worker.busy:
+                        continue
+                    result = self._poll(worker, waited_time)
+                    if result is None:
+                        continue
+                    yield result
+                    # A killed worker is dropped, a new one is only started above
+                    # when there is a task left for it
+                    if not worker.process.is_alive():
+                        workers.remove(worker)
+        finally:
+            for worker in workers:
+                # The results of the running tasks are not waited for
+                if worker.busy:
+                    worker.kill()
+                else:
+                    worker.stop()
+
+    def _wait_timeout(self, busy: List[_Worker]) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        now = time.monotonic()
+        deadline = min(worker.start_time + self.timeout for worker in busy)
+        return max(0.0, deadline - now)
+
+    def _poll(self, worker: _Worker, waited_time: float) -> Optional[TaskResult]:
+        """Returns the result of the task of a busy worker if it is done, failed
+        or timed out as of waited_time. A worker that is not usable anymore is
+        killed."""
+        elapsed = waited_time - worker.start_time
+        try:
+            if worker.connection.poll():
+                key, value, error, elapsed = worker.connection.recv()
+                worker.busy = False
+                return TaskResult(key, value, error, elapsed=elapsed)
+        except (EOFError, OSError):
+            pass
+
+        if not worker.process.is_alive():
+            worker.busy = False
+            exitcode = worker.process.exitcode
+            worker.kill()
+            return TaskResult(
+                worker.key,
+                error=f"Worker process exited with code {exitcode}",
+                elapsed=elapsed,
+            )
+
+        if (
+            self.memory_limit is not None
+            and _resident_memory(worker.process.pid) > self.memory_limit
+        ):
+            worker.busy = False
+            worker.kill()
+            return TaskResult(
+                worker.key,
+                error=f"Exceeded the memory limit of {self.memory_limit:,} bytes",
+                elapsed=elapsed,
+            )
+
+        if self.timeout is not None and elapsed >= self.timeout:
+            worker.busy = False
+            worker.kill()
+            return TaskResult(
+                worker.key,
+                error=f"Timed out after {self.timeout:g} seconds",
+                timed_out=True,
+                elapsed=elapsed,
+            )
+        return None
+
+
+def run_tasks(
+    function: Callable,
+    tasks: List[Tuple[Any, Tuple]],
+    num_workers: int,
+    timeout: Optional[float] = None,
+    memory: Optional[Dict[Any, int]] = None,
+    memory_budget: Optional[int] = None,
+    canceled: Optional[Callable[[], bool]] = None,
+) -> Iterator[TaskResult]:
+    """Yields a TaskResult for every (key, args) task as it completes. The tasks
+    run on a SupervisedPool, except that a single worker without a timeout runs
+    them in this process, one at a time, and is only canceled between tasks."""
+    num_workers = min(num_workers, len(tasks))
+    if num_workers > 1 or timeout is not None:
+        pool = SupervisedPool(function, num_workers, timeout, memory_budget)
+        yield from pool.imap_unordered(tasks, memory, canceled)
+        return
+    for key, args in tasks:
+        if canceled and canceled():
+            return
+        start_time = time.monotonic()
+        try:
+            value = function(*args)
+        except Exception as e:  # pylint: disable=broad-except
+            yield TaskResult(
+                key,
+                error=f"{type(e).__name__}: {e}",
+                elapsed=time.monotonic() - start_time,
+            )
+            continue
+        yield TaskResult(key, value, elapsed=time.monotonic() - start_time)
+
+
+def run_isolated(
+    function: Callable,
+    args: Tuple,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    canceled: Optional[Callable[[], bool]] = None,
+) -> Optional[TaskResult]:
+    """Runs function(*args) in a spawned process that is killed when it runs past
+    the timeout, when its resident memory goes past memory_limit bytes or when
+    canceled returns True. Returns None if it was canceled."""
+    pool = SupervisedPool(function, 1, timeout, memory_limit=memory_limit)
+    results = pool.imap_unordered([(None, args)], canceled=canceled)
+    try:
+        return next(results, None)
+    finally:
+        # Stops the worker process
+        results.close()
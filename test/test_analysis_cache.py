@@ -0,0 +1,56 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import unittest
+import tempfile
+from unittest.mock import patch
+from digest.model_class.digest_onnx_model import load_digest_onnx_model
+from utils.analysis_cache import AnalysisCache, CACHE_DIR_ENV_VAR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+class TestAnalysisCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        env_patch = patch.dict(os.environ, {CACHE_DIR_ENV_VAR: self.cache_dir.name})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_second_load_uses_cache(self):
+        first_model = load_digest_onnx_model(TEST_ONNX, save_proto=False)
+        self.assertIsNotNone(first_model.content_hash)
+
+        with patch("utils.onnx_utils.optimize_onnx_model") as mock_optimize:
+            second_model = load_digest_onnx_model(
+                TEST_ONNX, model_name="renamed", save_proto=False
+            )
+            mock_optimize.assert_not_called()
+
+        self.assertNotEqual(first_model.unique_id, second_model.unique_id)
+        self.assertEqual(second_model.model_name, "renamed")
+        self.assertEqual(first_model.flops, second_model.flops)
+        self.assertEqual(first_model.parameters, second_model.parameters)
+        self.assertEqual(
+            dict(first_model.node_type_flops), dict(second_model.node_type_flops)
+        )
+        self.assertEqual(len(first_model.node_data), len(second_model.node_data))
+
+    def test_cache_is_keyed_by_version(self):
+        cache = AnalysisCache(self.cache_dir.name)
+        cache.put("abc", AnalysisCache.SIMILARITY, ["model"])
+        self.assertEqual(cache.get("abc", AnalysisCache.SIMILARITY), ["model"])
+
+        cache.digest_version = "0.0.0"
+        self.assertIsNone(cache.get("abc", AnalysisCache.SIMILARITY))
+
+        cache.clear()
+        cache.digest_version = AnalysisCache(self.cache_dir.name).digest_version
+        self.assertIsNone(cache.get("abc", AnalysisCache.SIMILARITY))
+
+
+if __name__ == "__main__":
+    unittest.main()
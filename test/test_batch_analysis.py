@@ -0,0 +1,364 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import csv
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from utils import process_utils
+from utils.process_utils import SupervisedPool, run_isolated
+from digest.aggregate import GlobalAggregate, find_partials, merge_partials
+from digest.analyze import (
+    JOURNAL_FILENAME,
+    analyze_models,
+    parse_shard,
+    read_journal,
+    shard_files,
+)
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+def sleep_or_fail(seconds: float) -> float:
+    if seconds < 0:
+        raise ValueError("negative sleep")
+    time.sleep(seconds)
+    return seconds
+
+
+def timed_sleep(seconds: float) -> tuple:
+    start = time.time()
+    time.sleep(seconds)
+    return start, time.time()
+
+
+def allocate(num_bytes: int, seconds: float = 0.0) -> int:
+    # The pages are written so that they are resident
+    chunks = [b"\x01" * (1024**2) for _ in range(num_bytes // 1024**2)]
+    time.sleep(seconds)
+    return sum(len(chunk) for chunk in chunks)
+
+
+class TestSupervisedPool(unittest.TestCase):
+
+    def test_results_errors_and_timeouts(self):
+        pool = SupervisedPool(sleep_or_fail, num_workers=2, timeout=2.0)
+        tasks = [("fast", (0.1,)), ("error", (-1,)), ("hang", (30,)), ("next", (0,))]
+        results = {result.key: result for result in pool.imap_unordered(tasks)}
+
+        self.assertEqual(results["fast"].value, 0.1)
+        self.assertIsNone(results["fast"].error)
+        self.assertEqual(results["error"].error, "ValueError: negative sleep")
+        self.assertTrue(results["hang"].timed_out)
+        self.assertLess(results["hang"].elapsed, 10)
+        # The tasks after a failure still run on the remaining workers
+        self.assertEqual(results["next"].value, 0)
+
+    def test_killed_workers_are_replaced_only_for_remaining_tasks(self):
+        started = []
+
+        class CountedWorker(process_utils._Worker):
+            def __init__(self, *args) -> None:
+                super().__init__(*args)
+                started.append(self)
+
+        pool = SupervisedPool(sleep_or_fail, num_workers=1, timeout=2.0)
+        with patch.object(process_utils, "_Worker", CountedWorker):
+            tasks = [("hang", (30,)), ("next", (0,)), ("last", (30,))]
+            results = list(pool.imap_unordered(tasks))
+
+        self.assertEqual([result.key for result in results], ["hang", "next", "last"])
+        # The worker killed by the last timeout is not replaced
+        self.assertEqual(len(started), 2)
+        self.assertFalse(any(worker.process.is_alive() for worker in started))
+
+    def test_slow_consumer(self):
+        pool = SupervisedPool(sleep_or_fail, num_workers=2, timeout=3.0)
+        results = []
+        for result in pool.imap_unordered([("first", (0.1,)), ("second", (0.5,))]):
+            results.append(result)
+            # The second task completes while the first result is handled
+            time.sleep(3.5)
+
+        self.assertEqual([result.error for result in results], [None, None])
+        for result in results:
+            self.assertLess(result.elapsed, 1.0)
+
+    def test_memory_budget(self):
+        pool = SupervisedPool(timed_sleep, num_workers=3, memory_budget=100)
+        tasks = [("big_1", (1.0,)), ("big_2", (1.0,)), ("small", (1.0,))]
+        memory = {"big_1": 80, "big_2": 80, "small": 10}
+        results = {
+            result.key: result.value
+            for result in pool.imap_unordered(tasks, memory=memory)
+        }
+
+        # The second large task waits for the first one, the small task passes it
+        self.assertGreaterEqual(results["big_2"][0], results["big_1"][1])
+        self.assertLess(results["small"][0], results["big_1"][1])
+
+    def test_cancel(self):
+        pool = SupervisedPool(sleep_or_fail, num_workers=2)
+        start_time = time.monotonic()
+        results = list(
+            pool.imap_unordered(
+                [("hang_1", (30,)), ("hang_2", (30,))],
+                canceled=lambda: time.monotonic() - start_time > 1.0,
+            )
+        )
+
+        # The running tasks are killed without waiting for them
+        self.assertEqual(results, [])
+        self.assertLess(time.monotonic() - start_time, 10)
+
+
+    def test_memory_limit(self):
+        memory_limit = 1024**3
+        result = run_isolated(
+            allocate, (2 * memory_limit, 30), memory_limit=memory_limit
+        )
+        assert result is not None
+        self.assertTrue(result.error.startswith("Exceeded the memory limit"))
+        self.assertLess(result.elapsed, 20)
+        result = run_isolated(allocate, (1024**2,), memory_limit=memory_limit)
+        assert result is not None
+        self.assertEqual(result.value, 1024**2)
+
+    def test_run_isolated(self):
+        result = run_isolated(sleep_or_fail, (30,), timeout=1.0)
+        assert result is not None
+        self.assertTrue(result.timed_out)
+
+        start_time = time.monotonic()
+        result = run_isolated(
+            sleep_or_fail,
+            (30,),
+            canceled=lambda: time.monotonic() - start_time > 1.0,
+        )
+        self.assertIsNone(result)
+        self.assertLess(time.monotonic() - start_time, 10)
+
+
+class TestBatchAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        self.models_dir = tempfile.TemporaryDirectory()
+        self.output_dir = tempfile.TemporaryDirectory()
+        for name in ["resnet18_a.onnx", "resnet18_b.onnx"]:
+            shutil.copy(TEST_ONNX, os.path.join(self.models_dir.name, name))
+
+    def tearDown(self):
+        self.models_dir.cleanup()
+        self.output_dir.cleanup()
+
+    def test_journal_resume_and_global_reports(self):
+        output_dir = self.output_dir.name
+        records = analyze_models(
+            self.models_dir.name, output_dir, use_cache=False, workers=2
+        )
+        self.assertEqual(len(records), 2)
+        self.assertTrue(all(record["status"] == "ok" for record in records.values()))
+
+        journal_path = os.path.join(output_dir, JOURNAL_FILENAME)
+        with open(journal_path, "r", encoding="utf-8") as journal:
+            self.assertEqual(len(journal.readlines()), 2)
+
+        with open(
+            os.path.join(output_dir, "global_model_summary.csv"), encoding="utf-8"
+        ) as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][2:], rows[2][2:])
+
+        with open(
+            os.path.join(output_dir, "global_node_type_counts.csv"), encoding="utf-8"
+        ) as csvfile:
+            node_type_counts = dict(list(csv.reader(csvfile))[1:])
+        with open(
+            os.path.join(output_dir, "resnet18_a_node_type_counts.csv"),
+            encoding="utf-8",
+        ) as csvfile:
+            model_counts = dict(list(csv.reader(csvfile))[1:])
+        for node_type, count in model_counts.items():
+            self.assertEqual(int(node_type_counts[node_type]), 2 * int(count))
+
+        with open(
+            os.path.join(output_dir, "global_node_shape_counts.csv"), encoding="utf-8"
+        ) as csvfile:
+            global_shapes = list(csv.reader(csvfile))
+        with open(
+            os.path.join(output_dir, "resnet18_a_node_shape_counts.csv"),
+            encoding="utf-8",
+        ) as csvfile:
+            model_shapes = list(csv.reader(csvfile))
+        self.assertEqual(
+            [row[:2] for row in global_shapes], [row[:2] for row in model_shapes]
+        )
+
+        # A truncated last line from an interrupted run is ignored
+        with open(journal_path, "a", encoding="utf-8") as journal:
+            journal.write('{"model_file": ')
+
+        # Nothing changed so the rerun only rebuilds the global reports
+        os.remove(os.path.join(output_dir, "global_model_summary.csv"))
+        analyze_models(self.models_dir.name, output_dir, use_cache=False)
+        self.assertEqual(len(read_journal(journal_path)), 2)
+        self.assertTrue(
+            os.path.exists(os.path.join(output_dir, "global_model_summary.csv"))
+        )
+
+        # A changed model file is analyzed again
+        changed_file = os.path.join(self.models_dir.name, "resnet18_b.onnx")
+        stat = os.stat(changed_file)
+        os.utime(changed_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        analyze_models(self.models_dir.name, output_dir, use_cache=False)
+        with open(journal_path, "r", encoding="utf-8") as journal:
+            lines = journal.readlines()
+        self.assertEqual(
+            json.loads(lines[-1])["model_file"], os.path.abspath(changed_file)
+        )
+
+    def test_failed_model_is_recorded(self):
+        broken_file = os.path.join(self.models_dir.name, "broken.onnx")
+        with open(broken_file, "wb") as f:
+            f.write(b"not a model")
+        records = analyze_models(
+            self.models_dir.name, self.output_dir.name, use_cache=False, workers=1
+        )
+        self.assertEqual(records[os.path.abspath(broken_file)]["status"], "error")
+
+        with open(
+            os.path.join(self.output_dir.name, "global_model_summary.csv"),
+            encoding="utf-8",
+        ) as csvfile:
+            self.assertEqual(len(list(csv.reader(csvfile))), 3)
+
+
+    def test_same_file_names_in_subdirectories(self):
+        for subdir in ["a", "b"]:
+            os.makedirs(os.path.join(self.models_dir.name, subdir))
+            shutil.copy(
+                TEST_ONNX, os.path.join(self.models_dir.name, subdir, "model.onnx")
+            )
+        output_dir = self.output_dir.name
+        analyze_models(self.models_dir.name, output_dir, use_cache=False, workers=2)
+
+        for subdir in ["a", "b"]:
+            self.assertTrue(
+                os.path.exists(os.path.join(output_dir, subdir, "model_summary.yaml"))
+            )
+        with open(
+            os.path.join(output_dir, "global_model_summary.csv"), encoding="utf-8"
+        ) as csvfile:
+            models = [row[0] for row in list(csv.reader(csvfile))[1:]]
+        self.assertEqual(
+            sorted(models), ["a/model", "b/model", "resnet18_a", "resnet18_b"]
+        )
+
+    def test_duplicate_models_are_skipped(self):
+        aggregate = GlobalAggregate()
+        model_data = {"opset": 17, "parameters": 1, "flops": 2}
+        aggregate.add_model("model", model_data, {"Conv": 2}, [])
+        aggregate.add_model("model", {**model_data, "flops": 3}, {"Conv": 2}, [])
+        self.assertEqual(aggregate.model_data, {"model": model_data})
+        self.assertEqual(aggregate.node_type_counter["Conv"], 2)
+
+        aggregate.update(aggregate)
+        self.assertEqual(aggregate.node_type_counter["Conv"], 2)
+
+
+class TestShardedAnalysis(unittest.TestCase):
+
+    def make_temp_dir(self) -> str:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        return temp_dir.name
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/8"), (2, 8))
+        for shard in ["0/8", "9/8", "2", "a/b"]:
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+    def test_shards_cover_every_file_once(self):
+        files = [os.path.join("models", f"model_{i}.onnx") for i in range(100)]
+        shards = [shard_files(files, "models", (i, 4)) for i in range(1, 5)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(files))
+        self.assertTrue(all(shard for shard in shards))
+
+    def test_find_partials_of_a_single_run(self):
+        partials_dir = self.make_temp_dir()
+
+        def touch(*names):
+            for name in names:
+                with open(os.path.join(partials_dir, name), "w", encoding="utf-8"):
+                    pass
+
+        touch("global_partial.json", "global_partial.json.tmp")
+        self.assertEqual(
+            find_partials([partials_dir]),
+            [os.path.join(partials_dir, "global_partial.json")],
+        )
+
+        touch(*(f"global_partial_{i}_of_10.json" for i in range(1, 11)))
+        with self.assertRaises(ValueError):
+            find_partials([partials_dir])
+        os.remove(os.path.join(partials_dir, "global_partial.json"))
+        self.assertEqual(
+            find_partials([partials_dir]),
+            [
+                os.path.join(partials_dir, f"global_partial_{i}_of_10.json")
+                for i in range(1, 11)
+            ],
+        )
+
+        # Shards of two different runs, and an incomplete run
+        touch("global_partial_1_of_4.json")
+        with self.assertRaises(ValueError):
+            find_partials([partials_dir])
+        os.remove(os.path.join(partials_dir, "global_partial_10_of_10.json"))
+        for i in range(1, 10):
+            os.remove(os.path.join(partials_dir, f"global_partial_{i}_of_10.json"))
+        with self.assertRaises(ValueError):
+            find_partials([partials_dir])
+
+    def test_merged_partials_match_single_run(self):
+        models_dir, single_dir, shards_dir = (self.make_temp_dir() for _ in range(3))
+        for i in range(4):
+            shutil.copy(TEST_ONNX, os.path.join(models_dir, f"resnet18_{i}.onnx"))
+
+        analyze_models(models_dir, single_dir, use_cache=False)
+        for i in range(1, 3):
+            analyze_models(models_dir, shards_dir, use_cache=False, shard=(i, 2))
+
+        partial_files = find_partials([shards_dir])
+        self.assertEqual(len(partial_files), 2)
+        merged = merge_partials(partial_files)
+        self.assertEqual(len(merged.model_data), 4)
+        merged.save_reports(shards_dir)
+
+        for report in [
+            "global_node_type_counts.csv",
+            "global_node_shape_counts.csv",
+        ]:
+            with open(os.path.join(single_dir, report), encoding="utf-8") as f:
+                expected = f.read()
+            with open(os.path.join(shards_dir, report), encoding="utf-8") as f:
+                self.assertEqual(f.read(), expected)
+
+        with open(
+            os.path.join(single_dir, "global_model_summary.csv"), encoding="utf-8"
+        ) as f:
+            expected_rows = sorted(csv.reader(f))
+        with open(
+            os.path.join(shards_dir, "global_model_summary.csv"), encoding="utf-8"
+        ) as f:
+            self.assertEqual(sorted(csv.reader(f)), expected_rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
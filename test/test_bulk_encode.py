@@ -0,0 +1,89 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+from digest.subgraph_analysis.bulk_encode import (
+    encode_corpus,
+    find_models,
+    load_corpus,
+    remove_from_corpus,
+)
+from digest.subgraph_analysis.similarity_index import (
+    list_corpora,
+    load_similarity_indexes,
+)
+from utils.analysis_cache import CACHE_DIR_ENV_VAR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+class TestBulkEncode(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        env_patch = patch.dict(
+            os.environ, {CACHE_DIR_ENV_VAR: os.path.join(self.temp_dir.name, "cache")}
+        )
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+        self.models_dir = os.path.join(self.temp_dir.name, "models")
+        os.makedirs(os.path.join(self.models_dir, "vision"))
+        shutil.copyfile(TEST_ONNX, os.path.join(self.models_dir, "resnet18.onnx"))
+        shutil.copyfile(
+            TEST_ONNX, os.path.join(self.models_dir, "vision", "resnet18.onnx")
+        )
+
+    def test_add_remove_and_rebuild(self):
+        stats = encode_corpus("internal", self.models_dir)
+        self.assertEqual(stats.encoded, 2)
+        self.assertFalse(stats.failed)
+        self.assertEqual(list_corpora(), ["internal"])
+        index = load_corpus("internal")
+        self.assertEqual(sorted(index.names), ["resnet18", "vision/resnet18"])
+        self.assertEqual(index.description(0)["model_name"], "resnet18")
+
+        # Adding the same directory again does not encode anything
+        stats = encode_corpus("internal", self.models_dir)
+        self.assertEqual((stats.encoded, stats.skipped), (0, 2))
+
+        self.assertEqual(remove_from_corpus("internal", ["vision/resnet18"]), 1)
+        self.assertEqual(load_corpus("internal").names, ["resnet18"])
+
+        stats = encode_corpus("internal", self.models_dir, rebuild=True)
+        self.assertEqual(stats.encoded, 2)
+        self.assertEqual(len(load_corpus("internal").names), 2)
+
+        # The corpora are part of the similarity analysis
+        self.assertTrue(
+            any(
+                "vision/resnet18" in index.names
+                for index in load_similarity_indexes()
+            )
+        )
+
+    def test_zip_archive(self):
+        archive_path = os.path.join(self.temp_dir.name, "models.zip")
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            archive.write(TEST_ONNX, "nested/resnet18.onnx")
+        self.assertEqual(list(find_models(archive_path)), ["nested/resnet18"])
+
+        stats = encode_corpus("archive", archive_path, workers=2)
+        self.assertEqual(stats.encoded, 1)
+        self.assertGreater(stats.models_per_second, 0)
+        directory_stats = encode_corpus("directory", self.models_dir)
+        self.assertEqual(directory_stats.encoded, 2)
+        self.assertEqual(
+            load_corpus("archive").description(0)["op_list"],
+            load_corpus("directory").description(0)["op_list"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import unittest
+from digest.model_class.digest_model import NodeInfo, NodeTable, TensorData, TensorInfo
+from digest.model_class.flops_engine import (
+    count_flops,
+    flops_polynomials,
+    register_flops_formula,
+    summarize_flops,
+    unregister_flops_formula,
+)
+from utils.polynomial import Polynomial
+
+
+def add_node(node_table, name, node_type, inputs, attributes=None):
+    node_info = NodeInfo()
+    node_info.node_type = node_type
+    node_info.inputs = TensorData(
+        (f"{name}_in{i}", TensorInfo("float32", 4, None, shape))
+        for i, shape in enumerate(inputs)
+    )
+    node_info.attributes.update(attributes or {})
+    node_table[name] = node_info
+
+
+def node_flops(node_table, flops_count):
+    return {
+        name: None if missing else int(flops)
+        for name, flops, missing in zip(
+            node_table, flops_count.flops, flops_count.missing
+        )
+    }
+
+
+class TestFlopsEngine(unittest.TestCase):
+
+    def test_formulas(self):
+        node_table = NodeTable()
+        add_node(node_table, "matmul", "MatMul", [[2, 3, 4], [4, 5]])
+        add_node(node_table, "add", "Add", [[2, 3], [3]])
+        add_node(node_table, "gemm", "Gemm", [[4, 8], [6, 8], [6]], {"transB": 1})
+        add_node(node_table, "gemm_no_bias", "Gemm", [[4, 8], [8, 6]])
+        add_node(node_table, "relu", "Relu", [[2, 3]])
+        flops_count = count_flops(node_table)
+        model_flops, node_type_flops = summarize_flops(node_table, flops_count)
+
+        expected = {
+            "matmul": 2 * 24 * 5,
+            "add": 6 + 3,
+            "gemm": 2 * 4 * 8 * 6 + 6,
+            "gemm_no_bias": 2 * 4 * 8 * 6,
+            "relu": None,
+        }
+        self.assertEqual(node_flops(node_table, flops_count), expected)
+        self.assertEqual(model_flops, 240 + 9 + 390 + 384)
+        self.assertEqual(list(node_type_flops), ["MatMul", "Add", "Gemm"])
+
+    def test_dynamic_node_stops_accumulation(self):
+        node_table = NodeTable()
+        add_node(node_table, "add", "Add", [[2, 3], [3]])
+        add_node(node_table, "matmul", "MatMul", [["N", 4], [4, 5]])
+        add_node(node_table, "mul", "Mul", [[2, 3], [3]])
+        flops_count = count_flops(node_table)
+        model_flops, node_type_flops = summarize_flops(node_table, flops_count)
+        self.assertIsNone(model_flops)
+        self.assertEqual(
+            node_flops(node_table, flops_count), {"add": 9, "matmul": None, "mul": 9}
+        )
+        self.assertEqual(node_type_flops, {"Add": 9})
+
+    def test_register_custom_op(self):
+        self.addCleanup(unregister_flops_formula, "Custom")
+
+        @register_flops_formula("Custom")
+        def _custom_flops(batch):
+            x = batch.input(0)
+            batch.invalidate(~x.static)
+            return 3 * x.numel
+
+        node_table = NodeTable()
+        add_node(node_table, "custom", "Custom", [[2, 5]])
+        model_flops, node_type_flops = summarize_flops(
+            node_table, count_flops(node_table)
+        )
+        self.assertEqual(model_flops, 30)
+        self.assertEqual(node_type_flops, {"Custom": 30})
+
+    def test_dynamic_dims(self):
+        node_table = NodeTable()
+        add_node(node_table, "proj", "MatMul", [["N", "S", 8], [8, 8]])
+        add_node(node_table, "scores", "MatMul", [["N", "S", 8], ["N", 8, "S"]])
+        add_node(node_table, "add", "Add", [["N", "S", "S"], [1]])
+        add_node(node_table, "conv", "Conv", [["N", 3, 8, 8], [4, 3, 3, 3]])
+
+        model_flops, node_type_flops = summarize_flops(
+            node_table, count_flops(node_table, {"N": 2, "S": 5})
+        )
+        self.assertEqual(node_type_flops, {"MatMul": 2080, "Add": 51, "Conv": 15552})
+        self.assertEqual(model_flops, 2080 + 51 + 15552)
+
+        polynomials = flops_polynomials(node_table, ["N", "S"])
+        assert polynomials is not None
+        n, s = Polynomial.symbol("N"), Polynomial.symbol("S")
+        self.assertEqual(
+            polynomials[1],
+            {
+                "MatMul": 128 * n * s + 16 * n * s * s,
+                "Add": n * s * s + 1,
+                "Conv": 7776 * n,
+            },
+        )
+        self.assertEqual(polynomials[0].evaluate({"N": 2, "S": 5}), model_flops)
+        self.assertEqual(str(polynomials[0]), "17*N*S^2 + 128*N*S + 7776*N + 1")
+
+    def test_dynamic_dims_not_polynomial(self):
+        # The output size of a strided Conv rounds down, the FLOPs can only be
+        # counted for given values of the dims
+        node_table = NodeTable()
+        add_node(
+            node_table,
+            "conv",
+            "Conv",
+            [[1, 3, "H", 8], [4, 3, 3, 3]],
+            {"strides": [2, 2]},
+        )
+        self.assertIsNone(flops_polynomials(node_table, ["H"]))
+        model_flops, _ = summarize_flops(node_table, count_flops(node_table, {"H": 9}))
+        self.assertEqual(model_flops, 2 * 27 * (4 * 4 * 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import onnx
+from digest import folder_scanner
+from digest.folder_scanner import FolderScanThread, iter_model_files
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+TEST_REPORT = os.path.join(TEST_DIR, "resnet18_reports", "resnet18_report.yaml")
+
+
+class TestFolderScan(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.root = self.temp_dir.name
+
+        os.makedirs(os.path.join(self.root, "copies"))
+        os.makedirs(os.path.join(self.root, ".hidden"))
+        shutil.copy(TEST_ONNX, os.path.join(self.root, "a.onnx"))
+        shutil.copy(TEST_ONNX, os.path.join(self.root, "copies", "b.onnx"))
+        shutil.copy(TEST_ONNX, os.path.join(self.root, ".hidden", "c.onnx"))
+
+        # Same graph as a.onnx with different weights
+        model = onnx.load(TEST_ONNX)
+        weights = model.graph.initializer[0]
+        weights.raw_data = bytes(len(weights.raw_data))
+        onnx.save(model, os.path.join(self.root, "copies", "retrained.onnx"))
+
+        shutil.copy(TEST_REPORT, os.path.join(self.root, "report.yaml"))
+        shutil.copy(TEST_REPORT, os.path.join(self.root, "copies", "report.yaml"))
+        with open(
+            os.path.join(self.root, "config.yaml"), "w", encoding="utf-8"
+        ) as config:
+            config.write("batch_size: 8\n")
+
+    def path(self, *names: str) -> str:
+        return os.path.normpath(os.path.join(self.root, *names))
+
+    def test_iter_model_files(self):
+        self.assertEqual(
+            list(iter_model_files(self.root)),
+            [
+                self.path("a.onnx"),
+                self.path("config.yaml"),
+                self.path("report.yaml"),
+                self.path("copies", "b.onnx"),
+                self.path("copies", "report.yaml"),
+                self.path("copies", "retrained.onnx"),
+            ],
+        )
+
+    def test_scan(self):
+        scan = FolderScanThread(self.root, num_workers=2)
+        found, duplicates, completed = [], [], []
+        scan.model_found.connect(found.append)
+        scan.duplicate_found.connect(lambda path, dupe: duplicates.append((path, dupe)))
+        scan.completed.connect(completed.append)
+        # The scan is run on the test thread so that the signals are delivered
+        # directly
+        scan.run()
+
+        self.assertEqual(completed, [True])
+        self.assertCountEqual(
+            found,
+            [
+                self.path("a.onnx"),
+                self.path("report.yaml"),
+                self.path("copies", "retrained.onnx"),
+            ],
+        )
+        self.assertCountEqual(
+            duplicates,
+            [
+                (self.path("a.onnx"), self.path("copies", "b.onnx")),
+                (self.path("report.yaml"), self.path("copies", "report.yaml")),
+            ],
+        )
+        # Only the models sharing a graph fingerprint are hashed
+        self.assertCountEqual(
+            scan.content_hashes,
+            [
+                self.path("a.onnx"),
+                self.path("copies", "b.onnx"),
+                self.path("copies", "retrained.onnx"),
+            ],
+        )
+
+    def test_scan_ignoring_metadata(self):
+        model = onnx.load(TEST_ONNX)
+        model.producer_version = "0.0.0"
+        for index, node in enumerate(model.graph.node):
+            node.name = f"node_{index}"
+        onnx.save(model, os.path.join(self.root, "reexported.onnx"))
+
+        for ignore_metadata, expected_duplicates in ((False, 1), (True, 2)):
+            scan = FolderScanThread(self.root, ignore_metadata=ignore_metadata)
+            duplicates = []
+            scan.duplicate_found.connect(
+                lambda path, dupe: duplicates.append((path, dupe))
+            )
+            scan.run()
+            onnx_duplicates = [
+                dupe for path, dupe in duplicates if dupe.endswith(".onnx")
+            ]
+            self.assertEqual(len(onnx_duplicates), expected_duplicates)
+            self.assertEqual(
+                ignore_metadata, self.path("reexported.onnx") in onnx_duplicates
+            )
+
+    def test_canceled_scan(self):
+        scan = FolderScanThread(self.root)
+        found, completed = [], []
+        scan.model_found.connect(found.append)
+        scan.completed.connect(completed.append)
+        scan.stop_scanning()
+        scan.run()
+
+        self.assertEqual(completed, [False])
+        self.assertEqual(found, [])
+
+    def test_cancel_during_probe(self):
+        probing, release = threading.Event(), threading.Event()
+
+        def stuck_probe(filepath, ignore_metadata):
+            probing.set()
+            release.wait()
+            return folder_scanner.probe_model_file(filepath, ignore_metadata)
+
+        scan = FolderScanThread(self.root, num_workers=1)
+        self.addCleanup(release.set)
+        with patch.object(folder_scanner, "probe_model_file", stuck_probe):
+            scan_thread = threading.Thread(target=scan.run)
+            scan_thread.start()
+            self.assertTrue(probing.wait(10))
+            start = time.monotonic()
+            scan.stop_scanning()
+            # The scan returns while the probe is still running
+            scan_thread.join(10)
+            self.assertFalse(scan_thread.is_alive())
+            self.assertLess(time.monotonic() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import unittest
+import numpy as np
+import onnx
+from onnx import helper, TensorProto
+from digest.subgraph_analysis.model_encode import remove_node
+from utils.graph_ir import GraphIR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+def make_quantized_model():
+    nodes = [
+        helper.make_node("QuantizeLinear", ["x", "s", "z"], ["xq"], name="q"),
+        helper.make_node("DequantizeLinear", ["xq", "s", "z"], ["xd"], name="dq"),
+        helper.make_node("Relu", ["xd"], ["r"], name="relu"),
+        helper.make_node("Add", ["r", "xd"], ["y"], name="add"),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "quantized",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, [1, 4])],
+        [helper.make_tensor_value_info("y", TensorProto.FLOAT, [1, 4])],
+        [
+            helper.make_tensor("s", TensorProto.FLOAT, [], [1.0]),
+            helper.make_tensor("z", TensorProto.INT8, [], [0]),
+        ],
+    )
+    return helper.make_model(graph)
+
+
+class TestGraphIR(unittest.TestCase):
+
+    def test_matches_node_lists(self):
+        graph = onnx.load(TEST_ONNX, load_external_data=False).graph
+        graph_ir = GraphIR(graph)
+        self.assertEqual(graph_ir.num_nodes, len(graph.node))
+        initializer_names = {tensor.name for tensor in graph.initializer}
+        for node_id, node in enumerate(graph.node):
+            self.assertEqual(graph_ir.input_names(node_id), list(node.input))
+            self.assertEqual(graph_ir.output_names(node_id), list(node.output))
+            for value_id in graph_ir.node_inputs(node_id).tolist():
+                self.assertIn(node_id, graph_ir.consumers(value_id).tolist())
+                self.assertEqual(
+                    graph_ir.is_initializer[value_id],
+                    graph_ir.value_names[value_id] in initializer_names,
+                )
+            for value_id in graph_ir.node_outputs(node_id).tolist():
+                self.assertEqual(graph_ir.producers[value_id], node_id)
+        for value_id in graph_ir.graph_input_ids.tolist():
+            self.assertEqual(graph_ir.producers[value_id], -1)
+
+    def test_consumers_once_per_input_slot(self):
+        graph_ir = GraphIR(make_quantized_model().graph)
+        xd = graph_ir.value_ids["xd"]
+        self.assertEqual(graph_ir.consumers(xd).tolist(), [2, 3])
+        s = graph_ir.value_ids["s"]
+        self.assertEqual(graph_ir.consumers(s).tolist(), [0, 1])
+        self.assertTrue(graph_ir.is_initializer[s])
+        self.assertTrue(np.all(graph_ir.producers[graph_ir.graph_input_ids] == -1))
+
+    def test_remove_chained_quantize_nodes(self):
+        model = make_quantized_model()
+        remove_node(model, "DequantizeLinear")
+        remove_node(model, "QuantizeLinear")
+        self.assertEqual([node.name for node in model.graph.node], ["relu", "add"])
+        self.assertEqual(list(model.graph.node[0].input), ["x"])
+        self.assertEqual(list(model.graph.node[1].input), ["r", "x"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 # Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
 
 import os
+import shutil
 import sys
 import tempfile
 import unittest
@@ -13,7 +14,9 @@ from PySide6.QtWidgets import QApplication
 
 from huggingface_hub.hf_api import ModelInfo
 import digest.main
+import digest.multi_model_selection_page
 from digest.node_summary import NodeSummary
+from digest.model_workers import LoadDigestOnnxModelWorker
 
 
 class DigestGuiTest(unittest.TestCase):
@@ -139,6 +142,95 @@ class DigestGuiTest(unittest.TestCase):
                 "No new tab should be added for invalid file",
             )
 
+    def test_multi_model_folder_scan(self):
+        """Test scanning a folder for models on the multi-model page."""
+        page = self.digest_app.multimodelselection_page
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for name in ("a.onnx", "b.onnx"):
+                shutil.copy(self.ONNX_FILEPATH, os.path.join(tmpdirname, name))
+            shutil.copy(self.YAML_FILEPATH, tmpdirname)
+
+            page.set_directory(tmpdirname)
+            self.assertTrue(
+                page.scan_thread.wait(self.THREAD_TIMEOUT),
+                "Folder scan did not complete within timeout",
+            )
+            # Deliver the rows queued by the scan thread
+            QApplication.processEvents()
+
+            self.assertEqual(page.item_model.rowCount(), 2)
+            self.assertEqual(len(page.model_dict), 2)
+            self.assertEqual(page.num_duplicates, 1)
+            self.assertEqual(page.ui.duplicateListWidget.count(), 2)
+            page.stop_scan()
+
+    def test_multi_model_analysis(self):
+        """Test analyzing models in parallel for the multi-model analysis."""
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            model_dict = {self.YAML_FILEPATH: None}
+            for name in ("a.onnx", "b.onnx"):
+                shutil.copy(self.ONNX_FILEPATH, os.path.join(tmpdirname, name))
+                model_dict[os.path.join(tmpdirname, name)] = None
+
+            analysis_thread = digest.multi_model_selection_page.AnalysisThread(
+                num_workers=2
+            )
+            analysis_thread.model_dict = model_dict
+            analyzed, completed = [], []
+            analysis_thread.model_analyzed.connect(
+                lambda filepath, _: analyzed.append(filepath)
+            )
+            analysis_thread.completed.connect(completed.append)
+            # Run on the test thread so that the signals are delivered directly
+            analysis_thread.run()
+
+            self.assertCountEqual(analyzed, model_dict)
+            self.assertEqual(len(completed), 1)
+            self.assertEqual(
+                sorted(model.model_name for model in completed[0]),
+                ["a", "b", "resnet18"],
+            )
+
+    def test_isolated_model_load(self):
+        """Test loading a model in a separate process."""
+        worker = LoadDigestOnnxModelWorker(
+            self.ONNX_FILEPATH,
+            self.MODEL_BASENAME,
+            isolated=True,
+            timeout=60,
+            memory_limit=8 * 1024**3,
+        )
+        completed, failed = [], []
+        worker.signals.completed.connect(completed.append)
+        worker.signals.failed.connect(failed.append)
+        # Run on the test thread so that the signals are delivered directly
+        worker.run()
+
+        self.assertEqual(failed, [])
+        self.assertEqual(len(completed), 1)
+        self.assertEqual(completed[0].model_name, self.MODEL_BASENAME)
+        # The proto is memory mapped from the file in this process
+        self.assertEqual(
+            len(completed[0].model_proto.graph.node), len(completed[0].node_data)
+        )
+
+    def test_concurrent_model_loads(self):
+        """Test that a load finishing first does not cancel an isolated load."""
+        self.digest_app.model_loading_config = {"isolated": True, "timeout_seconds": 60}
+        loaded = []
+        self.digest_app.model_loaded.connect(lambda: loaded.append(True))
+        self.digest_app.load_model(self.ONNX_FILEPATH)
+        self.digest_app.load_model(self.YAML_FILEPATH)
+        for _ in range(2):
+            if len(loaded) < 2:
+                self._wait_for_signal(self.digest_app.model_loaded, 60000)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(
+            self.digest_app.ui.tabWidget.count(), self.initial_tab_count + 2
+        )
+        # Let the similarity analysis finish before the next test
+        self.digest_app.thread_pool.waitForDone(60000)
+
     def test_save_reports(self):
         """Test saving reports after loading a model."""
         with patch(
@@ -0,0 +1,40 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+from utils.analysis_cache import CACHE_DIR_ENV_VAR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+ANALYZE_SCRIPT = """
+import sys
+from digest.analyze import main
+main()
+qt_modules = [name for name in sys.modules if name.startswith("PySide6")]
+assert not qt_modules, f"Qt was imported: {qt_modules}"
+"""
+
+
+class TestHeadless(unittest.TestCase):
+
+    def test_analyze_without_qt(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(os.environ, **{CACHE_DIR_ENV_VAR: tmpdir})
+            subprocess.run(
+                [sys.executable, "-c", ANALYZE_SCRIPT, TEST_ONNX, tmpdir],
+                check=True,
+                env=env,
+                capture_output=True,
+            )
+            self.assertTrue(
+                os.path.exists(os.path.join(tmpdir, "resnet18_summary.yaml"))
+            )
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "resnet18_nodes.csv")))
+
+
+if __name__ == "__main__":
+    unittest.main()
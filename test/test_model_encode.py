@@ -0,0 +1,106 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import onnx
+import networkx as nx
+from digest.subgraph_analysis.model_encode import (
+    GraphConverter,
+    WeisfeilerLehmanMachine,
+    encode_model,
+    extract_wl_features,
+)
+from digest.subgraph_analysis.find_match import find_match
+from digest.subgraph_analysis.similarity_index import get_encodings_dir
+from utils.analysis_cache import CACHE_DIR_ENV_VAR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+def reference_wl_features(edges, features, rounds):
+    graph = nx.from_edgelist(edges)
+    return WeisfeilerLehmanMachine(graph, dict(features), rounds).extracted_features
+
+
+class TestWLFeatures(unittest.TestCase):
+
+    def test_matches_networkx_machine_on_random_graphs(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            num_nodes = rng.randint(1, 30)
+            features = {
+                i: rng.choice(["Conv", "Relu", "Add", "MatMul"])
+                for i in range(num_nodes)
+            }
+            # Duplicate edges, self loops and isolated nodes included
+            edges = [
+                [rng.randrange(num_nodes), rng.randrange(num_nodes)]
+                for _ in range(rng.randint(0, 60))
+            ]
+            for rounds in range(4):
+                self.assertEqual(
+                    extract_wl_features(edges, features, rounds),
+                    reference_wl_features(edges, features, rounds),
+                )
+
+    def test_matches_networkx_machine_on_model(self):
+        converter = GraphConverter()
+        converter.onnx_to_json(onnx.load(TEST_ONNX), skip_input_edge_check=True)
+        for rounds in range(1, 4):
+            self.assertEqual(
+                extract_wl_features(converter.edges, converter.features, rounds),
+                reference_wl_features(converter.edges, converter.features, rounds),
+            )
+
+
+class TestEncodingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        env_patch = patch.dict(
+            os.environ, {CACHE_DIR_ENV_VAR: os.path.join(self.temp_dir.name, "cache")}
+        )
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_reopened_model_is_not_encoded_again(self):
+        name_list, _, _ = find_match(TEST_ONNX)
+        self.assertIn("resnet18", name_list)
+
+        # A copy of the model under another name reuses the same encoding
+        copy_path = os.path.join(self.temp_dir.name, "copy.onnx")
+        shutil.copyfile(TEST_ONNX, copy_path)
+        with patch(
+            "digest.subgraph_analysis.find_match.encode_model"
+        ) as mock_encode_model:
+            find_match(copy_path)
+            mock_encode_model.assert_not_called()
+
+    def test_models_with_the_same_name_do_not_collide(self):
+        find_match(TEST_ONNX)
+
+        other_dir = os.path.join(self.temp_dir.name, "other")
+        os.makedirs(other_dir)
+        model = onnx.load(TEST_ONNX)
+        model.graph.node.pop()
+        other_path = os.path.join(other_dir, "resnet18.onnx")
+        onnx.save(model, other_path)
+        with patch(
+            "digest.subgraph_analysis.find_match.encode_model",
+            wraps=encode_model,
+        ) as mock_encode_model:
+            find_match(other_path)
+            mock_encode_model.assert_called_once()
+
+        encodings = os.listdir(get_encodings_dir())
+        self.assertEqual(len([name for name in encodings if name.endswith(".json")]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
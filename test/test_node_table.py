@@ -0,0 +1,114 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import unittest
+import numpy as np
+from digest.model_class.digest_model import NodeInfo, NodeTable, TensorData, TensorInfo
+from digest.model_class.digest_onnx_model import DigestOnnxModel
+import utils.onnx_utils as onnx_utils
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+def make_node(node_type, flops, inputs, outputs):
+    node_info = NodeInfo()
+    node_info.node_type = node_type
+    node_info.flops = flops
+    node_info.inputs = TensorData(inputs)
+    node_info.outputs = TensorData(outputs)
+    return node_info
+
+
+class TestNodeTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tensor_x = TensorInfo("float32", 4, 0.0, [1, 8])
+        self.tensor_y = TensorInfo("float32", 4, 0.0, [1, 8])
+        self.table = NodeTable()
+        self.table["relu"] = make_node(
+            "Relu", 8, [("x", self.tensor_x)], [("y", self.tensor_y)]
+        )
+        self.table["add"] = make_node(
+            "Add",
+            None,
+            [("y", self.tensor_y), ("x", self.tensor_x)],
+            [("z", self.tensor_y)],
+        )
+
+    def test_mapping_behavior(self):
+        self.assertEqual(list(self.table), ["relu", "add"])
+        self.assertIn("add", self.table)
+        node = self.table["add"]
+        self.assertEqual(node.node_type, "Add")
+        self.assertIsNone(node.flops)
+        self.assertEqual(list(node.inputs), ["y", "x"])
+        self.assertIs(node.get_input(1), self.tensor_x)
+        with self.assertRaises(IndexError):
+            node.get_input(2)
+
+        # Writes through the view land in the columns
+        node.flops = 16
+        self.assertEqual(self.table["add"].flops, 16)
+
+        # Reassigning a name keeps its position like an OrderedDict
+        self.table["relu"] = make_node("Relu", 4, [("x", self.tensor_x)], [])
+        self.assertEqual(list(self.table), ["relu", "add"])
+        self.assertEqual(self.table["relu"].flops, 4)
+        self.assertEqual(len(self.table["relu"].outputs), 0)
+
+        # The same tensor is stored once
+        self.assertEqual(len(self.table.tensors_to_pandas()), 3)
+
+    def test_tensor_data_writes_through(self):
+        tensor_w = TensorInfo("float16", 2, 0.0, [1, 8])
+        self.table["add"].inputs["w"] = tensor_w
+        self.assertEqual(list(self.table["add"].inputs), ["y", "x", "w"])
+        self.assertIs(self.table["add"].get_input(2), tensor_w)
+
+        self.assertIs(self.table["add"].inputs.pop("y"), self.tensor_y)
+        del self.table["add"].outputs["z"]
+        self.table["relu"].outputs.update([("w", tensor_w)])
+        self.assertEqual(list(self.table["add"].inputs), ["x", "w"])
+        self.assertEqual(len(self.table["add"].outputs), 0)
+        self.assertEqual(list(self.table["relu"].outputs), ["y", "w"])
+
+        # Copies do not change the table
+        inputs = TensorData(self.table["relu"].inputs)
+        inputs.clear()
+        self.assertEqual(list(self.table["relu"].inputs), ["x"])
+
+    def test_to_pandas(self):
+        df = self.table.to_pandas()
+        self.assertEqual(list(df["node_type"]), ["Relu", "Add"])
+        self.assertEqual(df["flops"].isna().tolist(), [False, True])
+        self.assertTrue(
+            np.shares_memory(df["parameters"].to_numpy(), self.table.parameters)
+        )
+
+    def test_matches_onnx_model(self):
+        model = DigestOnnxModel(
+            onnx_utils.load_onnx(TEST_ONNX, False),
+            onnx_filepath=TEST_ONNX,
+            save_proto=False,
+        )
+        df = model.node_data.to_pandas()
+        self.assertEqual(len(df), len(model.node_data))
+        self.assertEqual(int(df["flops"].sum()), model.flops)
+        self.assertEqual(int(df["parameters"].sum()), model.parameters)
+        for node_type, count in model.node_type_counts.items():
+            self.assertEqual(int((df["node_type"] == node_type).sum()), count)
+
+    def test_tensor_infos_are_shared(self):
+        model = DigestOnnxModel(
+            onnx_utils.load_onnx(TEST_ONNX, False),
+            onnx_filepath=TEST_ONNX,
+            save_proto=False,
+        )
+        conv_output = model.node_data["/conv1/Conv"].get_output(0)
+        self.assertIs(model.node_data["/relu/Relu"].get_input(0), conv_output)
+        self.assertEqual(conv_output.shape, [1, 64, 112, 112])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,17 @@ import os
 import unittest
 import tempfile
 import csv
+from unittest.mock import patch
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+import yaml
 import utils.onnx_utils as onnx_utils
 from digest.model_class.digest_onnx_model import DigestOnnxModel
-from digest.model_class.digest_report_model import compare_yaml_files
+from digest.model_class.digest_report_model import (
+    compare_yaml_files,
+    report_fingerprint,
+)
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
@@ -80,6 +88,247 @@ class TestDigestReports(unittest.TestCase):
             with self.subTest("Testing nodes csv file"):
                 self.compare_csv_files(TEST_NODES_CSV_REPORT, nodes_filepath)
 
+    def test_staged_pipeline(self):
+        model_name = os.path.splitext(os.path.basename(TEST_ONNX))[0]
+        with patch(
+            "utils.onnx_utils.optimize_onnx_model",
+            wraps=onnx_utils.optimize_onnx_model,
+        ) as mock_optimize:
+            staged_model = onnx_utils.load_stage(TEST_ONNX)
+            staged_model = onnx_utils.optimize_stage(staged_model)
+            self.assertEqual(staged_model.stage, onnx_utils.ModelStage.OPTIMIZED)
+            digest_model = DigestOnnxModel(
+                staged_model,
+                onnx_filepath=TEST_ONNX,
+                model_name=model_name,
+                save_proto=False,
+            )
+            # The digest model must pick up from the shape inference stage
+            self.assertEqual(mock_optimize.call_count, 1)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            nodes_filepath = os.path.join(tmpdir, f"{model_name}_nodes.csv")
+            digest_model.save_nodes_csv_report(nodes_filepath)
+            self.compare_csv_files(TEST_NODES_CSV_REPORT, nodes_filepath)
+
+    def test_lazy_loading(self):
+        lazy_proto = onnx_utils.load_onnx_lazy(TEST_ONNX)
+        full_proto = onnx_utils.load_onnx(TEST_ONNX)
+        self.assertLess(lazy_proto.ByteSize(), full_proto.ByteSize() // 100)
+        self.assertEqual(lazy_proto.graph.node, full_proto.graph.node)
+
+        onnx_utils.load_external_data(lazy_proto, TEST_ONNX)
+        for lazy_tensor, full_tensor in zip(
+            lazy_proto.graph.initializer, full_proto.graph.initializer
+        ):
+            self.assertTrue(
+                np.array_equal(
+                    numpy_helper.to_array(lazy_tensor),
+                    numpy_helper.to_array(full_tensor),
+                )
+            )
+
+    def test_optimized_weights(self):
+        model_proto = onnx_utils.load_onnx(TEST_ONNX, load_external_data=False)
+        opt_model, optimized = onnx_utils.optimize_onnx_model(model_proto)
+        self.assertTrue(optimized)
+        opt_weights = {}
+        for tensor in opt_model.graph.initializer:
+            self.assertNotEqual(tensor.data_location, onnx.TensorProto.EXTERNAL)
+            opt_weights[tensor.name] = numpy_helper.to_array(tensor)
+
+        staged_model = onnx_utils.optimize_stage(onnx_utils.load_stage(TEST_ONNX))
+        staged_model = onnx_utils.infer_shapes_stage(staged_model)
+        workdir = staged_model.workdir.name
+        staged_model.load_external_data()
+        for tensor in staged_model.model_proto.graph.initializer:
+            self.assertTrue(
+                np.array_equal(numpy_helper.to_array(tensor), opt_weights[tensor.name])
+            )
+
+        # The optimized model is removed with the last stage that references it
+        del staged_model
+        self.assertFalse(os.path.exists(workdir))
+
+    def test_probe(self):
+        probe = onnx_utils.probe_onnx(TEST_ONNX)
+        model = onnx_utils.load_onnx(TEST_ONNX, load_external_data=False)
+        self.assertEqual(probe.ir_version, model.ir_version)
+        self.assertEqual(probe.producer_name, model.producer_name)
+        self.assertEqual(probe.opset, onnx_utils.get_opset(model))
+        self.assertEqual(probe.node_count, len(model.graph.node))
+        self.assertEqual(probe.initializer_count, len(model.graph.initializer))
+        self.assertEqual(probe.inputs, onnx_utils.get_model_input_shapes_types(model))
+        self.assertEqual(probe.outputs, onnx_utils.get_model_output_shapes_types(model))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Changing a weight keeps the graph fingerprint
+            weights = numpy_helper.to_array(model.graph.initializer[0]).copy()
+            weights.flat[0] += 1.0
+            model.graph.initializer[0].CopyFrom(
+                numpy_helper.from_array(weights, model.graph.initializer[0].name)
+            )
+            new_weights_path = os.path.join(tmpdir, "new_weights.onnx")
+            onnx.save(model, new_weights_path)
+            self.assertEqual(
+                onnx_utils.probe_onnx(new_weights_path).graph_fingerprint,
+                probe.graph_fingerprint,
+            )
+
+            model.graph.node[0].name = "renamed"
+            new_graph_path = os.path.join(tmpdir, "new_graph.onnx")
+            onnx.save(model, new_graph_path)
+            self.assertNotEqual(
+                onnx_utils.probe_onnx(new_graph_path).graph_fingerprint,
+                probe.graph_fingerprint,
+            )
+
+    def test_canonical_hash(self):
+        model = onnx_utils.load_onnx(TEST_ONNX, load_external_data=False)
+        canonical_hash = onnx_utils.hash_onnx_canonical(TEST_ONNX)
+        probe = onnx_utils.probe_onnx(TEST_ONNX)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # The metadata and the node names are not part of the canonical hash
+            model.producer_version = "0.0.0"
+            model.doc_string = "Exported again"
+            model.graph.name = "renamed_graph"
+            for index, node in enumerate(model.graph.node):
+                node.name = f"node_{index}"
+            metadata_path = os.path.join(tmpdir, "metadata.onnx")
+            onnx.save(model, metadata_path)
+            self.assertNotEqual(onnx_utils.hash_file(metadata_path), canonical_hash)
+            self.assertEqual(
+                onnx_utils.hash_onnx_canonical(metadata_path), canonical_hash
+            )
+            metadata_probe = onnx_utils.probe_onnx(metadata_path)
+            self.assertNotEqual(
+                metadata_probe.graph_fingerprint, probe.graph_fingerprint
+            )
+            self.assertEqual(
+                metadata_probe.canonical_fingerprint, probe.canonical_fingerprint
+            )
+
+            # The weights are part of the canonical hash, but not of the fingerprint
+            weights = numpy_helper.to_array(model.graph.initializer[0]).copy()
+            weights.flat[0] += 1.0
+            model.graph.initializer[0].CopyFrom(
+                numpy_helper.from_array(weights, model.graph.initializer[0].name)
+            )
+            weights_path = os.path.join(tmpdir, "weights.onnx")
+            onnx.save(model, weights_path)
+            self.assertNotEqual(
+                onnx_utils.hash_onnx_canonical(weights_path), canonical_hash
+            )
+            self.assertEqual(
+                onnx_utils.probe_onnx(weights_path).canonical_fingerprint,
+                probe.canonical_fingerprint,
+            )
+
+            # Changing an operator changes both
+            model.graph.node[0].op_type = "Identity"
+            op_path = os.path.join(tmpdir, "op.onnx")
+            onnx.save(model, op_path)
+            self.assertNotEqual(
+                onnx_utils.probe_onnx(op_path).canonical_fingerprint,
+                probe.canonical_fingerprint,
+            )
+
+    def test_report_fingerprint(self):
+        with open(TEST_SUMMARY_YAML_REPORT, "r", encoding="utf-8") as yaml_file:
+            report = yaml.safe_load(yaml_file)
+        fingerprint = report_fingerprint(TEST_SUMMARY_YAML_REPORT)
+        self.assertEqual(report_fingerprint(report), fingerprint)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # The report of the same model made again on another day
+            report["report_date"] = "January 1, 2030"
+            report["model_file"] = "/another/path/resnet18.onnx"
+            report["digest_version"] = "0.0.0"
+            same_path = os.path.join(tmpdir, "same.yaml")
+            with open(same_path, "w", encoding="utf-8") as yaml_file:
+                yaml.dump(report, yaml_file, sort_keys=False)
+            self.assertEqual(report_fingerprint(same_path), fingerprint)
+            self.assertFalse(compare_yaml_files(TEST_SUMMARY_YAML_REPORT, same_path))
+            self.assertTrue(
+                compare_yaml_files(
+                    TEST_SUMMARY_YAML_REPORT,
+                    same_path,
+                    skip_keys=["report_date", "model_file", "digest_version"],
+                )
+            )
+
+            report["flops"] += 1
+            self.assertNotEqual(report_fingerprint(report), fingerprint)
+
+        # The skipped keys are removed inside lists too, and the key types are kept
+        self.assertEqual(
+            report_fingerprint({"models": [{"report_date": "today", "flops": 1}]}),
+            report_fingerprint({"models": [{"report_date": "tomorrow", "flops": 1}]}),
+        )
+        self.assertNotEqual(
+            report_fingerprint({1: "x"}), report_fingerprint({"1": "x"})
+        )
+        self.assertNotEqual(
+            report_fingerprint({"a": [1, 2]}), report_fingerprint({"a": [2, 1]})
+        )
+
+    def test_dynamic_dims(self):
+        model = onnx_utils.load_onnx(TEST_ONNX)
+        static_model = DigestOnnxModel(model, save_proto=False)
+        for tensor in [*model.graph.input, *model.graph.output]:
+            tensor.type.tensor_type.shape.dim[0].dim_param = "batch"
+        dynamic_model = DigestOnnxModel(model, save_proto=False)
+
+        self.assertIsNone(dynamic_model.flops)
+        assert dynamic_model.flops_expression is not None
+        self.assertEqual(dynamic_model.flops_expression.symbols, ["batch"])
+        for batch in [1, 4]:
+            # The bias of the final Gemm is counted once for the whole batch
+            evaluation = dynamic_model.evaluate_dynamic_dims({"batch": batch})
+            self.assertEqual(
+                evaluation.flops, batch * static_model.flops - (batch - 1) * 1000
+            )
+            self.assertEqual(
+                evaluation.model_inputs["input.1"].size_kbytes,
+                batch * static_model.model_inputs["input.1"].size_kbytes,
+            )
+        evaluation = dynamic_model.evaluate_dynamic_dims({"batch": 1})
+        self.assertEqual(evaluation.node_type_flops, static_model.node_type_flops)
+        self.assertEqual(
+            dynamic_model.activation_bytes_expression.evaluate({"batch": 1}),
+            static_model.activation_bytes_expression.evaluate({}),
+        )
+        with self.assertRaises(ValueError):
+            dynamic_model.evaluate_dynamic_dims({})
+
+    def test_dynamic_spatial_dims(self):
+        def patch_embedding(height, width):
+            # The patch embedding of a ViT, a Conv whose stride is its kernel size
+            weights = np.zeros((8, 3, 16, 16), dtype=np.float32)
+            graph = helper.make_graph(
+                [helper.make_node("Conv", ["x", "w"], ["y"], strides=[16, 16])],
+                "patch_embedding",
+                [
+                    helper.make_tensor_value_info(
+                        "x", TensorProto.FLOAT, [1, 3, height, width]
+                    )
+                ],
+                [helper.make_tensor_value_info("y", TensorProto.FLOAT, None)],
+                [numpy_helper.from_array(weights, "w")],
+            )
+            return DigestOnnxModel(helper.make_model(graph), save_proto=False)
+
+        static_model = patch_embedding(224, 224)
+        dynamic_model = patch_embedding("H", "W")
+        self.assertEqual(static_model.flops, 2 * 3 * 16 * 16 * 8 * 14 * 14)
+        # The output size is a floor of the input size, not a polynomial
+        self.assertIsNone(dynamic_model.flops_expression)
+        evaluation = dynamic_model.evaluate_dynamic_dims({"H": 224, "W": 224})
+        self.assertEqual(evaluation.flops, static_model.flops)
+        evaluation = dynamic_model.evaluate_dynamic_dims({"H": 8, "W": 224})
+        self.assertIsNone(evaluation.flops)
+
 
 if __name__ == "__main__":
     unittest.main()
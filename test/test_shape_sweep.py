@@ -0,0 +1,77 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import copy
+import unittest
+from unittest.mock import patch
+import utils.onnx_utils as onnx_utils
+from digest.model_class.digest_onnx_model import DigestOnnxModel
+from digest.model_class import shape_sweep
+from digest.model_class.shape_sweep import (
+    dim_grid,
+    parse_dim_grid,
+    parse_dim_range,
+    sweep_shapes,
+)
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+
+class TestShapeSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        model = onnx_utils.load_onnx(TEST_ONNX)
+        for tensor in [*model.graph.input, *model.graph.output]:
+            tensor.type.tensor_type.shape.dim[0].dim_param = "batch"
+        cls.digest_model = DigestOnnxModel(model, save_proto=False)
+
+    def test_parse_dims(self):
+        self.assertEqual(parse_dim_range("1,2,4"), [1, 2, 4])
+        self.assertEqual(parse_dim_range("128:512:128"), [128, 256, 384, 512])
+        self.assertEqual(parse_dim_range("1:64:*2"), [1, 2, 4, 8, 16, 32, 64])
+        self.assertEqual(
+            dim_grid(parse_dim_grid(["batch=1,2", "seq=8:16:*2"])),
+            [
+                {"batch": 1, "seq": 8},
+                {"batch": 1, "seq": 16},
+                {"batch": 2, "seq": 8},
+                {"batch": 2, "seq": 16},
+            ],
+        )
+        with self.assertRaises(ValueError):
+            parse_dim_range("1:64:*1")
+        with self.assertRaises(ValueError):
+            parse_dim_grid(["1,2"])
+
+    def test_sweep(self):
+        points = dim_grid({"batch": [1, 2, 4]})
+        table = sweep_shapes(self.digest_model, points)
+        self.assertEqual(table["batch"].tolist(), [1, 2, 4])
+        for row, point in zip(table.itertuples(index=False), points):
+            evaluation = self.digest_model.evaluate_dynamic_dims(point)
+            self.assertEqual(row.FLOPs, evaluation.flops)
+            self.assertEqual(row.Parameters, self.digest_model.parameters)
+        self.assertEqual(
+            table["Input Size (KB)"].tolist(), [588.0 * batch for batch in [1, 2, 4]]
+        )
+
+    def test_sweep_in_worker_processes(self):
+        # Without the FLOPs expression every point is counted by the workers
+        digest_model = copy.copy(self.digest_model)
+        digest_model.flops_expression = None
+        points = dim_grid({"batch": [1, 2, 3, 4]})
+        with patch.object(shape_sweep, "MIN_PARALLEL_POINTS", 2), patch.object(
+            shape_sweep, "SWEEP_CHUNK_SIZE", 2
+        ):
+            table = sweep_shapes(digest_model, points, max_workers=2)
+        expected = [
+            self.digest_model.evaluate_dynamic_dims(point).flops for point in points
+        ]
+        self.assertEqual(table["FLOPs"].tolist(), expected)
+        self.assertIsNotNone(expected[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from digest.similarity_analysis import SimilarityWorker, post_process
+from digest.subgraph_analysis.similarity_index import get_corpora_dir
+from utils.analysis_cache import CACHE_DIR_ENV_VAR
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_ONNX = os.path.join(TEST_DIR, "resnet18.onnx")
+
+PNG_MAGIC = b"\x89PNG"
+
+
+def make_match():
+    names = [f"model_{i}" for i in range(30)]
+    df_sorted = pd.DataFrame(
+        np.random.default_rng(0).random((30, 8)),
+        columns=[f"{i:032x}" for i in range(8)],
+    )
+    return names, {}, df_sorted
+
+
+class TestSimilarityHeatmap(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        env_patch = patch.dict(
+            os.environ, {CACHE_DIR_ENV_VAR: os.path.join(self.temp_dir.name, "cache")}
+        )
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_render_from_threads(self):
+        names, _, df_sorted = make_match()
+        png_paths = [
+            os.path.join(self.temp_dir.name, f"heatmap_{i}.png") for i in range(4)
+        ]
+        with ThreadPoolExecutor(4) as executor:
+            list(
+                executor.map(
+                    lambda path: post_process("resnet18", names, df_sorted, path),
+                    png_paths,
+                )
+            )
+        for png_path in png_paths:
+            with open(png_path, "rb") as png_file:
+                self.assertEqual(png_file.read(4), PNG_MAGIC)
+
+    def run_worker(self, png_name, model_name="resnet18"):
+        png_path = os.path.join(self.temp_dir.name, png_name)
+        worker = SimilarityWorker(
+            TEST_ONNX, png_path, "model_id", content_hash="abc", model_name=model_name
+        )
+        completed = []
+        worker.signals.completed.connect(lambda *args: completed.append(args))
+        worker.run()
+        self.assertTrue(completed[0][0])
+        with open(png_path, "rb") as png_file:
+            return png_file.read()
+
+    def test_worker_caches_heatmap(self):
+        with patch(
+            "digest.similarity_analysis.find_match", return_value=make_match()
+        ) as mock_find_match:
+            first_png = self.run_worker("first.png")
+            mock_find_match.assert_called_once()
+        self.assertEqual(first_png[:4], PNG_MAGIC)
+
+        with patch("digest.similarity_analysis.post_process") as mock_post_process:
+            second_png = self.run_worker("second.png")
+            mock_post_process.assert_not_called()
+        self.assertEqual(first_png, second_png)
+
+        # The title changes with the model name
+        with patch(
+            "digest.similarity_analysis.post_process", wraps=post_process
+        ) as mock_post_process:
+            self.run_worker("renamed.png", model_name="renamed")
+            mock_post_process.assert_called_once()
+
+        # A new corpus invalidates the cached matches and heatmap
+        corpora_dir = get_corpora_dir()
+        os.makedirs(corpora_dir)
+        with open(os.path.join(corpora_dir, "internal.simdb"), "wb"):
+            pass
+        with patch(
+            "digest.similarity_analysis.find_match", return_value=make_match()
+        ) as mock_find_match, patch(
+            "digest.similarity_analysis.post_process", wraps=post_process
+        ) as mock_post_process:
+            self.run_worker("new_corpus.png", model_name="renamed")
+            mock_find_match.assert_called_once()
+            mock_post_process.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# Copyright(C) 2024 Advanced Micro Devices, Inc. All rights reserved.
+
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from digest.subgraph_analysis.similarity_index import (
+    DATABASE_PATH,
+    INDEX_FILENAME,
+    MinHashLSH,
+    SimilarityIndex,
+    build_database,
+    load_lsh,
+    load_similarity_index,
+    score_indexes,
+)
+from utils.analysis_cache import CACHE_DIR_ENV_VAR
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database_path = self.temp_dir.name
+        self.write_model("a", {"Conv": 4, "Relu": 2, "input": 1, "output": 1})
+        self.write_model("b", {"Conv": 2, "Add": 1})
+        self.write_model("c", {"MatMul": 8})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_model(self, name, op_list, database_path=None):
+        model_path = os.path.join(database_path or self.database_path, f"{name}.json")
+        with open(model_path, "w", encoding="utf-8") as f:
+            json.dump({"parameters": len(name), "op_list": op_list}, f)
+        # Make sure a rewrite is seen as a change even within the mtime resolution
+        stat = os.stat(model_path)
+        os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**6))
+
+    def test_scores(self):
+        index = load_similarity_index(self.database_path)
+        self.assertEqual(index.names, ["a", "b", "c"])
+        self.assertNotIn("input", index.vocabulary)
+
+        ratios, scores = index.score({"Conv": 4, "Relu": 1})
+        np.testing.assert_allclose(ratios, [[1.0, 0.5], [0.5, 0.0], [0.0, 0.0]])
+        np.testing.assert_allclose(scores, [0.75, 0.25, 0.0])
+
+        names, top_scores, _ = index.top_k({"Conv": 4, "Relu": 1, "Gelu": 3}, 2)
+        self.assertEqual(names, ["a", "b"])
+        np.testing.assert_allclose(top_scores, [0.5, 1 / 6])
+
+    def test_saved_index_is_updated_incrementally(self):
+        load_similarity_index(self.database_path)
+        index_path = os.path.join(self.database_path, INDEX_FILENAME)
+        saved = SimilarityIndex.load(index_path)
+        self.assertEqual(saved.names, ["a", "b", "c"])
+        self.assertFalse(saved.update(self.database_path))
+
+        self.write_model("b", {"Relu": 3})
+        self.write_model("d", {"Conv": 1})
+        os.remove(os.path.join(self.database_path, "c.json"))
+        index = load_similarity_index(self.database_path)
+        self.assertEqual(sorted(index.names), ["a", "b", "d"])
+
+        _, scores = index.score({"Relu": 3})
+        scores = dict(zip(index.names, scores))
+        self.assertAlmostEqual(scores["b"], 1.0)
+        self.assertAlmostEqual(scores["a"], 2 / 3)
+        self.assertAlmostEqual(scores["d"], 0.0)
+        self.assertEqual(SimilarityIndex.load(index_path).names, index.names)
+
+    def test_memory_mapped_database(self):
+        database_file = os.path.join(self.temp_dir.name, "database.simdb")
+        built = build_database(self.database_path, database_file)
+        database = SimilarityIndex.load(database_file)
+        self.assertEqual(database.names, built.names)
+        self.assertFalse(database.data.flags.writeable)
+        self.assertEqual(
+            database.description(0),
+            {
+                "parameters": 1,
+                "op_list": {"Conv": 4, "Relu": 2, "input": 1, "output": 1},
+            },
+        )
+        np.testing.assert_allclose(
+            database.score({"Conv": 4})[1], built.score({"Conv": 4})[1]
+        )
+
+        # The models encoded on this machine replace those of the database
+        with tempfile.TemporaryDirectory() as encodings_dir:
+            self.write_model("b", {"Conv": 4}, encodings_dir)
+            self.write_model("e", {"Relu": 2}, encodings_dir)
+            overlay = load_similarity_index(encodings_dir)
+            locations, ratios, scores = score_indexes([database, overlay], {"Conv": 4})
+            names = [index.names[row] for index, row in locations]
+            self.assertEqual(names, ["a", "c", "b", "e"])
+            np.testing.assert_allclose(scores, [1.0, 0.0, 1.0, 0.0])
+            self.assertEqual(ratios.shape, (4, 1))
+
+    def test_shipped_database(self):
+        database = SimilarityIndex.load(DATABASE_PATH)
+        self.assertIsNotNone(database)
+        self.assertGreater(len(database.names), 1000)
+        self.assertIn("op_list", database.description(0))
+
+    def test_lsh_candidates(self):
+        rng = np.random.default_rng(0)
+        models = {}
+        for i in range(200):
+            features = rng.choice(5000, size=50, replace=False)
+            models[f"m{i:03d}"] = {
+                "op_list": {
+                    f"{feature:032x}": int(rng.integers(1, 40)) for feature in features
+                }
+            }
+        index = SimilarityIndex.from_models(models)
+        lsh = MinHashLSH.build(index)
+        for row in range(0, 200, 20):
+            target = index.description(row)["op_list"]
+            candidates = lsh.query(target)
+            self.assertIn(row, candidates.tolist())
+            # Unrelated random models are not candidates
+            self.assertLess(len(candidates), 10)
+
+            # The candidates are scored like in the exact scan
+            ratios, scores = index.score(target, candidates)
+            all_ratios, all_scores = index.score(target)
+            np.testing.assert_allclose(scores, all_scores[candidates])
+            np.testing.assert_allclose(ratios, all_ratios[candidates])
+
+        locations, _, scores = score_indexes([index], target, [lsh.query(target)])
+        self.assertEqual(locations[np.argmax(scores)][1], 180)
+
+    def test_lsh_is_cached_with_the_index(self):
+        database_file = os.path.join(self.temp_dir.name, "database.simdb")
+        build_database(self.database_path, database_file)
+        with patch.dict(
+            os.environ,
+            {CACHE_DIR_ENV_VAR: os.path.join(self.temp_dir.name, "cache")},
+        ):
+            lsh = load_lsh(SimilarityIndex.load(database_file))
+            with patch.object(MinHashLSH, "build") as mock_build:
+                cached = load_lsh(SimilarityIndex.load(database_file))
+                mock_build.assert_not_called()
+        np.testing.assert_array_equal(cached.band_keys, lsh.band_keys)
+        self.assertEqual(lsh.query({"Conv": 4, "Relu": 2}).tolist(), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()